@@ -14,17 +14,67 @@ class Settings:
     API_KEY: str = os.getenv("API_KEY", "")
     API_BASE_URL: str = os.getenv("API_BASE_URL", "")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "deepseek-chat")
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_SECONDS: float = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes")
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+    LLM_CONNECT_TIMEOUT_SECONDS: float = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+    LLM_DEADLINE_SECONDS: float = float(os.getenv("LLM_DEADLINE_SECONDS", "45"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_RETRY_BACKOFF_SECONDS: float = float(os.getenv("LLM_RETRY_BACKOFF_SECONDS", "0.5"))
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+    LLM_HEDGE_MIN_DELAY_SECONDS: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "2"))
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+    LLM_CIRCUIT_RESET_SECONDS: float = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+    LLM_CACHE_ENABLED: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", "./cache/llm_responses.sqlite3")
+    LLM_CACHE_TTL_SECONDS: int = int(os.getenv("LLM_CACHE_TTL_SECONDS", "86400"))
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+    LLM_CONTEXT_TOKEN_BUDGET: int = int(os.getenv("LLM_CONTEXT_TOKEN_BUDGET", "3000"))
+    LLM_CONTEXT_MAX_ROWS: int = int(os.getenv("LLM_CONTEXT_MAX_ROWS", "31"))
+    SEMANTIC_CACHE_ENABLED: str = os.getenv("SEMANTIC_CACHE_ENABLED", "auto").lower()
+    SEMANTIC_CACHE_THRESHOLD: float = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+    SEMANTIC_CACHE_MAX_ENTRIES: int = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+    INSIGHT_STORE_PATH: str = os.getenv("INSIGHT_STORE_PATH", "./cache/insights.sqlite3")
+    INSIGHT_TTL_SECONDS: int = int(os.getenv("INSIGHT_TTL_SECONDS", "900"))
+    INSIGHT_MAX_ENTRIES: int = int(os.getenv("INSIGHT_MAX_ENTRIES", "1000"))
     
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "auto")
+    LOCAL_EMBEDDING_FEATURES: int = int(os.getenv("LOCAL_EMBEDDING_FEATURES", "32768"))
+    LOCAL_EMBEDDING_DIM: int = int(os.getenv("LOCAL_EMBEDDING_DIM", "256"))
+    EMBEDDING_API_BASE: str = os.getenv("EMBEDDING_API_BASE", "")
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    EMBEDDING_CONCURRENCY: int = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
     
     CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "./vectorstore")
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma")
+    VECTOR_INDEX_DTYPE: str = os.getenv("VECTOR_INDEX_DTYPE", "float16")
+    VECTOR_IVF_LISTS: int = int(os.getenv("VECTOR_IVF_LISTS", "0"))
+    VECTOR_IVF_PROBE: int = int(os.getenv("VECTOR_IVF_PROBE", "8"))
+    VECTOR_INDEX_MODE: str = os.getenv("VECTOR_INDEX_MODE", "rows")
+    SUMMARY_TOP_MERCHANTS: int = int(os.getenv("SUMMARY_TOP_MERCHANTS", "500"))
+    SUMMARY_SAMPLE_ROWS: int = int(os.getenv("SUMMARY_SAMPLE_ROWS", "1000"))
+    QUERY_EMBEDDING_CACHE_SIZE: int = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+    RETRIEVAL_CACHE_SIZE: int = int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024"))
+    QUERY_CACHE_PATH: str = os.getenv("QUERY_CACHE_PATH", "")
     
     DATA_FILE: str = os.getenv("DATA_FILE", "data/track_1_digital_economy_kz.csv")
     
     RAG_TOP_K: int = int(os.getenv("RAG_TOP_K", "5"))
     TEMPERATURE: float = float(os.getenv("TEMPERATURE", "0.0"))
     
+    FORECAST_SEASONALITY: str = os.getenv("FORECAST_SEASONALITY", "auto")
+    FORECAST_INTERVAL_LEVEL: float = float(os.getenv("FORECAST_INTERVAL_LEVEL", "0.8"))
+    FORECAST_CACHE_SIZE: int = int(os.getenv("FORECAST_CACHE_SIZE", "64"))
+    
+    FLAT_INFERENCE_MAX_ROWS: int = int(os.getenv("FLAT_INFERENCE_MAX_ROWS", "512"))
+    SCORING_CHUNK_SIZE: int = int(os.getenv("SCORING_CHUNK_SIZE", "4096"))
+    SCORING_WORKERS: int = int(os.getenv("SCORING_WORKERS", "0"))
+    BLOCKING_WORKERS: int = int(os.getenv("BLOCKING_WORKERS", "8"))
+    
     API_TITLE: str = "Financial Analytics & Digital Business AI System"
     API_VERSION: str = "1.0.0"
     API_DESCRIPTION: str = "AI-powered financial analytics system with RAG for Kazakhstan digital economy data"
@@ -1,16 +1,29 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import sys
 import os
+import threading
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from config.config import settings, Settings
-from routers import analytics, predict, ask, upload, chat
+from routers import analytics, predict, ask, upload, chat, insights, dashboard
 from rag.vectorstore import get_vectorstore_manager, ensure_vectorstore_initialized
 from services.data_service import get_data_service
 from services.prediction_service import get_prediction_service
+from services.health import get_component_states, is_ready, set_component_state
+
+def build_local_vectorstore() -> None:
+    try:
+        vectorstore_manager = get_vectorstore_manager()
+        vectorstore_manager.initialize_vectorstore(force_recreate=False)
+        if vectorstore_manager.vectorstore is not None:
+            print("[OK] Local vectorstore built")
+    except Exception as e:
+        print(f"[WARNING] Could not build local vectorstore: {e}")
+        set_component_state("vectorstore", "error", error=str(e)[:200])
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -25,15 +38,12 @@ async def lifespan(app: FastAPI):
         
         print("Checking vectorstore...")
         
-        import os
-        chroma_db_path = os.path.join(settings.CHROMA_PERSIST_DIR, "chroma.sqlite3")
-        vectorstore_exists = os.path.exists(chroma_db_path)
-        
         vectorstore_manager = get_vectorstore_manager()
+        vectorstore_exists = vectorstore_manager.store_exists()
         vectorstore_initialized = False
         
         if vectorstore_exists:
-            print(f"Found existing vectorstore at {settings.CHROMA_PERSIST_DIR}")
+            print(f"Found existing {vectorstore_manager.vector_backend} vectorstore at {vectorstore_manager.persist_dir}")
             print("Loading existing vectorstore...")
             try:
                 vectorstore_manager.initialize_vectorstore(force_recreate=False)
@@ -49,6 +59,13 @@ async def lifespan(app: FastAPI):
                 print(f"[WARNING] Could not load vectorstore: {error_msg}")
                 if "API key" in error_msg or "401" in error_msg:
                     print("  -> Check your API_KEY in .env")
+        elif vectorstore_manager.embedding_backend == "local":
+            # The build takes about a minute on the full dataset; run it in the background so
+            # /health answers meanwhile. /ready stays 503 until it has finished.
+            print("  -> No existing vectorstore found, building it with local embeddings in the background...")
+            set_component_state("vectorstore", "building")
+            threading.Thread(target=build_local_vectorstore, name="vectorstore-build", daemon=True).start()
+            vectorstore_initialized = True
         else:
             print("  -> No existing vectorstore found")
             print("  -> Note: Vectorstore can be created if needed")
@@ -94,6 +111,8 @@ app.include_router(chat.router)
 app.include_router(analytics.router)
 app.include_router(predict.router)
 app.include_router(upload.router)
+app.include_router(insights.router)
+app.include_router(dashboard.router)
 
 @app.get("/")
 async def root():
@@ -111,48 +130,42 @@ async def root():
             },
             "predictions": {
                 "transactions": "/predict/transactions - Transaction volume forecast",
+                "transactions_batch": "/predict/transactions/batch - Reconciled forecasts for total, cities, channels and categories",
                 "cancellation": "/predict/cancellation - Cancellation risk prediction",
                 "suspicious": "/predict/suspicious - Suspicious transaction detection"
-            }
+            },
+            "dashboard": "/dashboard - Revenue, channel, retention, ROI and suspicious panels from one filtered frame",
+            "insights": "/insights/{insight_id} - AI text for requests sent with insights=deferred (poll, or /stream for SSE)"
         },
         "docs": "/docs"
     }
 
 @app.get("/health")
 async def health_check():
-    try:
-        data_service = get_data_service()
-        vectorstore_manager = get_vectorstore_manager()
-        
-        vectorstore_ready = False
-        vectorstore_status = "not_initialized"
-        
-        if vectorstore_manager.vectorstore is None:
-            try:
-                vectorstore_manager.initialize_vectorstore(force_recreate=False)
-                vectorstore_manager = get_vectorstore_manager()
-            except Exception as init_error:
-                pass
-        
-        if vectorstore_manager.vectorstore is not None:
-            vectorstore_ready = True
-            vectorstore_status = "ready"
-        else:
-            import os
-            chroma_db_path = os.path.join(settings.CHROMA_PERSIST_DIR, "chroma.sqlite3")
-            if os.path.exists(chroma_db_path):
-                vectorstore_status = "exists_but_not_loaded"
-            else:
-                vectorstore_status = "not_created"
-        
-        return {
-            "status": "healthy",
-            "data_loaded": len(data_service.df) if data_service.df is not None else 0,
-            "vectorstore_ready": vectorstore_ready,
-            "vectorstore_status": vectorstore_status
-        }
-    except Exception as e:
-        raise HTTPException(status_code=503, detail=f"Service unhealthy: {str(e)}")
+    # Liveness only: answers from recorded component states and never loads or builds anything
+    states = get_component_states()
+    data_state = states.get("data", {})
+    vectorstore_state = states.get("vectorstore", {})
+    return {
+        "status": "healthy",
+        "data_loaded": data_state.get("rows", 0),
+        "vectorstore_ready": vectorstore_state.get("status") == "ready",
+        "vectorstore_status": vectorstore_state.get("status", "not_initialized")
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: data loaded and models trained; vectorstore state is reported but optional."""
+    states = get_component_states()
+    components = {
+        name: states.get(name, {"status": "not_initialized"})
+        for name in ("data", "models", "vectorstore")
+    }
+    ready = is_ready(states)
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "components": components}
+    )
 
 if __name__ == "__main__":
     import uvicorn
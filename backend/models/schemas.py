@@ -4,6 +4,7 @@ from datetime import datetime
 
 class QuestionRequest(BaseModel):
     question: str = Field(..., description="The question to ask about the financial data")
+    bypass_cache: bool = Field(default=False, description="Ask the LLM even if a similar question was answered before")
     
     class Config:
         json_schema_extra = {
@@ -16,9 +17,11 @@ class QuestionResponse(BaseModel):
     answer: str = Field(..., description="The AI-generated answer")
     sources: List[Dict[str, Any]] = Field(default_factory=list, description="Retrieved data sources")
     confidence: Optional[float] = Field(None, description="Confidence score if available")
+    cached: bool = Field(default=False, description="True when the answer was reused from a similar earlier question")
 
 class SQLRequest(BaseModel):
     question: str = Field(default="", description="Natural language question to convert to SQL query")
+    bypass_cache: bool = Field(default=False, description="Ask the LLM even if a similar question was answered before")
     
     class Config:
         json_schema_extra = {
@@ -31,6 +34,7 @@ class SQLResponse(BaseModel):
     sql_query: str = Field(..., description="Generated SQL query")
     explanation: str = Field(..., description="Explanation of the SQL query")
     table_name: str = Field(default="transactions", description="Target table name")
+    cached: bool = Field(default=False, description="True when the answer was reused from a similar earlier question")
 
 class AnalyticsRequest(BaseModel):
     start_date: Optional[str] = Field(
@@ -47,6 +51,8 @@ class AnalyticsRequest(BaseModel):
     city: Optional[str] = Field(default=None, description="Filter by city")
     merchant_category: Optional[str] = Field(default=None, description="Filter by merchant category")
     channel: Optional[str] = Field(default=None, description="Filter by channel")
+    bypass_cache: bool = Field(default=False, description="Regenerate AI text instead of serving a cached response")
+    insights: str = Field(default="inline", pattern="^(inline|deferred)$", description="deferred: return the numbers immediately and generate the AI text in the background (see /insights/{insight_id})")
     
     class Config:
         json_schema_extra = {
@@ -61,18 +67,21 @@ class RevenueResponse(BaseModel):
     revenue_by_city: List[Dict[str, Any]] = Field(default_factory=list)
     revenue_by_channel: List[Dict[str, Any]] = Field(default_factory=list)
     ai_insights: str = Field(..., description="AI-generated insights based on the data")
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; fetch the AI text from /insights/{insight_id}")
 
 class ChannelResponse(BaseModel):
     channel_performance: List[Dict[str, Any]] = Field(..., description="Performance metrics by channel")
     best_channel: str = Field(..., description="Best performing channel")
     worst_channel: str = Field(..., description="Worst performing channel")
     ai_recommendations: str = Field(..., description="AI recommendations for channel optimization")
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; fetch the AI text from /insights/{insight_id}")
 
 class RetentionResponse(BaseModel):
     customer_segment_retention: List[Dict[str, Any]] = Field(..., description="Retention by customer segment")
     acquisition_source_performance: List[Dict[str, Any]] = Field(..., description="Performance by acquisition source")
     retention_rate: float = Field(..., description="Overall retention rate")
     ai_insights: str = Field(..., description="AI-generated retention insights")
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; fetch the AI text from /insights/{insight_id}")
 
 class PredictionRequest(BaseModel):
     days_ahead: Optional[int] = Field(default=30, description="Number of days to predict ahead", ge=1, le=365)
@@ -86,6 +95,8 @@ class PredictionRequest(BaseModel):
         description="End date for prediction context in YYYY-MM-DD format",
         examples=["2024-12-31"]
     )
+    bypass_cache: bool = Field(default=False, description="Regenerate AI text instead of serving a cached response")
+    insights: str = Field(default="inline", pattern="^(inline|deferred)$", description="deferred: return the numbers immediately and generate the AI text in the background (see /insights/{insight_id})")
     
     class Config:
         json_schema_extra = {
@@ -99,6 +110,37 @@ class TransactionPredictionResponse(BaseModel):
     predicted_total_revenue: float = Field(..., description="Predicted total revenue")
     confidence_interval: Dict[str, float] = Field(..., description="Confidence interval for predictions")
     ai_analysis: str = Field(..., description="AI analysis of the predictions")
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; fetch the AI text from /insights/{insight_id}")
+
+class BatchPredictionRequest(BaseModel):
+    days_ahead: Optional[int] = Field(default=30, description="Number of days to predict ahead", ge=1, le=365)
+    start_date: Optional[str] = Field(
+        default=None, 
+        description="Start date for prediction context in YYYY-MM-DD format",
+        examples=["2024-01-01"]
+    )
+    end_date: Optional[str] = Field(
+        default=None, 
+        description="End date for prediction context in YYYY-MM-DD format",
+        examples=["2024-12-31"]
+    )
+    dimensions: List[str] = Field(
+        default_factory=lambda: ["city", "channel", "merchant_category"],
+        description="Dimensions to forecast (city, region, channel, merchant_category, payment_method, customer_segment, acquisition_source, device_type); every member of each dimension is reconciled to the total"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "days_ahead": 30,
+                "dimensions": ["city", "channel", "merchant_category"]
+            }
+        }
+
+class BatchTransactionPredictionResponse(BaseModel):
+    dates: List[str] = Field(..., description="Forecast dates")
+    series: List[Dict[str, Any]] = Field(..., description="Forecast per series (total and each dimension member)")
+    reconciled: bool = Field(..., description="Whether child series were reconciled to sum to the total")
 
 class CancellationPredictionRequest(BaseModel):
     amount_kzt: float = Field(..., description="Transaction amount", gt=0)
@@ -107,12 +149,15 @@ class CancellationPredictionRequest(BaseModel):
     customer_segment: str = Field(..., description="Customer segment")
     city: Optional[str] = Field(default=None, description="City")
     merchant_category: Optional[str] = Field(default=None, description="Merchant category")
+    bypass_cache: bool = Field(default=False, description="Regenerate AI text instead of serving a cached response")
+    insights: str = Field(default="inline", pattern="^(inline|deferred)$", description="deferred: return the numbers immediately and generate the AI text in the background (see /insights/{insight_id})")
 
 class CancellationPredictionResponse(BaseModel):
     cancellation_probability: float = Field(..., description="Probability of cancellation (0-1)")
     risk_level: str = Field(..., description="Risk level: low, medium, high")
     factors: List[Dict[str, Any]] = Field(..., description="Key factors influencing the prediction")
     ai_recommendations: str = Field(..., description="AI recommendations to reduce cancellation risk")
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; fetch the AI text from /insights/{insight_id}")
 
 class SuspiciousTransactionResponse(BaseModel):
     suspicious_transactions: List[Dict[str, Any]] = Field(..., description="List of suspicious transactions with anomaly scores and reasons")
@@ -120,6 +165,7 @@ class SuspiciousTransactionResponse(BaseModel):
     risk_factors: List[Dict[str, Any]] = Field(..., description="Common risk factors")
     ai_analysis: str = Field(..., description="AI analysis of suspicious patterns")
     model_insights: Optional[str] = Field(None, description="ML model insights and methodology")
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; fetch the AI text from /insights/{insight_id}")
 
 class ErrorResponse(BaseModel):
     error: str = Field(..., description="Error message")
@@ -156,4 +202,23 @@ class ROIMetricsResponse(BaseModel):
     roi_metrics: List[Dict[str, Any]] = Field(..., description="ROI metrics by source")
     ai_analysis: str = Field(..., description="AI analysis of ROI in Russian")
     best_investment_opportunity: Optional[str] = Field(None, description="Best investment opportunity identified by AI")
-
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; fetch the AI text from /insights/{insight_id}")
+
+class DashboardResponse(BaseModel):
+    filters: Dict[str, Any] = Field(default_factory=dict, description="Filters applied to every panel")
+    data_version: Optional[str] = Field(None, description="Version of the dataset the panels were computed from")
+    revenue: Dict[str, Any] = Field(..., description="Revenue totals and breakdowns by date, city and channel")
+    channels: Dict[str, Any] = Field(..., description="Channel performance with best and worst channel")
+    retention: Dict[str, Any] = Field(..., description="Segment retention and acquisition source performance")
+    roi: Dict[str, Any] = Field(..., description="ROI metrics by acquisition source and the best opportunity")
+    suspicious: Dict[str, Any] = Field(..., description="Suspicious transactions, risk factors and model insights")
+    ai_insights: Dict[str, str] = Field(default_factory=dict, description="AI insights keyed by panel, generated in one batched LLM call")
+    insight_id: Optional[str] = Field(None, description="Set when insights=deferred; the panel insights arrive as `sections` of /insights/{insight_id}")
+
+class InsightResponse(BaseModel):
+    insight_id: str = Field(..., description="Insight ID returned by a deferred analytics/prediction request")
+    kind: str = Field(..., description="Endpoint the insight belongs to, e.g. revenue, roi, suspicious")
+    status: str = Field(..., description="pending, ready or error")
+    text: Optional[str] = Field(None, description="AI-generated text once ready")
+    sections: Optional[Dict[str, str]] = Field(None, description="AI text keyed by panel for a deferred dashboard request")
+    error: Optional[str] = Field(None, description="Error message if generation failed")
@@ -0,0 +1,144 @@
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_TOKEN_PIECES = re.compile(r"[A-Za-z]+|[^\W\d_]+|\d+|[^\w\s]")
+
+def estimate_tokens(text: str) -> int:
+    """Offline estimate of BPE tokens: ~4 chars per Latin token, ~3 per Cyrillic
+    (or other non-Latin) token and per digit run chunk, one per punctuation mark."""
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece.isascii() and piece.isalpha():
+            tokens += math.ceil(len(piece) / 4)
+        elif piece[0].isdigit() or piece[0].isalpha():
+            tokens += math.ceil(len(piece) / 3)
+        else:
+            tokens += 1
+    return tokens
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool) or value is None:
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value) or math.isinf(value):
+            return "N/A"
+        return f"{value:,.0f}" if abs(value) >= 1000 else f"{value:.2f}".rstrip("0").rstrip(".")
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        # numpy scalars
+        try:
+            return _format_value(value.item())
+        except (TypeError, ValueError):
+            pass
+    text = str(value).replace("|", "/").replace("\n", " ")
+    return text if len(text) <= 120 else text[:117] + "..."
+
+def _aggregate_by_month(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    months: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        month = str(row.get("date", ""))[:7]
+        target = months.setdefault(month, {"month": month, "days": 0})
+        target["days"] += 1
+        for key, value in row.items():
+            if key != "date" and isinstance(value, (int, float)) and not isinstance(value, bool):
+                target[key] = target.get(key, 0) + value
+    return list(months.values())
+
+class _Table:
+    def __init__(self, title: str, rows: List[Dict[str, Any]]):
+        self.title = title
+        self.total_rows = len(rows)
+        columns: List[str] = []
+        for row in rows:
+            for key in row:
+                if key not in columns:
+                    columns.append(key)
+        self.header = " | ".join(columns)
+        self.lines = [" | ".join(_format_value(row.get(column, "")) for column in columns) for row in rows]
+
+class ContextBuilder:
+    """Fits the analytics summary and retrieved dataset context into a token budget.
+
+    Summaries are serialized as compact pipe tables instead of Python reprs. Sections
+    are filled in rank order - scalar metrics, then summary tables (rows in their
+    existing order, which is by revenue/score for most lists), then retrieved
+    documents - and whatever does not fit is cut with a note of how much was left out.
+    Daily series longer than `max_table_rows` are rolled up by month first.
+    """
+
+    def __init__(self, token_budget: int = 3000, max_table_rows: int = 31):
+        self.token_budget = token_budget
+        self.max_table_rows = max_table_rows
+
+    def _collect(self, data: Dict[str, Any], prefix: str, scalars: List[str], tables: List[_Table]) -> None:
+        for key, value in data.items():
+            name = f"{prefix}{key}"
+            if isinstance(value, dict):
+                self._collect(value, f"{name}.", scalars, tables)
+            elif isinstance(value, (list, tuple)):
+                if value and all(isinstance(item, dict) for item in value):
+                    rows = list(value)
+                    if len(rows) > self.max_table_rows and "date" in rows[0]:
+                        rows = _aggregate_by_month(rows)
+                        name = f"{name} (aggregated by month)"
+                    tables.append(_Table(name, rows))
+                elif value:
+                    items = [_format_value(item) for item in value[:20]]
+                    more = f" (+{len(value) - 20} more)" if len(value) > 20 else ""
+                    scalars.append(f"{name}: {', '.join(items)}{more}")
+            else:
+                scalars.append(f"{name}: {_format_value(value)}")
+
+    def build(self, data_summary: Optional[Dict[str, Any]], context: str) -> Tuple[str, str]:
+        """Returns (summary_text, context_text) that together stay within the budget."""
+        remaining = self.token_budget
+        summary_lines: List[str] = []
+
+        scalars: List[str] = []
+        tables: List[_Table] = []
+        if data_summary:
+            self._collect(data_summary, "", scalars, tables)
+
+        for position, line in enumerate(scalars):
+            cost = estimate_tokens(line) + 1
+            if cost > remaining:
+                summary_lines.append(f"... {len(scalars) - position} more metrics omitted")
+                remaining = 0
+                break
+            summary_lines.append(line)
+            remaining -= cost
+
+        for table in tables:
+            heading = f"\n{table.title} ({table.total_rows} rows):"
+            fixed = estimate_tokens(heading) + estimate_tokens(table.header) + 2
+            if fixed >= remaining:
+                summary_lines.append(f"\n{table.title}: {table.total_rows} rows omitted (token budget)")
+                continue
+            remaining -= fixed
+            summary_lines.extend([heading, table.header])
+            shown = 0
+            for line in table.lines:
+                cost = estimate_tokens(line) + 1
+                if cost > remaining:
+                    break
+                summary_lines.append(line)
+                remaining -= cost
+                shown += 1
+            if shown < len(table.lines):
+                summary_lines.append(f"... {len(table.lines) - shown} more rows omitted")
+
+        # Retrieved documents are separated by blank lines; keep whole documents only
+        blocks = [block for block in (context or "").split("\n\n") if block.strip()]
+        kept: List[str] = []
+        for block in blocks:
+            cost = estimate_tokens(block) + 2
+            if cost > remaining:
+                break
+            kept.append(block)
+            remaining -= cost
+        if len(kept) < len(blocks):
+            kept.append(f"... {len(blocks) - len(kept)} more retrieved entries omitted (token budget)")
+
+        return "\n".join(summary_lines), "\n\n".join(kept)
@@ -0,0 +1,121 @@
+import os
+import hashlib
+import numpy as np
+import joblib
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import settings
+
+LOCAL_STATE_FILE = "local_embeddings.joblib"
+FIT_SAMPLE_SIZE = 10000
+
+def resolve_embedding_backend(backend: Optional[str] = None) -> str:
+    backend = (backend or settings.EMBEDDING_BACKEND or "auto").lower()
+    if backend not in ("auto", "openai", "local"):
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}. Use auto, openai or local.")
+    if backend == "auto":
+        # The DeepSeek API_KEY cannot create embeddings, so only a real OpenAI key
+        # (or an explicit OpenAI-compatible endpoint) selects the remote backend.
+        return "openai" if settings.OPENAI_API_KEY or settings.EMBEDDING_API_BASE else "local"
+    return backend
+
+class LocalHashingEmbeddings(Embeddings):
+    """CPU-only embeddings: hashed word/bigram counts, TF-IDF weighting, optional SVD."""
+
+    def __init__(self, n_features: int = 2 ** 15, n_components: int = 256):
+        self.n_features = n_features
+        self.n_components = n_components
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=(1, 2),
+            token_pattern=r"(?u)\b\w+\b",
+            alternate_sign=False,
+            norm=None
+        )
+        self.tfidf = None
+        self.svd = None
+        self.fit_id = None
+
+    @property
+    def signature(self) -> str:
+        # A refit changes the vector space, so vectors (and caches keyed on them) from the
+        # previous fit must not be mixed with new ones; fit_id tells the fits apart.
+        base = f"local:{self.n_features}:{self.n_components}"
+        return f"{base}:{self.fit_id}" if self.fit_id else base
+
+    @property
+    def fitted(self) -> bool:
+        return self.tfidf is not None
+
+    def fit(self, texts: List[str]) -> "LocalHashingEmbeddings":
+        # Row texts are highly repetitive, so IDF weights and the SVD basis from a
+        # fixed-size sample match the full corpus while keeping the fit near-constant time.
+        if len(texts) > FIT_SAMPLE_SIZE:
+            sample = np.random.RandomState(42).choice(len(texts), FIT_SAMPLE_SIZE, replace=False)
+            texts = [texts[i] for i in sample]
+        counts = self.vectorizer.transform(texts)
+        self.tfidf = TfidfTransformer(sublinear_tf=True).fit(counts)
+        self.svd = None
+        if self.n_components:
+            weighted = self.tfidf.transform(counts)
+            n_components = min(self.n_components, weighted.shape[0] - 1, weighted.shape[1] - 1)
+            if n_components > 0:
+                self.svd = TruncatedSVD(n_components=n_components, algorithm="randomized",
+                                        n_iter=3, random_state=42).fit(weighted)
+        fingerprint = hashlib.sha1(np.ascontiguousarray(self.tfidf.idf_).tobytes())
+        if self.svd is not None:
+            fingerprint.update(np.ascontiguousarray(self.svd.components_).tobytes())
+        self.fit_id = fingerprint.hexdigest()[:12]
+        return self
+
+    def _transform(self, texts: List[str]) -> np.ndarray:
+        if not self.fitted:
+            raise ValueError("Local embeddings are not fitted. Build the vectorstore first.")
+        weighted = self.tfidf.transform(self.vectorizer.transform(texts))
+        if self.svd is not None:
+            vectors = self.svd.transform(weighted)
+        else:
+            vectors = weighted.toarray()
+        return normalize(vectors).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._transform(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._transform([text])[0].tolist()
+
+    def save(self, path: str) -> None:
+        tmp_path = path + ".tmp"
+        joblib.dump({"n_features": self.n_features, "n_components": self.n_components,
+                     "tfidf": self.tfidf, "svd": self.svd, "fit_id": self.fit_id}, tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalHashingEmbeddings":
+        state = joblib.load(path)
+        embeddings = cls(n_features=state["n_features"], n_components=state["n_components"])
+        embeddings.tfidf = state["tfidf"]
+        embeddings.svd = state["svd"]
+        embeddings.fit_id = state.get("fit_id")
+        return embeddings
+
+def create_local_embeddings(state_dir: Optional[str] = None) -> LocalHashingEmbeddings:
+    embeddings = LocalHashingEmbeddings(
+        n_features=settings.LOCAL_EMBEDDING_FEATURES,
+        n_components=settings.LOCAL_EMBEDDING_DIM
+    )
+    state_path = os.path.join(state_dir or settings.CHROMA_PERSIST_DIR, LOCAL_STATE_FILE)
+    if os.path.exists(state_path):
+        try:
+            persisted = LocalHashingEmbeddings.load(state_path)
+            if (persisted.n_features, persisted.n_components) == (embeddings.n_features, embeddings.n_components):
+                return persisted
+        except Exception as e:
+            print(f"Warning: Could not load local embedding state: {str(e)[:100]}")
+    return embeddings
@@ -0,0 +1,88 @@
+from typing import Any, Dict, List
+
+# Analysis prompts for the dashboard panels, shared by the per-panel endpoints and
+# the batched dashboard insight call so both ask the model the same thing.
+
+def revenue_question(revenue_data: Dict[str, Any]) -> str:
+    return f"""Проанализируй данные по выручке на русском языке:
+- Общая выручка: {revenue_data['total_revenue']:,.2f} KZT
+- Количество транзакций: {revenue_data['transaction_count']}
+- Средняя транзакция: {revenue_data['average_transaction']:,.2f} KZT
+- Топ городов: {revenue_data['revenue_by_city'][:5] if revenue_data['revenue_by_city'] else 'N/A'}
+- Топ каналов: {revenue_data['revenue_by_channel'][:5] if revenue_data['revenue_by_channel'] else 'N/A'}
+
+Предоставь анализ трендов выручки, эффективности городов и каналов. Определи возможности для роста. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
+
+def channels_question(channel_data: Dict[str, Any]) -> str:
+    return f"""Проанализируй эффективность каналов на русском языке:
+{channel_data['channel_performance']}
+
+Лучший канал: {channel_data['best_channel']}
+Худший канал: {channel_data['worst_channel']}
+
+Предоставь рекомендации по оптимизации каналов и распределению маркетингового бюджета. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
+
+def retention_question(retention_data: Dict[str, Any]) -> str:
+    return f"""Проанализируй ретеншн клиентов на русском языке:
+- Общий уровень ретеншна: {retention_data['retention_rate']:.2f}%
+- Эффективность сегментов клиентов: {retention_data['customer_segment_retention'][:5] if retention_data['customer_segment_retention'] else 'N/A'}
+- Эффективность источников привлечения: {retention_data['acquisition_source_performance'][:5] if retention_data['acquisition_source_performance'] else 'N/A'}
+
+Предоставь анализ трендов ретеншна и рекомендации по улучшению лояльности клиентов. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
+
+def roi_question(roi_metrics: List[Dict[str, Any]], revenue_data: Dict[str, Any]) -> str:
+    context = f"""МЕТРИКИ ROI ПО ИСТОЧНИКАМ ПРИВЛЕЧЕНИЯ КЛИЕНТОВ (МАРКЕТИНГ):
+
+{chr(10).join([f"- {m['source']}: Инвестиции {m['investment']:,.0f} KZT, Выручка {m['revenue']:,.0f} KZT, ROI {m['roi']:.1f}%, Прибыль {m['profit']:,.0f} KZT, Клиентов {m.get('customers', 0)}, CPA {m.get('cpa', 0):,.0f} KZT" for m in roi_metrics[:15]])}
+
+ОБЩАЯ СТАТИСТИКА:
+- Общая выручка: {revenue_data.get('total_revenue', 0):,.0f} KZT
+- Всего транзакций: {revenue_data.get('transaction_count', 0)}
+- Лучший источник по ROI: {roi_metrics[0]['source'] if roi_metrics else 'N/A'}
+- Общие маркетинговые инвестиции: {sum(m.get('investment', 0) for m in roi_metrics):,.0f} KZT"""
+
+    return f"""{context}
+
+ТЫ ЭКСПЕРТ ПО МАРКЕТИНГОВОЙ АНАЛИТИКЕ И ROI ОПТИМИЗАЦИИ ИСТОЧНИКОВ ПРИВЛЕЧЕНИЯ КЛИЕНТОВ. ОБЯЗАТЕЛЬНО ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ.
+
+Проанализируй ROI метрики по источникам привлечения клиентов и предоставь:
+1. Детальный анализ эффективности каждого маркетингового источника
+2. Конкретные рекомендации по перераспределению маркетингового бюджета
+3. Определи лучшие возможности для увеличения инвестиций
+4. Оцени потенциальный ROI и прибыль от оптимизации бюджета
+5. Укажи конкретные цифры: сколько перераспределить, какой ожидаемый эффект
+6. Проанализируй CPA (стоимость привлечения клиента) по источникам
+
+Ответ должен быть на русском языке с конкретными рекомендациями, числами и расчетами."""
+
+def suspicious_question(suspicious_data: Dict[str, Any]) -> str:
+    sample_txns = suspicious_data['suspicious_transactions'][:10] if suspicious_data['suspicious_transactions'] else []
+    txn_details = "\n".join([
+        f"- Txn {t.get('transaction_id', 'N/A')}: {t.get('amount_kzt', 0):,.0f} KZT, "
+        f"Score: {t.get('anomaly_score', 0):.2f}, Reason: {t.get('reason', 'N/A')}, "
+        f"Risk: {t.get('risk_level', 'unknown')}"
+        for t in sample_txns
+    ])
+    
+    return f"""Ты профессиональный аналитик по мошенничеству и аномалиям в транзакционных данных для цифровой экономики Казахстана.
+
+ПРОАНАЛИЗИРУЙ следующие подозрительные транзакции:
+
+СВОДКА:
+- Всего обнаружено подозрительных транзакций: {suspicious_data['total_suspicious']}
+- Выявлено факторов риска: {len(suspicious_data.get('risk_factors', []))}
+- Методология модели: {suspicious_data.get('model_insights', 'ML-based anomaly detection')}
+
+ПРИМЕРЫ ПОДОЗРИТЕЛЬНЫХ ТРАНЗАКЦИЙ:
+{txn_details if txn_details else 'Не обнаружено'}
+
+ФАКТОРЫ РИСКА:
+{chr(10).join([f"- {rf.get('factor', 'unknown')}: {rf.get('description', '')} ({rf.get('count', 0)} случаев)" for rf in suspicious_data.get('risk_factors', [])])}
+
+ОБЯЗАТЕЛЬНО ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ и предоставь профессиональный анализ:
+1. Определи наиболее критические паттерны мошенничества и их влияние на бизнес
+2. Объясни ПОЧЕМУ каждый паттерн подозрителен с конкретными метриками
+3. Рекомендуй немедленные действия и стратегии предотвращения мошенничества
+4. Оцени потенциальный финансовый риск
+5. Предложи правила мониторинга и алертинга
+Используй профессиональный аналитический язык с конкретными числами и практическими рекомендациями."""
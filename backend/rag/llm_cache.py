@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+class LLMResponseCache:
+    """SQLite-backed cache of LLM responses with TTL and size-based (LRU) eviction.
+
+    Entries are stored with the dataset version they were generated for; entries of
+    other versions are dropped on write, so a reload never serves stale analysis.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int = 86400, max_entries: int = 5000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Several uvicorn workers share the file; WAL lets readers proceed during a write
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_responses "
+            "(key TEXT PRIMARY KEY, data_version TEXT, response TEXT, created_at REAL, used_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS llm_responses_used_at ON llm_responses (used_at)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or (self.ttl_seconds > 0 and now - row[1] > self.ttl_seconds):
+                    self.misses += 1
+                    return None
+                self._conn.execute("UPDATE llm_responses SET used_at = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: LLM cache read failed: {e}")
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, data_version: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_responses (key, data_version, response, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, data_version, response, now, now)
+                )
+                self._conn.execute("DELETE FROM llm_responses WHERE data_version != ?", (data_version,))
+                if self.ttl_seconds > 0:
+                    self._conn.execute("DELETE FROM llm_responses WHERE created_at < ?", (now - self.ttl_seconds,))
+                self._conn.execute(
+                    "DELETE FROM llm_responses WHERE key NOT IN "
+                    "(SELECT key FROM llm_responses ORDER BY used_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not persist LLM response: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM llm_responses").fetchone()[0]
+            return {"size": size, "max_entries": self.max_entries, "ttl_seconds": self.ttl_seconds,
+                    "hits": self.hits, "misses": self.misses}
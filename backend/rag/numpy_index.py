@@ -0,0 +1,494 @@
+import os
+import json
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+SCAN_CHUNK_ROWS = 65536
+IVF_MIN_ROWS_PER_LIST = 39
+IVF_TRAIN_SAMPLE = 100000
+IVF_TRAIN_ITERATIONS = 10
+COMPACT_DEAD_FRACTION = 0.25
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-writer is assumed
+    fcntl = None
+
+class _WriteLock:
+    """Exclusive inter-process lock so only one uvicorn worker appends at a time."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "a+")
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        self._file.close()
+        self._file = None
+
+def _match_condition(values: np.ndarray, condition: Any) -> np.ndarray:
+    if not isinstance(condition, dict):
+        condition = {"$eq": condition}
+    mask = np.ones(len(values), dtype=bool)
+    for op, operand in condition.items():
+        if op == "$eq":
+            mask &= values == operand
+        elif op == "$ne":
+            mask &= values != operand
+        elif op == "$gt":
+            mask &= values > operand
+        elif op == "$gte":
+            mask &= values >= operand
+        elif op == "$lt":
+            mask &= values < operand
+        elif op == "$lte":
+            mask &= values <= operand
+        elif op == "$in":
+            mask &= np.isin(values, list(operand))
+        elif op == "$nin":
+            mask &= ~np.isin(values, list(operand))
+        else:
+            raise ValueError(f"Unsupported where operator: {op}")
+    return mask
+
+class NumpyVectorIndex:
+    """Memory-mapped vector index with a JSON-lines row sidecar.
+
+    Vectors are appended to a float16 or int8 matrix file and row ids, documents
+    and metadata to `rows-<generation>.jsonl`; deletes and metadata updates are
+    appended as operations and folded in on load. Every worker maps the same
+    files read-only and picks up appended rows on its next query.
+    """
+
+    def __init__(self, directory: str, dtype: str = "float16", ivf_lists: int = 0, ivf_probe: int = 8):
+        if dtype not in ("float16", "int8"):
+            raise ValueError(f"Unsupported vector index dtype: {dtype}. Use float16 or int8.")
+        self.directory = directory
+        self.dtype = dtype
+        self.ivf_lists = ivf_lists
+        self.ivf_probe = max(1, ivf_probe)
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self._write_lock = _WriteLock(os.path.join(directory, ".lock"))
+        self._reset_memory(None, None)
+        self._refresh()
+
+    # ----- files -------------------------------------------------------------------------------
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.directory, MANIFEST_FILE)
+
+    def _vectors_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"vectors-{generation}.bin")
+
+    def _rows_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"rows-{generation}.jsonl")
+
+    def _ivf_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"ivf-{generation}.npz")
+
+    def _read_manifest(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._manifest_path(), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    @property
+    def version(self) -> str:
+        # Identical across workers for identical file contents, unlike an in-process counter
+        return f"{self.generation}:{self._rows_offset}"
+
+    @property
+    def _np_dtype(self):
+        return np.float16 if self.dtype == "float16" else np.int8
+
+    # ----- in-memory view ----------------------------------------------------------------------
+
+    def _reset_memory(self, generation: Optional[int], dim: Optional[int]) -> None:
+        self.generation = generation
+        self.dim = dim
+        self._rows_offset = 0
+        self._n_rows = 0
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._norms: List[float] = []
+        self._scales: List[float] = []
+        self._alive: List[bool] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._vectors = None
+        self._columns: Optional[Dict[str, np.ndarray]] = None
+        self._arrays = None
+        self._centroids = None
+        self._assign = None
+        self._ivf_rows = 0
+
+    def _refresh(self) -> None:
+        """Fold in rows appended to the sidecar since the last look (by this or another process)."""
+        with self._lock:
+            manifest = self._read_manifest()
+            if manifest is None:
+                if self.generation is not None:
+                    self._reset_memory(None, None)
+                return
+            if manifest["generation"] != self.generation:
+                self._reset_memory(manifest["generation"], manifest["dim"])
+                self.dtype = manifest["dtype"]
+                self._load_ivf()
+            if self.dim is None:
+                self.dim = manifest["dim"]
+            if self.dim is None:
+                return
+
+            rows_path = self._rows_path(self.generation)
+            try:
+                size = os.path.getsize(rows_path)
+            except OSError:
+                return
+            if size <= self._rows_offset:
+                return
+
+            with open(rows_path, "rb") as f:
+                f.seek(self._rows_offset)
+                chunk = f.read(size - self._rows_offset)
+            # Only complete lines are consumed; a torn trailing write is retried next time
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            vector_rows = os.path.getsize(self._vectors_path(self.generation)) // self._row_bytes()
+            consumed = 0
+            for line in complete.splitlines(keepends=True):
+                entry = json.loads(line)
+                if entry.get("op") == "add":
+                    if self._n_rows >= vector_rows:
+                        break
+                    self._apply_add(entry)
+                elif entry.get("op") == "delete":
+                    self._apply_delete(entry["id"])
+                elif entry.get("op") == "update":
+                    self._apply_update(entry["id"], entry["metadata"])
+                consumed += len(line)
+            self._rows_offset += consumed
+            self._remap()
+
+    def _row_bytes(self) -> int:
+        return self.dim * np.dtype(self._np_dtype).itemsize
+
+    def _apply_add(self, entry: Dict[str, Any]) -> None:
+        row = self._n_rows
+        previous = self._id_to_row.get(entry["id"])
+        if previous is not None:
+            self._alive[previous] = False
+        self._id_to_row[entry["id"]] = row
+        self._ids.append(entry["id"])
+        self._documents.append(entry.get("document") or "")
+        self._metadatas.append(entry.get("metadata") or {})
+        self._norms.append(entry["norm"])
+        self._scales.append(entry.get("scale", 1.0))
+        self._alive.append(True)
+        self._n_rows += 1
+
+    def _apply_delete(self, row_id: str) -> None:
+        row = self._id_to_row.pop(row_id, None)
+        if row is not None:
+            self._alive[row] = False
+
+    def _apply_update(self, row_id: str, metadata: Dict[str, Any]) -> None:
+        row = self._id_to_row.get(row_id)
+        if row is not None:
+            self._metadatas[row] = metadata
+
+    def _remap(self) -> None:
+        self._columns = None
+        self._arrays = None
+        if self._n_rows == 0:
+            self._vectors = None
+            return
+        self._vectors = np.memmap(self._vectors_path(self.generation), dtype=self._np_dtype,
+                                  mode="r", shape=(self._n_rows, self.dim))
+        if self._centroids is not None and len(self._assign) < self._n_rows:
+            tail_scales = np.asarray(self._scales[len(self._assign):], dtype=np.float32)
+            tail = self._vectors[len(self._assign):].astype(np.float32) * tail_scales[:, None]
+            self._assign = np.concatenate([self._assign, self._nearest_centroids(tail)])
+
+    def _row_arrays(self):
+        if self._arrays is None:
+            self._arrays = (
+                np.asarray(self._alive, dtype=bool),
+                np.asarray(self._norms, dtype=np.float32) ** 2,
+                np.asarray(self._scales, dtype=np.float32)
+            )
+        return self._arrays
+
+    def _metadata_column(self, key: str) -> np.ndarray:
+        if self._columns is None:
+            self._columns = {}
+        if key not in self._columns:
+            values = [metadata.get(key) for metadata in self._metadatas]
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values if v is not None):
+                column = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                column = np.array(values, dtype=object)
+            self._columns[key] = column
+        return self._columns[key]
+
+    def _where_mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        if not where:
+            return np.ones(self._n_rows, dtype=bool)
+        mask = np.ones(self._n_rows, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                any_mask = np.zeros(self._n_rows, dtype=bool)
+                for clause in condition:
+                    any_mask |= self._where_mask(clause)
+                mask &= any_mask
+            else:
+                mask &= _match_condition(self._metadata_column(key), condition)
+        return mask
+
+    # ----- IVF ---------------------------------------------------------------------------------
+
+    def _load_ivf(self) -> None:
+        path = self._ivf_path(self.generation)
+        if not os.path.exists(path):
+            return
+        with np.load(path) as ivf:
+            self._centroids = ivf["centroids"]
+            self._assign = ivf["assign"]
+        self._ivf_rows = len(self._assign)
+
+    def _nearest_centroids(self, X: np.ndarray) -> np.ndarray:
+        distances = (self._centroids ** 2).sum(axis=1)[None, :] - 2.0 * X @ self._centroids.T
+        return distances.argmin(axis=1).astype(np.int32)
+
+    def _train_ivf(self, vectors: np.ndarray, n_lists: int) -> None:
+        rng = np.random.RandomState(42)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), IVF_TRAIN_SAMPLE), replace=False)]
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        self._centroids = centroids
+        for _ in range(IVF_TRAIN_ITERATIONS):
+            labels = self._nearest_centroids(sample)
+            for c in range(n_lists):
+                members = sample[labels == c]
+                if len(members) > 0:
+                    centroids[c] = members.mean(axis=0)
+        self._centroids = centroids.astype(np.float32)
+        self._assign = np.concatenate([
+            self._nearest_centroids(vectors[start:start + SCAN_CHUNK_ROWS])
+            for start in range(0, len(vectors), SCAN_CHUNK_ROWS)
+        ])
+
+    # ----- writes ------------------------------------------------------------------------------
+
+    def _encode(self, embeddings) -> tuple:
+        X = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(X, axis=1)
+        if self.dtype == "int8":
+            scales = np.abs(X).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            encoded = np.clip(np.round(X / scales[:, None]), -127, 127).astype(np.int8)
+        else:
+            scales = np.ones(len(X), dtype=np.float32)
+            encoded = X.astype(np.float16)
+        return encoded, norms, scales
+
+    def _start_generation(self, generation: int, dim: int) -> None:
+        open(self._vectors_path(generation), "wb").close()
+        open(self._rows_path(generation), "wb").close()
+        self._write_manifest({"generation": generation, "dim": dim, "dtype": self.dtype})
+
+    def upsert(self, ids: List[str], embeddings, metadatas: Optional[List[Dict[str, Any]]] = None,
+               documents: Optional[List[str]] = None) -> None:
+        if not ids:
+            return
+        encoded, norms, scales = self._encode(embeddings)
+        with self._lock, self._write_lock:
+            self._refresh()
+            if self.generation is None or self.dim is None:
+                self._start_generation(0 if self.generation is None else self.generation, encoded.shape[1])
+                self._refresh()
+            if encoded.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {encoded.shape[1]} does not match index dimension {self.dim}")
+            # Vectors are written before their sidecar rows, so a crash never exposes a row without data
+            with open(self._vectors_path(self.generation), "ab") as f:
+                f.write(encoded.tobytes())
+            lines = []
+            for i, row_id in enumerate(ids):
+                lines.append(json.dumps({
+                    "op": "add",
+                    "id": row_id,
+                    "document": documents[i] if documents else "",
+                    "metadata": metadatas[i] if metadatas else {},
+                    "norm": float(norms[i]),
+                    "scale": float(scales[i])
+                }, ensure_ascii=False))
+            self._append_rows(lines)
+            self._refresh()
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock, self._write_lock:
+            self._refresh()
+            if self.dim is None:
+                return
+            self._append_rows([json.dumps({"op": "update", "id": row_id, "metadata": metadata}, ensure_ascii=False)
+                               for row_id, metadata in zip(ids, metadatas)])
+            self._refresh()
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock, self._write_lock:
+            self._refresh()
+            if self.dim is None:
+                return
+            self._append_rows([json.dumps({"op": "delete", "id": row_id}) for row_id in ids])
+            self._refresh()
+
+    def _append_rows(self, lines: List[str]) -> None:
+        if not lines:
+            return
+        with open(self._rows_path(self.generation), "ab") as f:
+            f.write(("\n".join(lines) + "\n").encode("utf-8"))
+
+    def reset(self) -> None:
+        with self._lock, self._write_lock:
+            previous = self._read_manifest()
+            for name in os.listdir(self.directory):
+                if name.startswith(("vectors-", "rows-", "ivf-")) or name == MANIFEST_FILE:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+            self._reset_memory(None, None)
+            if previous is not None:
+                # Keep generations monotonic so other workers notice the reset; the next
+                # upsert fixes the dimension, which may differ after an embedding change
+                self._write_manifest({"generation": previous["generation"] + 1, "dim": None, "dtype": self.dtype})
+            self._refresh()
+
+    def compact(self) -> None:
+        """Rewrite live rows into a new generation and (re)train the IVF quantizer if configured."""
+        with self._lock, self._write_lock:
+            self._refresh()
+            if self.dim is None or self._n_rows == 0:
+                return
+            alive = self._row_arrays()[0]
+            n_live = int(alive.sum())
+            n_lists = min(self.ivf_lists, n_live // IVF_MIN_ROWS_PER_LIST) if self.ivf_lists else 0
+            dead_fraction = 1.0 - n_live / self._n_rows
+            stale_ivf = n_lists > 0 and (self._centroids is None or self._ivf_rows * 2 < n_live)
+            if dead_fraction < COMPACT_DEAD_FRACTION and not stale_ivf:
+                return
+
+            generation = self.generation + 1
+            live_rows = np.flatnonzero(alive)
+            with open(self._vectors_path(generation), "wb") as f:
+                for start in range(0, len(live_rows), SCAN_CHUNK_ROWS):
+                    f.write(np.ascontiguousarray(self._vectors[live_rows[start:start + SCAN_CHUNK_ROWS]]).tobytes())
+            with open(self._rows_path(generation), "wb") as f:
+                for row in live_rows:
+                    f.write((json.dumps({
+                        "op": "add",
+                        "id": self._ids[row],
+                        "document": self._documents[row],
+                        "metadata": self._metadatas[row],
+                        "norm": self._norms[row],
+                        "scale": self._scales[row]
+                    }, ensure_ascii=False) + "\n").encode("utf-8"))
+
+            if n_lists > 0:
+                vectors = np.memmap(self._vectors_path(generation), dtype=self._np_dtype, mode="r",
+                                    shape=(n_live, self.dim))
+                decoded = vectors.astype(np.float32) * np.asarray(self._scales, dtype=np.float32)[live_rows][:, None]
+                self._train_ivf(decoded, n_lists)
+                np.savez(self._ivf_path(generation), centroids=self._centroids, assign=self._assign)
+
+            old_generation = self.generation
+            self._write_manifest({"generation": generation, "dim": self.dim, "dtype": self.dtype})
+            self._reset_memory(None, None)
+            self._refresh()
+            for path in (self._vectors_path(old_generation), self._rows_path(old_generation),
+                         self._ivf_path(old_generation)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    # ----- reads -------------------------------------------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._id_to_row)
+
+    def get(self, ids: List[str], include: Optional[List[str]] = None) -> Dict[str, List[Any]]:
+        with self._lock:
+            self._refresh()
+            rows = [(row_id, self._id_to_row[row_id]) for row_id in ids if row_id in self._id_to_row]
+            return {
+                "ids": [row_id for row_id, _ in rows],
+                "documents": [self._documents[row] for _, row in rows],
+                "metadatas": [self._metadatas[row] for _, row in rows]
+            }
+
+    def query(self, query_embeddings, n_results: int = 5, where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, List[List[Any]]]:
+        with self._lock:
+            self._refresh()
+            result = {"ids": [], "distances": []}
+            for query in np.asarray(query_embeddings, dtype=np.float32):
+                ids, distances = self._query_one(query, n_results, where)
+                result["ids"].append(ids)
+                result["distances"].append(distances)
+            return result
+
+    def _query_one(self, query: np.ndarray, k: int, where: Optional[Dict[str, Any]]):
+        if self._vectors is None or k <= 0:
+            return [], []
+        alive, squared_norms, scales = self._row_arrays()
+        mask = alive & self._where_mask(where)
+
+        # A selective filter already shrinks the scan; probing lists could then miss every match
+        filtered_small = where is not None and int(mask.sum()) <= SCAN_CHUNK_ROWS
+        if self._centroids is not None and self._assign is not None and not filtered_small:
+            # Coarse quantizer: only scan the inverted lists closest to the query
+            probe = min(self.ivf_probe, len(self._centroids))
+            centroid_distance = ((self._centroids - query) ** 2).sum(axis=1)
+            lists = np.argpartition(centroid_distance, probe - 1)[:probe]
+            mask &= np.isin(self._assign[:self._n_rows], lists)
+
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return [], []
+
+        # Squared L2 distance, matching Chroma's default space so scores stay comparable
+        distances = np.empty(len(candidates), dtype=np.float32)
+        query_norm = float(query @ query)
+        contiguous = len(candidates) == self._n_rows
+        for start in range(0, len(candidates), SCAN_CHUNK_ROWS):
+            rows = candidates[start:start + SCAN_CHUNK_ROWS]
+            if contiguous:
+                rows = slice(start, start + len(rows))
+            block = self._vectors[rows]
+            dots = block.astype(np.float32) @ query * scales[rows]
+            distances[start:start + len(dots)] = query_norm + squared_norms[rows] - 2.0 * dots
+
+        k = min(k, len(candidates))
+        top = np.argpartition(distances, k - 1)[:k] if k < len(candidates) else np.arange(len(candidates))
+        top = top[np.argsort(distances[top], kind="stable")]
+        return [self._ids[candidates[i]] for i in top], [float(max(distances[i], 0.0)) for i in top]
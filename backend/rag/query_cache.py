@@ -0,0 +1,83 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+class LRUCache:
+    """Thread-safe LRU cache with optional write-through persistence to a SQLite table."""
+
+    def __init__(self, name: str, max_size: int, db_path: Optional[str] = None):
+        self.name = name
+        self.max_size = max(1, max_size)
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            self._open_db()
+
+    def _open_db(self) -> None:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.name} (key TEXT PRIMARY KEY, value BLOB, used_at REAL)"
+        )
+        # Keep only the most recently used entries on disk, then warm the in-memory LRU from them
+        self._conn.execute(
+            f"DELETE FROM {self.name} WHERE key NOT IN "
+            f"(SELECT key FROM {self.name} ORDER BY used_at DESC LIMIT ?)",
+            (self.max_size,)
+        )
+        self._conn.commit()
+        rows = self._conn.execute(f"SELECT key, value FROM {self.name} ORDER BY used_at ASC").fetchall()
+        for key, value in rows:
+            try:
+                self._entries[key] = pickle.loads(value)
+            except Exception:
+                continue
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_size:
+                evicted.append(self._entries.popitem(last=False)[0])
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        f"INSERT OR REPLACE INTO {self.name} (key, value, used_at) VALUES (?, ?, ?)",
+                        (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time())
+                    )
+                    if evicted:
+                        self._conn.executemany(f"DELETE FROM {self.name} WHERE key = ?", [(k,) for k in evicted])
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Warning: Could not persist {self.name} entry: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                self._conn.execute(f"DELETE FROM {self.name}")
+                self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
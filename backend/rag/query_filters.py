@@ -0,0 +1,146 @@
+import re
+import threading
+from datetime import date
+from calendar import monthrange
+from typing import Dict, Any, Optional, List
+import pandas as pd
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.data_service import get_data_service
+from services.feature_store import get_feature_store
+
+CITY_ALIASES = {
+    'almaty': 'Almaty', 'алматы': 'Almaty', 'алмата': 'Almaty',
+    'astana': 'Astana', 'астана': 'Astana', 'нур-султан': 'Astana',
+    'shymkent': 'Shymkent', 'шымкент': 'Shymkent', 'шимкент': 'Shymkent',
+    'aktobe': 'Aktobe', 'актобе': 'Aktobe',
+    'karaganda': 'Karaganda', 'караганд': 'Karaganda',
+    'atyrau': 'Atyrau', 'атырау': 'Atyrau',
+    'pavlodar': 'Pavlodar', 'павлодар': 'Pavlodar',
+    'taraz': 'Taraz', 'тараз': 'Taraz',
+    'oskemen': 'Oskemen', 'оскемен': 'Oskemen', 'усть-каменогорск': 'Oskemen',
+    'kostanay': 'Kostanay', 'костанай': 'Kostanay'
+}
+
+CHANNEL_ALIASES = {
+    'мобильн': 'mobile_app', 'приложени': 'mobile_app',
+    'маркетплейс': 'marketplace',
+    'офлайн': 'offline_pos', 'оффлайн': 'offline_pos',
+    'интернет-магазин': 'online_store', 'онлайн-магазин': 'online_store',
+    'соцсет': 'social_media', 'социальн': 'social_media'
+}
+
+CATEGORY_ALIASES = {
+    'продукт': 'grocery', 'электроник': 'electronics', ' еды': 'food_delivery',
+    'такси': 'ride_hailing', 'путешеств': 'travel', 'туризм': 'travel',
+    'образован': 'education_services', 'медицин': 'healthcare_services',
+    'одежд': 'retail_fashion'
+}
+
+MONTH_PATTERNS = [
+    (r'январ|january', 1), (r'феврал|february', 2), (r'\bмарт|march', 3),
+    (r'апрел|april', 4), (r'\bма[йяюе]\b|\bmay\b', 5), (r'\bиюн|june', 6),
+    (r'\bиюл|july', 7), (r'август|august', 8), (r'сентябр|september', 9),
+    (r'октябр|october', 10), (r'ноябр|november', 11), (r'декабр|december', 12)
+]
+
+ISO_DATE_PATTERN = r'\b(20\d{2})-(\d{1,2})-(\d{1,2})\b'
+
+_bounds_cache = (None, None)
+_bounds_lock = threading.Lock()
+
+def _date_bounds() -> Optional[pd.Timestamp]:
+    global _bounds_cache
+    data_service = get_data_service()
+    with _bounds_lock:
+        if _bounds_cache[0] != data_service.version:
+            dates = data_service.df['date'] if 'date' in data_service.df.columns else pd.Series(dtype='datetime64[ns]')
+            _bounds_cache = (data_service.version, dates.max() if dates.notna().any() else None)
+        return _bounds_cache[1]
+
+def _match_value(question_lower: str, values: List[str], aliases: Dict[str, str]) -> Optional[str]:
+    for value in values:
+        if value.lower() in question_lower or value.lower().replace('_', ' ') in question_lower:
+            return value
+    for keyword, value in aliases.items():
+        if keyword in question_lower and (not values or value in values):
+            return value
+    return None
+
+def extract_question_filters(question: str) -> Dict[str, Any]:
+    """Structured filters (city, region, channel, category, date range) mentioned in a question."""
+    question_lower = question.lower()
+    filters: Dict[str, Any] = {}
+
+    try:
+        vocabulary = get_feature_store().vocabulary
+    except Exception:
+        vocabulary = {}
+    cities = list(vocabulary.get('city', {}))
+    regions = list(vocabulary.get('region', {}))
+
+    location = _match_value(question_lower, cities or regions, CITY_ALIASES)
+    if location is not None:
+        filters['city' if not cities or location in cities else 'region'] = location
+    elif regions:
+        region = _match_value(question_lower, regions, CITY_ALIASES)
+        if region is not None:
+            filters['region'] = region
+
+    channel = _match_value(question_lower, list(vocabulary.get('channel', {})), CHANNEL_ALIASES)
+    if channel is not None:
+        filters['channel'] = channel
+    category = _match_value(question_lower, list(vocabulary.get('merchant_category', {})), CATEGORY_ALIASES)
+    if category is not None:
+        filters['merchant_category'] = category
+
+    iso_dates = []
+    for y, m, d in re.findall(ISO_DATE_PATTERN, question):
+        try:
+            iso_dates.append(date(int(y), int(m), int(d)))
+        except ValueError:
+            continue
+    iso_dates.sort()
+    if iso_dates:
+        filters['date_from'] = iso_dates[0].isoformat()
+        filters['date_to'] = iso_dates[-1].isoformat()
+        return filters
+
+    years = sorted({int(y) for y in re.findall(r'\b(20\d{2})\b', question)})
+    months = sorted({month for pattern, month in MONTH_PATTERNS if re.search(pattern, question_lower)})
+    if not years and not months:
+        return filters
+
+    if years:
+        first_year, last_year = years[0], years[-1]
+    else:
+        # A bare month refers to its most recent occurrence in the dataset
+        latest = _date_bounds()
+        if latest is None:
+            return filters
+        first_year = last_year = latest.year if months[0] <= latest.month else latest.year - 1
+
+    first_month, last_month = (months[0], months[-1]) if months else (1, 12)
+    filters['date_from'] = date(first_year, first_month, 1).isoformat()
+    filters['date_to'] = date(last_year, last_month, monthrange(last_year, last_month)[1]).isoformat()
+    return filters
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Translate question filters into a vector store metadata `where` clause."""
+    if not filters:
+        return None
+    conditions = [
+        {column: filters[column]}
+        for column in ('city', 'region', 'channel', 'merchant_category')
+        if filters.get(column)
+    ]
+    # Documents cover [date_ord, date_ord_end]; select those overlapping the requested range
+    if filters.get('date_from'):
+        conditions.append({'date_ord_end': {'$gte': date.fromisoformat(filters['date_from']).toordinal()}})
+    if filters.get('date_to'):
+        conditions.append({'date_ord': {'$lte': date.fromisoformat(filters['date_to']).toordinal()}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
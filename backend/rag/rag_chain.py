@@ -1,12 +1,42 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Optional, Callable
+import asyncio
+import hashlib
+import importlib.util
+import json
+import re
+import httpx
 from langchain_openai import ChatOpenAI
-from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config import settings
 from rag.vectorstore import get_vectorstore_manager, ensure_vectorstore_initialized
+from rag.query_filters import extract_question_filters
+from rag.llm_cache import LLMResponseCache
+from rag.context_builder import ContextBuilder, estimate_tokens
+from rag.resilience import LLMGuard, CircuitBreaker, LLMUnavailableError
+from services.concurrency import run_blocking, llm_slot
+from services.single_flight import SingleFlight
+
+def _create_http_clients() -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """Keep-alive connection pools shared by every request made through the LLM client."""
+    pool_limits = httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_SECONDS
+    )
+    client_kwargs = {
+        "limits": pool_limits,
+        "timeout": _llm_timeout(),
+        # httpx only speaks HTTP/2 when the optional h2 package is installed
+        "http2": settings.LLM_HTTP2 and importlib.util.find_spec("h2") is not None,
+    }
+    return httpx.Client(**client_kwargs), httpx.AsyncClient(**client_kwargs)
+
+def _llm_timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS)
 
 class RAGChain:
     
@@ -31,6 +61,12 @@ class RAGChain:
                 base_url = base_url + '/v1'
             llm_kwargs["base_url"] = base_url
         
+        # The OpenAI SDK applies its own per-request timeout, so it is passed to the client too
+        llm_kwargs["timeout"] = _llm_timeout()
+        # Retries are done by LLMGuard within the call deadline, not by the SDK on top of it
+        llm_kwargs["max_retries"] = 0
+        llm_kwargs["http_client"], llm_kwargs["http_async_client"] = _create_http_clients()
+        
         try:
             if not api_key:
                 raise ValueError("API_KEY is not set. Please set API_KEY in .env file.")
@@ -45,6 +81,10 @@ class RAGChain:
                         "openai_api_key": llm_kwargs.get("openai_api_key"),
                         "base_url": llm_kwargs.get("base_url"),
                         "temperature": llm_kwargs.get("temperature"),
+                        "timeout": llm_kwargs.get("timeout"),
+                        "max_retries": llm_kwargs.get("max_retries"),
+                        "http_client": llm_kwargs.get("http_client"),
+                        "http_async_client": llm_kwargs.get("http_async_client"),
                     }
                     self.llm = ChatOpenAI(**{k: v for k, v in minimal_kwargs.items() if v is not None})
                 else:
@@ -65,6 +105,32 @@ class RAGChain:
         self.vectorstore_manager = get_vectorstore_manager()
         self._vectorstore_warning_shown = False
         
+        self.response_cache = None
+        if settings.LLM_CACHE_ENABLED:
+            try:
+                self.response_cache = LLMResponseCache(
+                    settings.LLM_CACHE_PATH,
+                    ttl_seconds=settings.LLM_CACHE_TTL_SECONDS,
+                    max_entries=settings.LLM_CACHE_MAX_ENTRIES
+                )
+            except Exception as e:
+                print(f"Warning: LLM response cache disabled: {str(e)[:100]}")
+        
+        self.llm_flights = SingleFlight()
+        self.llm_guard = LLMGuard(
+            deadline_seconds=settings.LLM_DEADLINE_SECONDS,
+            max_retries=settings.LLM_MAX_RETRIES,
+            backoff_seconds=settings.LLM_RETRY_BACKOFF_SECONDS,
+            hedge=settings.LLM_HEDGE_ENABLED,
+            hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY_SECONDS,
+            breaker=CircuitBreaker(settings.LLM_CIRCUIT_FAILURE_THRESHOLD, settings.LLM_CIRCUIT_RESET_SECONDS)
+        )
+        
+        self.context_builder = ContextBuilder(
+            token_budget=settings.LLM_CONTEXT_TOKEN_BUDGET,
+            max_table_rows=settings.LLM_CONTEXT_MAX_ROWS
+        )
+        
         self.system_prompt = """Ты эксперт по финансовой аналитике и AI-ассистент, специализирующийся на аналитике цифровой экономики Казахстана.
 
 Твоя экспертиза включает:
@@ -106,7 +172,8 @@ class RAGChain:
         for i, doc in enumerate(retrieved_docs, 1):
             context_parts.append(f"Data point {i}:")
             context_parts.append(doc['content'])
-            if doc.get('metadata'):
+            # Summary documents already state their period, dimensions and totals in the text
+            if doc.get('metadata') and doc['metadata'].get('doc_type', 'transaction') == 'transaction':
                 meta = doc['metadata']
                 context_parts.append(f"Metadata: Transaction ID {meta.get('transaction_id', 'N/A')}, "
                                     f"Date: {meta.get('date', 'N/A')}, "
@@ -116,95 +183,21 @@ class RAGChain:
         
         return "\n".join(context_parts)
     
-    def query(self, question: str, use_rag: bool = True, top_k: int = None) -> Dict[str, Any]:
+    def _retrieve_context(self, question: str, top_k: int = None,
+                          empty_context: str = "No relevant data found in dataset.",
+                          failure_context: str = "Unable to retrieve data from dataset. Please check data availability.") -> Tuple[List[Dict[str, Any]], str]:
         retrieved_docs = []
-        
-        if use_rag:
-            try:
-                if ensure_vectorstore_initialized():
-                    retrieved_docs = self.vectorstore_manager.search(question, k=top_k or settings.RAG_TOP_K)
-                    if retrieved_docs:
-                        context = self._format_context(retrieved_docs)
-                    else:
-                        raise ValueError("No results from vectorstore")
-                else:
-                    raise ValueError("Vectorstore not initialized")
-            except Exception as e:
-                error_msg = str(e)
-                if "API key" in error_msg or "401" in error_msg or "invalid_api_key" in error_msg or "Incorrect API key" in error_msg:
-                    if not self._vectorstore_warning_shown:
-                        if "embedding" in error_msg.lower() or "openai" in error_msg.lower():
-                            print("Note: Embeddings service unavailable (needs OpenAI API key for vectorstore). Using CSV fallback for data retrieval.")
-                        else:
-                            print("Note: Vectorstore unavailable (API key issue). Using CSV fallback for data retrieval.")
-                        self._vectorstore_warning_shown = True
-                    error_msg = "API key issue - using CSV fallback"
-                else:
-                    if not self._vectorstore_warning_shown:
-                        print(f"Vectorstore not available, using CSV fallback: {error_msg[:100]}")
-                        self._vectorstore_warning_shown = True
-                
-                try:
-                    from services.data_service import get_data_service
-                    data_service = get_data_service()
-                    retrieved_docs = data_service.get_relevant_data_for_question(
-                        question, 
-                        limit=(top_k or settings.RAG_TOP_K) * 10
-                    )
-                    context = self._format_context(retrieved_docs)
-                    if not retrieved_docs:
-                        context = "No relevant data found in dataset based on question keywords."
-                except Exception as fallback_error:
-                    print(f"CSV fallback also failed: {fallback_error}")
-                    context = "Unable to retrieve data from dataset. Please check data availability."
-        else:
-            context = "No specific context provided. Answer based on general knowledge about financial analytics."
-        
-        messages = [
-            SystemMessage(content=self.system_prompt),
-            HumanMessage(content=f"""Context from dataset:
-{context}
-
-Question: {question}
-
-Please provide a comprehensive answer based strictly on the provided context. If the context doesn't contain enough information to fully answer the question, state what can be determined from the available data and what cannot.""")
-        ]
-        
-        if self.llm is None:
-            return {
-                "answer": "AI service is not available. Please check API_KEY in .env file and ensure langchain-openai is installed.",
-                "sources": retrieved_docs
-            }
-        
-        response = self.llm.invoke(messages)
-        answer = response.content if hasattr(response, 'content') else str(response)
-        
-        sources = []
-        for doc in retrieved_docs:
-            sources.append({
-                "content": doc['content'][:200] + "..." if len(doc['content']) > 200 else doc['content'],
-                "metadata": doc.get('metadata', {}),
-                "relevance_score": doc.get('score', 0)
-            })
-        
-        return {
-            "answer": answer,
-            "sources": sources,
-            "num_sources": len(sources)
-        }
-    
-    def query_with_analytics(self, question: str, data_summary: Dict[str, Any] = None) -> Dict[str, Any]:
-        retrieved_docs = []
-        
         try:
             if ensure_vectorstore_initialized():
-                retrieved_docs = self.vectorstore_manager.search(question, k=settings.RAG_TOP_K)
+                retrieved_docs = self.vectorstore_manager.search(
+                    question,
+                    k=top_k or settings.RAG_TOP_K,
+                    filters=extract_question_filters(question)
+                )
                 if retrieved_docs:
-                    context = self._format_context(retrieved_docs)
-                else:
-                    raise ValueError("No results from vectorstore")
-            else:
-                raise ValueError("Vectorstore not initialized")
+                    return retrieved_docs, self._format_context(retrieved_docs)
+                raise ValueError("No results from vectorstore")
+            raise ValueError("Vectorstore not initialized")
         except Exception as e:
             error_msg = str(e)
             if "API key" in error_msg or "401" in error_msg or "invalid_api_key" in error_msg or "Incorrect API key" in error_msg:
@@ -214,31 +207,41 @@ Please provide a comprehensive answer based strictly on the provided context. If
                     else:
                         print("Note: Vectorstore unavailable (API key issue). Using CSV fallback for data retrieval.")
                     self._vectorstore_warning_shown = True
-                error_msg = "API key issue - using CSV fallback"
             else:
                 if not self._vectorstore_warning_shown:
                     print(f"Vectorstore not available, using CSV fallback: {error_msg[:100]}")
                     self._vectorstore_warning_shown = True
-            
-            try:
-                from services.data_service import get_data_service
-                data_service = get_data_service()
-                retrieved_docs = data_service.get_relevant_data_for_question(
-                    question, 
-                    limit=settings.RAG_TOP_K * 10
-                )
-                context = self._format_context(retrieved_docs) if retrieved_docs else "No relevant data found in dataset."
-            except Exception as fallback_error:
-                print(f"CSV fallback also failed: {fallback_error}")
-                context = "Unable to retrieve data from dataset. Using provided analytics summary only."
         
-        summary_text = ""
-        if data_summary:
-            summary_text = f"\n\nAdditional Analytics Summary:\n"
-            for key, value in data_summary.items():
-                summary_text += f"{key}: {value}\n"
+        try:
+            from services.data_service import get_data_service
+            data_service = get_data_service()
+            retrieved_docs = data_service.get_relevant_data_for_question(
+                question, 
+                limit=(top_k or settings.RAG_TOP_K) * 10
+            )
+            context = self._format_context(retrieved_docs) if retrieved_docs else empty_context
+        except Exception as fallback_error:
+            print(f"CSV fallback also failed: {fallback_error}")
+            context = failure_context
+        return retrieved_docs, context
+    
+    def _query_messages(self, question: str, context: str) -> List[BaseMessage]:
+        return [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""Context from dataset:
+{context}
+
+Question: {question}
+
+Please provide a comprehensive answer based strictly on the provided context. If the context doesn't contain enough information to fully answer the question, state what can be determined from the available data and what cannot.""")
+        ]
+    
+    def _analytics_messages(self, question: str, context: str, data_summary: Dict[str, Any] = None) -> List[BaseMessage]:
+        summary_text, context = self.context_builder.build(data_summary, context)
+        if summary_text:
+            summary_text = f"\n\nAdditional Analytics Summary:\n{summary_text}\n"
         
-        messages = [
+        return [
             SystemMessage(content=self.system_prompt),
             HumanMessage(content=f"""Контекст из датасета:
 {context}
@@ -248,16 +251,30 @@ Please provide a comprehensive answer based strictly on the provided context. If
 
 Предоставь комплексный анализ на основе предоставленных данных. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ.""")
         ]
-        
-        if self.llm is None:
-            return {
-                "answer": "AI service is not available. Please check API_KEY in .env file and ensure langchain-openai is installed.",
-                "sources": retrieved_docs
-            }
-        
-        response = self.llm.invoke(messages)
-        answer = response.content if hasattr(response, 'content') else str(response)
-        
+    
+    def _unavailable_result(self, retrieved_docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            "answer": "AI service is not available. Please check API_KEY in .env file and ensure langchain-openai is installed.",
+            "sources": retrieved_docs,
+            "fallback": True
+        }
+    
+    def _degraded_result(self, retrieved_docs: List[Dict[str, Any]], error: LLMUnavailableError) -> Dict[str, Any]:
+        print(f"Warning: {error}")
+        result = self._format_result(
+            "AI analysis is temporarily unavailable: the LLM did not answer in time. "
+            "The metrics in this response are computed from the data and are complete.",
+            retrieved_docs
+        )
+        result["fallback"] = True
+        return result
+    
+    @staticmethod
+    def _prompt_tokens(messages: List[BaseMessage]) -> int:
+        return sum(estimate_tokens(message.content) for message in messages)
+    
+    def _format_result(self, answer: str, retrieved_docs: List[Dict[str, Any]],
+                       prompt_tokens: Optional[int] = None) -> Dict[str, Any]:
         sources = []
         for doc in retrieved_docs:
             sources.append({
@@ -266,13 +283,165 @@ Please provide a comprehensive answer based strictly on the provided context. If
                 "relevance_score": doc.get('score', 0)
             })
         
-        return {
+        result = {
             "answer": answer,
             "sources": sources,
             "num_sources": len(sources)
         }
+        if prompt_tokens is not None:
+            result["prompt_tokens"] = prompt_tokens
+        return result
+    
+    def _prompt_key(self, messages: List[BaseMessage]) -> Tuple[str, str]:
+        from services.data_service import get_data_service
+        data_version = get_data_service().version or ""
+        # The system prompt is the first message, so it is part of the hashed payload
+        payload = json.dumps({
+            "model": settings.LLM_MODEL,
+            "temperature": getattr(self.llm, "temperature", None),
+            "data_version": data_version,
+            "messages": [[message.type, message.content] for message in messages]
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest(), data_version
+    
+    async def _ainvoke(self, messages: List[BaseMessage], use_cache: bool = True,
+                       cache_if: Optional[Callable[[str], bool]] = None) -> str:
+        key, data_version = self._prompt_key(messages)
+        # Identical prompts in flight at the same time share one LLM call
+        return await self.llm_flights.ado(
+            (key, use_cache), lambda: self._acall_llm(messages, key, data_version, use_cache, cache_if)
+        )
+    
+    async def _acall_llm(self, messages: List[BaseMessage], key: str, data_version: str, use_cache: bool,
+                         cache_if: Optional[Callable[[str], bool]]) -> str:
+        if self.response_cache is not None and use_cache:
+            cached = await run_blocking(self.response_cache.get, key)
+            if cached is not None:
+                return cached
+        async with llm_slot():
+            response = await self.llm_guard.ainvoke(lambda: self.llm.ainvoke(messages))
+        answer = response.content if hasattr(response, 'content') else str(response)
+        # A bypassed call still refreshes the entry for later callers
+        if self.response_cache is not None and answer and (cache_if is None or cache_if(answer)):
+            await run_blocking(self.response_cache.put, key, data_version, answer)
+        return answer
+    
+    async def aquery(self, question: str, use_rag: bool = True, top_k: int = None, use_cache: bool = True) -> Dict[str, Any]:
+        retrieved_docs, context = await run_blocking(self._query_context, question, use_rag, top_k)
+        if self.llm is None:
+            return self._unavailable_result(retrieved_docs)
+        try:
+            answer = await self._ainvoke(self._query_messages(question, context), use_cache)
+        except LLMUnavailableError as e:
+            return self._degraded_result(retrieved_docs, e)
+        return self._format_result(answer, retrieved_docs)
+    
+    def _query_context(self, question: str, use_rag: bool, top_k: int = None) -> Tuple[List[Dict[str, Any]], str]:
+        if not use_rag:
+            return [], "No specific context provided. Answer based on general knowledge about financial analytics."
+        return self._retrieve_context(
+            question, top_k,
+            empty_context="No relevant data found in dataset based on question keywords."
+        )
+    
+    def _analytics_context(self, question: str) -> Tuple[List[Dict[str, Any]], str]:
+        return self._retrieve_context(
+            question,
+            failure_context="Unable to retrieve data from dataset. Using provided analytics summary only."
+        )
+    
+    async def aquery_with_analytics(self, question: str, data_summary: Dict[str, Any] = None,
+                                    use_cache: bool = True) -> Dict[str, Any]:
+        retrieved_docs, context = await run_blocking(self._analytics_context, question)
+        if self.llm is None:
+            return self._unavailable_result(retrieved_docs)
+        messages = self._analytics_messages(question, context, data_summary)
+        try:
+            answer = await self._ainvoke(messages, use_cache)
+        except LLMUnavailableError as e:
+            return self._degraded_result(retrieved_docs, e)
+        return self._format_result(answer, retrieved_docs, self._prompt_tokens(messages))
+
+    def _batch_messages(self, sections: Dict[str, Tuple[str, Dict[str, Any]]], context: str) -> List[BaseMessage]:
+        # The shared context gets one section's share of the budget, each panel another
+        builder = ContextBuilder(
+            token_budget=max(1, self.context_builder.token_budget // (len(sections) + 1)),
+            max_table_rows=self.context_builder.max_table_rows
+        )
+        _, context = builder.build(None, context)
+        parts = []
+        for panel, (question, data_summary) in sections.items():
+            summary_text, _ = builder.build(data_summary, "")
+            parts.append(f"### {panel}\n{question}\n\nДанные раздела:\n{summary_text}\n")
+        
+        return [
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""Контекст из датасета:
+{context}
 
-    def generate_sql_query(self, question: str, table_schema: Dict[str, Any]) -> Dict[str, Any]:
+Ниже {len(sections)} разделов дашборда. Выполни задание каждого раздела отдельно, опираясь на его данные.
+
+{chr(10).join(parts)}
+
+Верни ТОЛЬКО JSON-объект без markdown-обертки с ключами: {", ".join(sections)}.
+Значение каждого ключа - строка с анализом соответствующего раздела (внутри строки можно использовать Markdown). ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ.""")
+        ]
+    
+    @staticmethod
+    def _split_batch_answer(answer: str, panels) -> Dict[str, str]:
+        match = re.search(r'\{[\s\S]*\}', answer) if answer else None
+        if not match:
+            return {}
+        try:
+            parsed = json.loads(match.group())
+        except json.JSONDecodeError:
+            return {}
+        if not isinstance(parsed, dict):
+            return {}
+        return {panel: parsed[panel].strip() for panel in panels
+                if isinstance(parsed.get(panel), str) and parsed[panel].strip()}
+    
+    def _batch_context(self, sections: Dict[str, Tuple[str, Dict[str, Any]]]) -> str:
+        _, context = self._analytics_context("\n".join(question for question, _ in sections.values()))
+        return context
+    
+    def _batch_cache_if(self, sections: Dict[str, Tuple[str, Dict[str, Any]]]) -> Callable[[str], bool]:
+        # Only cache replies that split cleanly, otherwise a bad reply would be replayed
+        return lambda answer: len(self._split_batch_answer(answer, sections)) == len(sections)
+    
+    async def abatch_insights(self, sections: Dict[str, Tuple[str, Dict[str, Any]]], use_cache: bool = True) -> Dict[str, str]:
+        """Insights for several panels from one LLM call.
+
+        `sections` maps a panel name to its (question, data_summary). The reply is
+        requested as JSON keyed by panel; panels missing from it (or all of them if the
+        reply does not parse) fall back to individual aquery_with_analytics calls.
+        """
+        if not sections:
+            return {}
+        if self.llm is None:
+            return {panel: self._unavailable_result([])["answer"] for panel in sections}
+        answer = ""
+        try:
+            context = await run_blocking(self._batch_context, sections)
+            answer = await self._ainvoke(self._batch_messages(sections, context), use_cache,
+                                         cache_if=self._batch_cache_if(sections))
+        except LLMUnavailableError as e:
+            # Per-panel calls would only wait out the same outage again
+            degraded = self._degraded_result([], e)["answer"]
+            return {panel: degraded for panel in sections}
+        except Exception as e:
+            print(f"Warning: Batched insight call failed: {str(e)[:200]}")
+        insights = self._split_batch_answer(answer, sections)
+        missing = [panel for panel in sections if panel not in insights]
+        if missing:
+            print(f"Warning: Batched insights missing {missing}, falling back to separate calls")
+            results = await asyncio.gather(*(
+                self.aquery_with_analytics(sections[panel][0], sections[panel][1], use_cache) for panel in missing
+            ))
+            insights.update({panel: result["answer"] for panel, result in zip(missing, results)})
+        return {panel: insights[panel] for panel in sections}
+
+    def _sql_messages(self, question: str, table_schema: Dict[str, Any]) -> List[BaseMessage]:
         sql_system_prompt = """You are a SQL query generator specialized in financial transaction data analysis.
 
 Your task is to generate valid SQL queries based on natural language questions about the transactions table.
@@ -320,41 +489,43 @@ Sample cities: {cities_text}"""
 
 Generate a SQL query to answer this question. Return ONLY the SQL query, no explanations."""
 
-        messages = [
+        return [
             SystemMessage(content=sql_system_prompt),
             HumanMessage(content=user_message)
         ]
+    
+    def _sql_result(self, question: str, table_schema: Dict[str, Any], answer: str) -> Dict[str, Any]:
+        sql_query = answer.strip()
+        if sql_query.startswith("```sql"):
+            sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
+        elif sql_query.startswith("```"):
+            sql_query = sql_query.replace("```", "").strip()
         
-        if self.llm is None:
-            return {
-                "sql_query": f"SELECT * FROM transactions LIMIT 10",
-                "explanation": "AI service is not available. Please check API_KEY in .env file.",
-                "table_name": table_schema.get('table_name', 'transactions')
-            }
+        explanation = f"Generated SQL query for: {question}"
         
+        return {
+            "sql_query": sql_query,
+            "explanation": explanation,
+            "table_name": table_schema.get('table_name', 'transactions')
+        }
+    
+    def _sql_fallback(self, table_schema: Dict[str, Any], explanation: str) -> Dict[str, Any]:
+        return {
+            "sql_query": f"SELECT * FROM transactions LIMIT 10",
+            "explanation": explanation,
+            "table_name": table_schema.get('table_name', 'transactions'),
+            "fallback": True
+        }
+    
+    async def agenerate_sql_query(self, question: str, table_schema: Dict[str, Any],
+                                  use_cache: bool = True) -> Dict[str, Any]:
+        if self.llm is None:
+            return self._sql_fallback(table_schema, "AI service is not available. Please check API_KEY in .env file.")
         try:
-            response = self.llm.invoke(messages)
-            answer = response.content if hasattr(response, 'content') else str(response)
-            
-            sql_query = answer.strip()
-            if sql_query.startswith("```sql"):
-                sql_query = sql_query.replace("```sql", "").replace("```", "").strip()
-            elif sql_query.startswith("```"):
-                sql_query = sql_query.replace("```", "").strip()
-            
-            explanation = f"Generated SQL query for: {question}"
-            
-            return {
-                "sql_query": sql_query,
-                "explanation": explanation,
-                "table_name": table_schema.get('table_name', 'transactions')
-            }
+            answer = await self._ainvoke(self._sql_messages(question, table_schema), use_cache)
+            return self._sql_result(question, table_schema, answer)
         except Exception as e:
-            return {
-                "sql_query": f"SELECT * FROM transactions LIMIT 10",
-                "explanation": f"Error generating SQL: {str(e)}",
-                "table_name": table_schema.get('table_name', 'transactions')
-            }
+            return self._sql_fallback(table_schema, f"Error generating SQL: {str(e)}")
 
 _rag_chain = None
 
@@ -0,0 +1,198 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Optional, TypeVar
+import httpx
+
+try:
+    from openai import APIConnectionError
+except ImportError:
+    APIConnectionError = None
+
+T = TypeVar("T")
+
+class LLMUnavailableError(RuntimeError):
+    """The LLM could not answer in time: the circuit is open or the deadline ran out."""
+
+def is_transient_error(error: BaseException) -> bool:
+    """Timeouts, connection failures, 408/409/429 and 5xx are worth retrying; other errors are not."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    if APIConnectionError is not None and isinstance(error, APIConnectionError):
+        return True
+    status = getattr(error, "status_code", None)
+    return isinstance(status, int) and (status in (408, 409, 429) or status >= 500)
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failed calls and rejects calls for
+    `reset_seconds`; then lets one trial call through (half-open) to decide whether to close."""
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and now - self.opened_at < self.reset_seconds:
+                return False
+            # A trial that never reported back (e.g. cancelled) does not block the next one forever
+            if self.state == "half_open" and now - self._trial_started < self.reset_seconds:
+                return False
+            self.state = "half_open"
+            self._trial_started = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    print(f"Warning: LLM circuit opened after {self.failures} failed calls")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+class LLMGuard:
+    """Deadlines, jittered retries, optional hedging and a circuit breaker around LLM calls.
+
+    Every call gets `deadline_seconds` in total across its attempts. Transient errors are
+    retried up to `max_retries` times with full-jitter exponential backoff while the
+    deadline allows. With hedging on, a call that has not answered after the
+    observed p95 latency (at least `hedge_min_delay`) gets a second identical request
+    and the first reply wins. A call that still fails counts towards the breaker, and
+    callers get LLMUnavailableError so they can use their deterministic fallback.
+    """
+
+    def __init__(self, deadline_seconds: float = 45.0, max_retries: int = 2, backoff_seconds: float = 0.5,
+                 hedge: bool = False, hedge_min_delay: float = 2.0, breaker: Optional[CircuitBreaker] = None):
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max(0, max_retries)
+        self.backoff_seconds = backoff_seconds
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.breaker = breaker or CircuitBreaker()
+        self.hedged = 0
+        self.retried = 0
+        self._latencies: "deque[float]" = deque(maxlen=200)
+
+    def p95(self) -> Optional[float]:
+        if len(self._latencies) < 20:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def _hedge_delay(self) -> Optional[float]:
+        p95 = self.p95() if self.hedge else None
+        return max(self.hedge_min_delay, p95) if p95 is not None else None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.backoff_seconds * (2 ** attempt))
+
+    def _check_open(self) -> None:
+        if not self.breaker.allow():
+            raise LLMUnavailableError("LLM circuit is open after repeated failures")
+
+    def _give_up(self, error: Optional[BaseException]) -> LLMUnavailableError:
+        self.breaker.record_failure()
+        reason = f"{type(error).__name__}: {str(error)[:200]}" if error is not None else "deadline exceeded"
+        return LLMUnavailableError(f"LLM unavailable ({reason})")
+
+    async def ainvoke(self, factory: Callable[[], Awaitable[T]]) -> T:
+        """Async call; `factory()` makes one request. Attempts are cancelled at the deadline."""
+        self._check_open()
+        deadline = time.monotonic() + self.deadline_seconds
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(self._hedged(factory, remaining), timeout=remaining)
+            except Exception as e:
+                if not is_transient_error(e):
+                    # The endpoint answered, so the breaker sees it as up
+                    self.breaker.record_success()
+                    raise
+                last_error = e
+                pause = self._backoff(attempt)
+                if attempt == self.max_retries or time.monotonic() + pause >= deadline:
+                    break
+                self.retried += 1
+                await asyncio.sleep(pause)
+                continue
+            self._latencies.append(time.monotonic() - started)
+            self.breaker.record_success()
+            return result
+        raise self._give_up(last_error) from last_error
+
+    async def _hedged(self, factory: Callable[[], Awaitable[T]], remaining: float) -> T:
+        delay = self._hedge_delay()
+        first = asyncio.ensure_future(factory())
+        if delay is None or delay >= remaining:
+            return await first
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                self.hedged += 1
+                tasks.append(asyncio.ensure_future(factory()))
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def astream(self, open_stream: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """Streams are not retried or hedged once output has started; the deadline bounds the first chunk."""
+        self._check_open()
+        stream = open_stream()
+        first = True
+        try:
+            while True:
+                try:
+                    if first:
+                        chunk = await asyncio.wait_for(stream.__anext__(), timeout=self.deadline_seconds)
+                        first = False
+                    else:
+                        chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                yield chunk
+        except Exception as e:
+            if not is_transient_error(e):
+                self.breaker.record_success()
+                raise
+            raise self._give_up(e) from e
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+        self.breaker.record_success()
+
+    def stats(self) -> dict:
+        return {"circuit": self.breaker.state, "consecutive_failures": self.breaker.failures,
+                "p95_seconds": self.p95(),
+                "retried": self.retried, "hedged": self.hedged}
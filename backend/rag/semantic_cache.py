@@ -0,0 +1,180 @@
+import json
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import settings
+
+class SemanticAnswerCache:
+    """Answers to earlier questions, looked up by embedding similarity.
+
+    Vectors live in one in-process matrix (one row per entry) that is scanned with a
+    single matrix-vector product. An entry only matches questions of the same
+    namespace (endpoint), dataset version and guard - the filters, numbers and
+    direction words (highest/lowest, growth/decline...) named in the question - so
+    "выручка в Алматы" never answers "выручка в Астане" and "highest revenue" never
+    answers "lowest revenue", however close the embeddings are. The least recently
+    used entry is replaced when full.
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 1000):
+        self.threshold = threshold
+        self.max_entries = max(1, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.ndarray] = None
+        self._keys: List[Optional[Tuple[str, str, str]]] = [None] * self.max_entries
+        self._payloads: List[Any] = [None] * self.max_entries
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+
+    def _match(self, key: Tuple[str, str, str], vector: np.ndarray) -> Tuple[Optional[int], float]:
+        if self._vectors is None or not self._lru or self._vectors.shape[1] != vector.shape[0]:
+            return None, 0.0
+        slots = np.fromiter((slot for slot in self._lru if self._keys[slot] == key), dtype=np.int64)
+        if len(slots) == 0:
+            return None, 0.0
+        scores = self._vectors[slots] @ vector
+        best = int(np.argmax(scores))
+        return int(slots[best]), float(scores[best])
+
+    def get(self, key: Tuple[str, str, str], vector: np.ndarray) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            slot, score = self._match(key, vector)
+            if slot is None or score < self.threshold:
+                self.misses += 1
+                return None
+            self._lru.move_to_end(slot)
+            self.hits += 1
+            return self._payloads[slot], score
+
+    def put(self, key: Tuple[str, str, str], vector: np.ndarray, payload: Any) -> None:
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                # First entry (or the embedding model changed): size the index for it
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._keys = [None] * self.max_entries
+                self._payloads = [None] * self.max_entries
+                self._lru.clear()
+            # Answers for an older dataset or embedding fit can never match again; free their slots
+            data_version = key[1]
+            for stale in [slot for slot in self._lru if self._keys[slot][1] != data_version]:
+                del self._lru[stale]
+                self._keys[stale] = self._payloads[stale] = None
+
+            slot, score = self._match(key, vector)
+            if slot is None or score < self.threshold:
+                if len(self._lru) < self.max_entries:
+                    slot = next(index for index, existing in enumerate(self._keys) if existing is None)
+                else:
+                    slot, _ = self._lru.popitem(last=False)
+            self._vectors[slot] = vector
+            self._keys[slot] = key
+            self._payloads[slot] = payload
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self._keys = [None] * self.max_entries
+            self._payloads = [None] * self.max_entries
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._lru), "max_entries": self.max_entries, "threshold": self.threshold,
+                    "hits": self.hits, "misses": self.misses}
+
+# Direction -> word stems that ask for it. Embeddings put opposite questions next to
+# each other ("highest" vs "lowest revenue"), so the matched directions must be equal.
+POLARITY_MARKERS = {
+    "high": ["highest", "largest", "biggest", "most", "max", "top", "больш", "наибольш", "максим", "высш", "высок"],
+    "low": ["lowest", "smallest", "least", "min", "bottom", "fewest", "меньш", "наименьш", "миним", "низк"],
+    "best": ["best", "лучш"],
+    "worst": ["worst", "худш"],
+    "up": ["growth", "grow", "increase", "rise", "рост", "вырос", "увелич"],
+    "down": ["decline", "decrease", "drop", "fall", "паден", "упал", "сниж", "снизил", "уменьш"],
+}
+
+def _question_polarity(question: str) -> List[str]:
+    words = re.findall(r"\w+", question.lower())
+    return sorted(direction for direction, stems in POLARITY_MARKERS.items()
+                  if any(word.startswith(stem) for word in words for stem in stems))
+
+def _question_guard(question: str) -> str:
+    from rag.query_filters import extract_question_filters
+    try:
+        filters = extract_question_filters(question)
+    except Exception:
+        filters = {}
+    numbers = sorted(set(re.findall(r"\d+", question)))
+    return json.dumps([filters, numbers, _question_polarity(question)], sort_keys=True, default=str)
+
+def _question_key(namespace: str, question: str) -> Optional[Tuple[Tuple[str, str, str], np.ndarray]]:
+    from services.data_service import get_data_service
+    from rag.vectorstore import get_vectorstore_manager
+    manager = get_vectorstore_manager()
+    vector = manager.embed_query(question.strip())
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    if norm == 0:
+        return None
+    # Vectors from another embedding model (or another local fit) are not comparable
+    version = f"{get_data_service().version or ''}:{manager.embedding_signature}"
+    key = (namespace, version, _question_guard(question))
+    return key, vector / norm
+
+_semantic_cache = None
+_semantic_cache_lock = threading.Lock()
+
+def semantic_cache_enabled() -> bool:
+    """With "auto" the cache is on only for OpenAI embeddings: local ones are lexical and
+    score questions that differ in one word (e.g. highest/lowest) as near-duplicates."""
+    value = settings.SEMANTIC_CACHE_ENABLED
+    if value == "auto":
+        from rag.embeddings import resolve_embedding_backend
+        return resolve_embedding_backend() == "openai"
+    return value in ("1", "true", "yes")
+
+def get_semantic_cache() -> Optional[SemanticAnswerCache]:
+    global _semantic_cache
+    if not semantic_cache_enabled():
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticAnswerCache(settings.SEMANTIC_CACHE_THRESHOLD, settings.SEMANTIC_CACHE_MAX_ENTRIES)
+        return _semantic_cache
+
+def lookup_answer(namespace: str, question: str) -> Optional[Dict[str, Any]]:
+    """Cached payload for a question similar enough to an earlier one, else None (blocking: embeds the question)."""
+    cache = get_semantic_cache()
+    if cache is None:
+        return None
+    try:
+        question_key = _question_key(namespace, question)
+    except Exception as e:
+        print(f"Warning: Semantic cache lookup skipped: {str(e)[:100]}")
+        return None
+    if question_key is None:
+        return None
+    found = cache.get(*question_key)
+    return found[0] if found is not None else None
+
+def store_answer(namespace: str, question: str, payload: Dict[str, Any]) -> None:
+    cache = get_semantic_cache()
+    if cache is None:
+        return
+    try:
+        question_key = _question_key(namespace, question)
+    except Exception as e:
+        print(f"Warning: Could not store answer in semantic cache: {str(e)[:100]}")
+        return
+    if question_key is not None:
+        cache.put(*question_key, payload)
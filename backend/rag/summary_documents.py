@@ -0,0 +1,128 @@
+from typing import List, Dict, Any, Tuple
+import pandas as pd
+
+# (document type, group keys, period column)
+SUMMARY_GRAINS = [
+    ("day_city", ["day", "city"], "day"),
+    ("month_channel", ["month", "channel"], "month"),
+    ("month_category", ["month", "merchant_category"], "month"),
+]
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    frame = pd.DataFrame(index=df.index)
+    dates = pd.to_datetime(df['date'], errors='coerce') if 'date' in df.columns else pd.Series(pd.NaT, index=df.index)
+    frame['date'] = dates
+    frame['day'] = dates.dt.strftime('%Y-%m-%d')
+    frame['month'] = dates.dt.strftime('%Y-%m')
+    for column in ('city', 'channel', 'merchant_category', 'merchant_id'):
+        frame[column] = df[column].astype(str) if column in df.columns else ''
+    frame['amount_kzt'] = pd.to_numeric(df['amount_kzt'], errors='coerce').fillna(0.0) if 'amount_kzt' in df.columns else 0.0
+    for column in ('is_refunded', 'is_canceled', 'suspicious_flag'):
+        frame[column] = (pd.to_numeric(df[column], errors='coerce') == 1).astype(int) if column in df.columns else 0
+    frame['valid_amount'] = frame['amount_kzt'].where((frame['is_refunded'] == 0) & (frame['is_canceled'] == 0), 0.0)
+    frame['is_valid'] = ((frame['is_refunded'] == 0) & (frame['is_canceled'] == 0)).astype(int)
+    return frame[frame['date'].notna()]
+
+def _aggregate(frame: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    grouped = frame.groupby(keys, sort=True).agg(
+        transactions=('amount_kzt', 'size'),
+        valid_transactions=('is_valid', 'sum'),
+        revenue=('valid_amount', 'sum'),
+        refunds=('is_refunded', 'sum'),
+        cancels=('is_canceled', 'sum'),
+        suspicious=('suspicious_flag', 'sum'),
+        first_date=('date', 'min'),
+        last_date=('date', 'max'),
+    )
+    grouped['avg_amount'] = (grouped['revenue'] / grouped['valid_transactions'].where(grouped['valid_transactions'] > 0)).fillna(0.0)
+    grouped['refund_rate'] = grouped['refunds'] / grouped['transactions']
+    grouped['cancel_rate'] = grouped['cancels'] / grouped['transactions']
+    return grouped
+
+def _top_values(frame: pd.DataFrame, keys: List[str], column: str) -> pd.Series:
+    # Most frequent value of `column` within each group, ties broken alphabetically
+    counts = frame.groupby(keys + [column]).size().reset_index(name='n')
+    counts = counts.sort_values(keys + ['n', column], ascending=[True] * len(keys) + [False, True])
+    return counts.drop_duplicates(keys).set_index(keys)[column]
+
+def _metrics_text(row) -> str:
+    return (f"Transactions: {int(row.transactions)}. "
+            f"Revenue (excluding refunds and cancellations): {row.revenue:.2f} KZT. "
+            f"Average amount: {row.avg_amount:.2f} KZT. "
+            f"Refund rate: {row.refund_rate * 100:.1f}% ({int(row.refunds)}). "
+            f"Cancel rate: {row.cancel_rate * 100:.1f}% ({int(row.cancels)}). "
+            f"Suspicious transactions: {int(row.suspicious)}.")
+
+def _metrics_metadata(row) -> Dict[str, Any]:
+    return {
+        "transactions": int(row.transactions),
+        "revenue_kzt": round(float(row.revenue), 2),
+        "refund_rate": round(float(row.refund_rate), 4),
+        "cancel_rate": round(float(row.cancel_rate), 4),
+        "suspicious_count": int(row.suspicious),
+        "date_ord": row.first_date.toordinal(),
+        "date_ord_end": row.last_date.toordinal(),
+    }
+
+def _grain_documents(frame: pd.DataFrame, doc_type: str, keys: List[str], period: str) -> List[Tuple[str, Dict[str, Any]]]:
+    dimension = keys[1]
+    frame = frame[frame[dimension] != '']
+    if frame.empty:
+        return []
+    grouped = _aggregate(frame, keys)
+    context_columns = [c for c in ('channel', 'merchant_category', 'city') if c != dimension]
+    top = {column: _top_values(frame, keys, column) for column in context_columns}
+
+    documents = []
+    for key, row in zip(grouped.index, grouped.itertuples()):
+        period_value, value = key
+        title = "Daily" if period == "day" else "Monthly"
+        label = dimension.replace('merchant_', '').capitalize()
+        parts = [f"{title} {dimension.replace('merchant_', '')} summary.",
+                 f"{'Date' if period == 'day' else 'Month'}: {period_value}.",
+                 f"{label}: {value}.",
+                 _metrics_text(row)]
+        parts += [f"Top {column.replace('merchant_', '')}: {top[column].get(key, '')}." for column in context_columns]
+        metadata = {"doc_type": doc_type, period if period == "month" else "date": period_value, dimension: value}
+        metadata.update(_metrics_metadata(row))
+        documents.append((" ".join(parts), metadata))
+    return documents
+
+def _merchant_documents(frame: pd.DataFrame, top_merchants: int) -> List[Tuple[str, Dict[str, Any]]]:
+    if top_merchants <= 0:
+        return []
+    frame = frame[frame['merchant_id'] != '']
+    if frame.empty:
+        return []
+    grouped = _aggregate(frame, ['merchant_id']).sort_values('revenue', ascending=False).head(top_merchants)
+    subset = frame[frame['merchant_id'].isin(grouped.index)]
+    top = {column: _top_values(subset, ['merchant_id'], column) for column in ('merchant_category', 'city', 'channel')}
+
+    documents = []
+    for merchant_id, row in zip(grouped.index, grouped.itertuples()):
+        category = str(top['merchant_category'].get(merchant_id, ''))
+        city = str(top['city'].get(merchant_id, ''))
+        text = (f"Merchant summary. Merchant ID: {merchant_id}. Category: {category}. Main city: {city}. "
+                f"Main channel: {top['channel'].get(merchant_id, '')}. "
+                f"Period: {row.first_date:%Y-%m-%d} to {row.last_date:%Y-%m-%d}. " + _metrics_text(row))
+        metadata = {"doc_type": "merchant", "merchant_id": int(merchant_id) if str(merchant_id).isdigit() else 0,
+                    "merchant_category": category, "city": city}
+        metadata.update(_metrics_metadata(row))
+        documents.append((text, metadata))
+    return documents
+
+def build_summary_documents(df: pd.DataFrame, top_merchants: int = 500) -> List[Tuple[str, Dict[str, Any]]]:
+    """Aggregate documents (text, metadata) for the summary index mode.
+
+    Grains are day x city, month x channel, month x category and the top merchants
+    by revenue. Every document carries `date_ord`/`date_ord_end` for the period it
+    covers so date filters select overlapping summaries.
+    """
+    frame = _prepare(df)
+    if frame.empty:
+        return []
+    documents = []
+    for doc_type, keys, period in SUMMARY_GRAINS:
+        documents.extend(_grain_documents(frame, doc_type, keys, period))
+    documents.extend(_merchant_documents(frame, top_merchants))
+    return documents
@@ -1,38 +1,138 @@
 import os
-from typing import List, Dict, Any, Optional
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+import numpy as np
 import pandas as pd
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain_core.documents import Document
 import sys
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config import settings
+from services.health import set_component_state
+from rag.embeddings import resolve_embedding_backend, create_local_embeddings, LOCAL_STATE_FILE
+from rag.query_cache import LRUCache
+from rag.query_filters import build_where
+from rag.numpy_index import NumpyVectorIndex
+from rag.summary_documents import build_summary_documents
+
+CHECKPOINT_FILE = "build_checkpoint.json"
+SYNC_STATE_FILE = "sync_state.json"
+DELETE_BATCH_SIZE = 5000
+# Bump when the stored metadata layout changes; existing rows get their metadata rewritten on sync
+METADATA_SCHEMA = 3
+
+def _safe_int(val, default=0):
+    try:
+        return int(val) if pd.notna(val) and val != '' else default
+    except (ValueError, TypeError):
+        return default
+
+def _safe_float(val, default=0.0):
+    try:
+        return float(val) if pd.notna(val) and val != '' else default
+    except (ValueError, TypeError):
+        return default
+
+def _safe_str(val, default=''):
+    try:
+        return str(val) if pd.notna(val) and val != '' else default
+    except (ValueError, TypeError):
+        return default
+
+def _date_ord(val) -> int:
+    try:
+        timestamp = pd.Timestamp(val)
+        return timestamp.toordinal() if pd.notna(timestamp) else 0
+    except (ValueError, TypeError):
+        return 0
+
+def _row_id(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
 
 class VectorStoreManager:
     
-    def __init__(self):
+    def __init__(self, embeddings=None):
+        self.vector_backend = (settings.VECTOR_BACKEND or "chroma").lower()
+        if self.vector_backend not in ("chroma", "numpy"):
+            raise ValueError(f"Unknown VECTOR_BACKEND: {self.vector_backend}. Use chroma or numpy.")
+        # Each backend keeps its own sync state so switching backends never mixes indexes
+        self.persist_dir = (settings.CHROMA_PERSIST_DIR if self.vector_backend == "chroma"
+                            else os.path.join(settings.CHROMA_PERSIST_DIR, "numpy_index"))
+        self.index_mode = (settings.VECTOR_INDEX_MODE or "rows").lower()
+        if self.index_mode not in ("rows", "summary"):
+            raise ValueError(f"Unknown VECTOR_INDEX_MODE: {self.index_mode}. Use rows or summary.")
+        self.embedding_backend = resolve_embedding_backend()
+        self.embeddings = embeddings if embeddings is not None else self._create_embeddings()
+        self.vectorstore = None
+        self.collection_name = "financial_transactions"
+        self._sync_lock = threading.Lock()
+        self.index_version = None
+        cache_path = settings.QUERY_CACHE_PATH or None
+        self.embedding_cache = LRUCache("query_embeddings", settings.QUERY_EMBEDDING_CACHE_SIZE, cache_path)
+        self.retrieval_cache = LRUCache("retrieval_results", settings.RETRIEVAL_CACHE_SIZE, cache_path)
+        if self.embeddings is None:
+            self._report_state("unavailable", reason="embeddings not initialized")
+        else:
+            self._report_state("not_loaded" if self.store_exists() else "not_created")
+    
+    def _report_state(self, status: str, **details) -> None:
+        set_component_state(
+            "vectorstore", status,
+            backend=self.vector_backend,
+            index_mode=self.index_mode,
+            embedding_backend=self.embedding_backend,
+            index_version=self.index_version,
+            **details
+        )
+    
+    @property
+    def building(self) -> bool:
+        return self._sync_lock.locked()
+    
+    @property
+    def embedding_signature(self) -> str:
+        signature = getattr(self.embeddings, "signature", None)
+        return signature or f"openai:{settings.EMBEDDING_MODEL}"
+    
+    def _create_embeddings(self):
+        if self.embedding_backend == "local":
+            return create_local_embeddings(self.persist_dir)
+        
         embedding_kwargs = {"model": settings.EMBEDDING_MODEL}
         
         embedding_api_key = settings.OPENAI_API_KEY or settings.API_KEY
         if embedding_api_key:
             embedding_kwargs["openai_api_key"] = embedding_api_key
+        if settings.EMBEDDING_API_BASE:
+            # OpenAI-compatible servers (including local stand-ins) take raw text, not tiktoken ids
+            embedding_kwargs["openai_api_base"] = settings.EMBEDDING_API_BASE
+            embedding_kwargs["check_embedding_ctx_length"] = False
         
         try:
-            self.embeddings = OpenAIEmbeddings(**embedding_kwargs)
+            return OpenAIEmbeddings(**embedding_kwargs)
         except Exception as e:
             print(f"Warning: Could not initialize embeddings: {str(e)[:100]}")
-            self.embeddings = None
-        self.vectorstore = None
-        self.collection_name = "financial_transactions"
+            return None
         
-    def _load_and_preprocess_data(self) -> pd.DataFrame:
-        if not os.path.exists(settings.DATA_FILE):
-            raise FileNotFoundError(f"Data file not found: {settings.DATA_FILE}")
+    def _active_dataset(self) -> Tuple[str, str]:
+        # DataService.version is the single content hash of the active file; the LLM,
+        # feature and forecast caches key on it too, so the index must not hash on its own
+        from services.data_service import get_data_service
+        data_service = get_data_service()
+        return data_service.data_file, data_service.version
+    
+    def _load_and_preprocess_data(self, data_file: Optional[str] = None) -> pd.DataFrame:
+        data_file = data_file or self._active_dataset()[0]
+        if not os.path.exists(data_file):
+            raise FileNotFoundError(f"Data file not found: {data_file}")
         
-        df = pd.read_csv(settings.DATA_FILE)
+        df = pd.read_csv(data_file)
         
         df = df.fillna("")
         
@@ -79,29 +179,313 @@ class VectorStoreManager:
         
         return ". ".join(text_parts) + "."
     
+    def _row_metadata(self, row: Dict[str, Any], idx: int) -> Dict[str, Any]:
+        date_ord = _date_ord(row.get('date'))
+        return {
+            "doc_type": "transaction",
+            "transaction_id": _safe_int(row.get('transaction_id', idx), int(idx)),
+            "date": _safe_str(row.get('date', '')),
+            "date_ord": date_ord,
+            "date_ord_end": date_ord,
+            "region": _safe_str(row.get('region', '')),
+            "city": _safe_str(row.get('city', '')),
+            "merchant_id": _safe_int(row.get('merchant_id', 0)),
+            "merchant_category": _safe_str(row.get('merchant_category', '')),
+            "channel": _safe_str(row.get('channel', '')),
+            "payment_method": _safe_str(row.get('payment_method', '')),
+            "customer_segment": _safe_str(row.get('customer_segment', '')),
+            "amount_kzt": _safe_float(row.get('amount_kzt', 0)),
+            "is_refunded": _safe_int(row.get('is_refunded', 0)),
+            "is_canceled": _safe_int(row.get('is_canceled', 0)),
+            "suspicious_flag": _safe_int(row.get('suspicious_flag', 0)),
+            "row_index": int(idx)
+        }
+    
+    def _render_rows(self, df: pd.DataFrame) -> Tuple[List[str], List[Dict[str, Any]]]:
+        records = df.to_dict('records')
+        texts = [self._row_to_text(row) for row in records]
+        return texts, [self._row_metadata(row, idx) for idx, row in zip(df.index, records)]
+    
+    def _render_documents(self, df: pd.DataFrame) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+        if self.index_mode == "summary":
+            documents = build_summary_documents(df, top_merchants=settings.SUMMARY_TOP_MERCHANTS)
+            texts = [text for text, _ in documents]
+            metadatas = [metadata for _, metadata in documents]
+            # A fixed-seed sample keeps a few raw transactions retrievable with stable ids across syncs
+            sample_size = min(max(0, settings.SUMMARY_SAMPLE_ROWS), len(df))
+            if sample_size:
+                sample_texts, sample_metadatas = self._render_rows(df.sample(n=sample_size, random_state=42).sort_index())
+                texts += sample_texts
+                metadatas += sample_metadatas
+        else:
+            texts, metadatas = self._render_rows(df)
+        return [_row_id(text) for text in texts], texts, metadatas
+    
+    def _iter_batches(self, positions: List[int], ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                      batch_size: int, skip: Optional[set] = None) -> Iterator[Tuple[int, List[str], List[str], List[Dict[str, Any]]]]:
+        skip = skip or set()
+        for batch_no, start in enumerate(range(0, len(positions), batch_size)):
+            if batch_no in skip:
+                continue
+            batch_positions = positions[start:start + batch_size]
+            yield (batch_no, [ids[pos] for pos in batch_positions],
+                   [texts[pos] for pos in batch_positions], [metadatas[pos] for pos in batch_positions])
+    
+    def _checkpoint_path(self) -> str:
+        return os.path.join(self.persist_dir, CHECKPOINT_FILE)
+    
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        path = self._checkpoint_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        path = self._checkpoint_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+        os.replace(tmp_path, path)
+    
+    def _sync_state_path(self) -> str:
+        return os.path.join(self.persist_dir, SYNC_STATE_FILE)
+    
+    def _load_sync_state(self) -> Optional[Dict[str, Any]]:
+        path = self._sync_state_path()
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _save_sync_state(self, state: Dict[str, Any]) -> None:
+        path = self._sync_state_path()
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    
+    def store_exists(self) -> bool:
+        if self.vector_backend == "numpy":
+            return os.path.exists(os.path.join(self.persist_dir, "manifest.json"))
+        return os.path.exists(os.path.join(self.persist_dir, "chroma.sqlite3"))
+    
+    def _open_store(self):
+        if self.vector_backend == "numpy":
+            return NumpyVectorIndex(
+                self.persist_dir,
+                dtype=settings.VECTOR_INDEX_DTYPE,
+                ivf_lists=settings.VECTOR_IVF_LISTS,
+                ivf_probe=settings.VECTOR_IVF_PROBE
+            )
+        return Chroma(
+            persist_directory=self.persist_dir,
+            embedding_function=self.embeddings,
+            collection_name=self.collection_name
+        )
+    
+    def _reset_store(self, store):
+        if isinstance(store, NumpyVectorIndex):
+            store.reset()
+            return store
+        store.delete_collection()
+        return self._open_store()
+    
+    @staticmethod
+    def _collection_of(store):
+        # Both backends expose the same upsert/update/delete/get/query surface
+        return store if isinstance(store, NumpyVectorIndex) else store._collection
+    
+    def sync_vectorstore(self, df: pd.DataFrame, data_version: str, full: bool = False):
+        with self._sync_lock:
+            self._report_state("building", data_version=data_version)
+            try:
+                vectorstore = self._sync_vectorstore(df, data_version, full)
+            except Exception as e:
+                self._report_state("error", data_version=data_version, error=str(e)[:200])
+                raise
+            self._report_state("ready")
+            return vectorstore
+    
+    def _sync_vectorstore(self, df: pd.DataFrame, data_version: str, full: bool):
+        batch_size = max(1, settings.EMBEDDING_BATCH_SIZE)
+        concurrency = max(1, settings.EMBEDDING_CONCURRENCY)
+        
+        ids, texts, metadatas = self._render_documents(df)
+        # Identical documents render to the same id; only the first occurrence is embedded
+        first_position = {}
+        for pos, row_id in enumerate(ids):
+            first_position.setdefault(row_id, pos)
+        
+        state = None if full else self._load_sync_state()
+        if state is not None and (state.get("embedding_signature") != self.embedding_signature
+                                  or state.get("index_mode", "rows") != self.index_mode):
+            # Switching index modes refits local embeddings on the new document texts
+            state = None
+        base_version = state["data_version"] if state is not None else None
+        previous_ids = set(state["ids"]) if state is not None else set()
+        
+        checkpoint = self._load_checkpoint() if not full else None
+        if (checkpoint is None or checkpoint.get("data_version") != data_version
+                or checkpoint.get("base_version") != base_version
+                or checkpoint.get("batch_size") != batch_size
+                or checkpoint.get("embedding_signature") != self.embedding_signature
+                or checkpoint.get("index_mode", "rows") != self.index_mode
+                or not getattr(self.embeddings, "fitted", True)):
+            checkpoint = None
+        
+        vectorstore = self._open_store()
+        if state is None and checkpoint is None:
+            # No usable sync state: start the index (and any fitted embedding model) from scratch
+            vectorstore = self._reset_store(vectorstore)
+            if hasattr(self.embeddings, "fit"):
+                print("Fitting local embedding model on the dataset...")
+                self.embeddings.fit(texts)
+                self.embeddings.save(os.path.join(self.persist_dir, LOCAL_STATE_FILE))
+        
+        refresh_metadata = state is not None and state.get("metadata_schema", 1) != METADATA_SCHEMA
+        positions = [pos for row_id, pos in first_position.items() if row_id not in previous_ids]
+        removed_ids = [row_id for row_id in previous_ids if row_id not in first_position]
+        total_batches = (len(positions) + batch_size - 1) // batch_size
+        print(f"Vectorstore sync ({self.index_mode}): {len(positions)} new or changed documents, {len(removed_ids)} removed, "
+              f"{len(first_position) - len(positions)} unchanged")
+        
+        if checkpoint is None:
+            checkpoint = {
+                "data_version": data_version,
+                "base_version": base_version,
+                "embedding_signature": self.embedding_signature,
+                "index_mode": self.index_mode,
+                "batch_size": batch_size,
+                "total_batches": total_batches,
+                "last_completed_batch": -1,
+                "completed_batches": []
+            }
+            self._save_checkpoint(checkpoint)
+        
+        completed = set(checkpoint["completed_batches"])
+        if completed:
+            print(f"Resuming vectorstore sync: {len(completed)}/{total_batches} batches already embedded")
+        collection = self._collection_of(vectorstore)
+        
+        def embed(batch):
+            batch_no, batch_ids, batch_texts, metadatas = batch
+            return batch_no, batch_ids, batch_texts, metadatas, self.embeddings.embed_documents(batch_texts)
+        
+        batches = self._iter_batches(positions, ids, texts, metadatas, batch_size, skip=completed)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                # Keep at most `concurrency` batches in flight so memory stays bounded
+                while not exhausted and len(pending) < concurrency:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                    else:
+                        pending.add(executor.submit(embed, batch))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_no, batch_ids, batch_texts, metadatas, vectors = future.result()
+                    collection.upsert(ids=batch_ids, embeddings=vectors, metadatas=metadatas, documents=batch_texts)
+                    completed.add(batch_no)
+                    
+                    watermark = checkpoint["last_completed_batch"]
+                    while watermark + 1 in completed:
+                        watermark += 1
+                    checkpoint["last_completed_batch"] = watermark
+                    checkpoint["completed_batches"] = sorted(completed)
+                    self._save_checkpoint(checkpoint)
+                    print(f"Embedded batch {batch_no + 1}/{total_batches} ({len(completed)} done)")
+        
+        for start in range(0, len(removed_ids), DELETE_BATCH_SIZE):
+            collection.delete(ids=removed_ids[start:start + DELETE_BATCH_SIZE])
+        
+        if refresh_metadata:
+            # Rows whose text is unchanged keep their embeddings; only their metadata is rewritten
+            unchanged = [pos for row_id, pos in first_position.items() if row_id in previous_ids]
+            print(f"Refreshing metadata for {len(unchanged)} documents (schema {METADATA_SCHEMA})")
+            for _, batch_ids, _, batch_metadatas in self._iter_batches(unchanged, ids, texts, metadatas, DELETE_BATCH_SIZE):
+                collection.update(ids=batch_ids, metadatas=batch_metadatas)
+        
+        if hasattr(collection, "compact"):
+            collection.compact()
+        
+        self._save_sync_state({
+            "data_version": data_version,
+            "embedding_signature": self.embedding_signature,
+            "index_mode": self.index_mode,
+            "metadata_schema": METADATA_SCHEMA,
+            "ids": list(first_position)
+        })
+        os.remove(self._checkpoint_path())
+        self._refresh_index_version()
+        return vectorstore
+    
+    def sync_active_dataset(self) -> bool:
+        if self.embeddings is None:
+            return False
+        data_file, data_version = self._active_dataset()
+        state = self._load_sync_state()
+        if (self.vectorstore is not None and state is not None and state.get("data_version") == data_version
+                and state.get("embedding_signature") == self.embedding_signature
+                and state.get("index_mode", "rows") == self.index_mode
+                and state.get("metadata_schema", 1) == METADATA_SCHEMA):
+            return True
+        os.makedirs(self.persist_dir, exist_ok=True)
+        df = self._load_and_preprocess_data(data_file)
+        self.vectorstore = self.sync_vectorstore(df, data_version)
+        return True
+    
+    def _refresh_index_version(self) -> None:
+        # Cached retrieval results are only valid for the exact index contents they were computed on
+        state = self._load_sync_state()
+        if state is not None:
+            self.index_version = (f"{state['data_version']}:{state['embedding_signature']}:"
+                                  f"{state.get('index_mode', 'rows')}:{state.get('metadata_schema', 1)}")
+        else:
+            self.index_version = f"legacy:{self.embedding_signature}"
+    
+    def _embeddings_stale(self, state: Optional[Dict[str, Any]]) -> bool:
+        if not getattr(self.embeddings, "fitted", True):
+            return True
+        # Stores built before sync state existed were always embedded through OpenAI
+        built_with = (state or {}).get("embedding_signature", f"openai:{settings.EMBEDDING_MODEL}")
+        return built_with != self.embedding_signature
+    
     def initialize_vectorstore(self, force_recreate: bool = False) -> None:
-        os.makedirs(settings.CHROMA_PERSIST_DIR, exist_ok=True)
+        os.makedirs(self.persist_dir, exist_ok=True)
         
-        chroma_db_path = os.path.join(settings.CHROMA_PERSIST_DIR, "chroma.sqlite3")
-        if not force_recreate and os.path.exists(chroma_db_path):
+        store_exists = self.store_exists()
+        state = self._load_sync_state()
+        checkpoint = self._load_checkpoint()
+        build_incomplete = checkpoint is not None and not checkpoint.get("complete")
+        embeddings_stale = self._embeddings_stale(state) if store_exists else False
+        data_file, data_version = self._active_dataset()
+        data_stale = state is not None and (state.get("data_version") != data_version
+                                            or state.get("index_mode", "rows") != self.index_mode
+                                            or state.get("metadata_schema", 1) != METADATA_SCHEMA)
+        if (not force_recreate and not build_incomplete and not embeddings_stale and not data_stale
+                and store_exists):
             try:
-                print(f"Attempting to load existing vectorstore from {settings.CHROMA_PERSIST_DIR}...")
+                print(f"Attempting to load existing vectorstore from {self.persist_dir}...")
                 if self.embeddings is None:
                     raise ValueError("Embeddings not initialized - needs OpenAI API key")
                 
-                self.vectorstore = Chroma(
-                    persist_directory=settings.CHROMA_PERSIST_DIR,
-                    embedding_function=self.embeddings,
-                    collection_name=self.collection_name
-                )
+                self.vectorstore = self._open_store()
                 if self.vectorstore is not None:
-                    if hasattr(self.vectorstore, 'similarity_search_with_score'):
-                        print(f"[OK] Loaded existing vectorstore from {settings.CHROMA_PERSIST_DIR}")
-                        return
-                    else:
-                        print(f"Warning: Vectorstore loaded but missing similarity_search_with_score method")
-                        print(f"[OK] Loaded existing vectorstore (method check skipped)")
-                        return
+                    self._refresh_index_version()
+                    self._report_state("ready")
+                    print(f"[OK] Loaded existing {self.vector_backend} vectorstore from {self.persist_dir}")
+                    return
                 else:
                     raise ValueError("Failed to load vectorstore - Chroma returned None")
             except Exception as e:
@@ -119,84 +503,38 @@ class VectorStoreManager:
                 print("Will use CSV fallback for data retrieval...")
                 force_recreate = False
                 self.vectorstore = None
+                self._report_state("error", error=error_msg[:200])
         
-        if force_recreate or not os.path.exists(chroma_db_path):
+        if force_recreate or build_incomplete or embeddings_stale or data_stale or not store_exists:
             if self.embeddings is None:
                 print("Cannot create vectorstore: embeddings not initialized (needs OpenAI API key)")
                 print("Note: DeepSeek API key doesn't work for embeddings. Set OPENAI_API_KEY in .env for vectorstore.")
                 self.vectorstore = None
+                self._report_state("unavailable", reason="embeddings not initialized")
                 return
             
-            print("Creating new vectorstore...")
-            print("WARNING: This will create embeddings for ~30,000 rows via OpenAI API.")
-            print("This may take 10-15 minutes and will use API credits.")
-            print("Note: Requires OPENAI_API_KEY (DeepSeek key doesn't work for embeddings)")
-            print("Please wait...")
-            df = self._load_and_preprocess_data()
-            print(f"Loaded {len(df)} rows from CSV")
-            
-            documents = []
-            metadatas = []
-            
-            for idx, row in df.iterrows():
-                text = self._row_to_text(row)
-                
-                def safe_int(val, default=0):
-                    try:
-                        return int(val) if pd.notna(val) and val != '' else default
-                    except (ValueError, TypeError):
-                        return default
-                
-                def safe_float(val, default=0.0):
-                    try:
-                        return float(val) if pd.notna(val) and val != '' else default
-                    except (ValueError, TypeError):
-                        return default
-                
-                def safe_str(val, default=''):
-                    try:
-                        return str(val) if pd.notna(val) and val != '' else default
-                    except (ValueError, TypeError):
-                        return default
-                
-                doc = Document(
-                    page_content=text,
-                    metadata={
-                        "transaction_id": safe_int(row.get('transaction_id', idx), int(idx)),
-                        "date": safe_str(row.get('date', '')),
-                        "region": safe_str(row.get('region', '')),
-                        "city": safe_str(row.get('city', '')),
-                        "merchant_id": safe_int(row.get('merchant_id', 0)),
-                        "merchant_category": safe_str(row.get('merchant_category', '')),
-                        "channel": safe_str(row.get('channel', '')),
-                        "payment_method": safe_str(row.get('payment_method', '')),
-                        "customer_segment": safe_str(row.get('customer_segment', '')),
-                        "amount_kzt": safe_float(row.get('amount_kzt', 0)),
-                        "is_refunded": safe_int(row.get('is_refunded', 0)),
-                        "is_canceled": safe_int(row.get('is_canceled', 0)),
-                        "suspicious_flag": safe_int(row.get('suspicious_flag', 0)),
-                        "row_index": int(idx)
-                    }
-                )
-                documents.append(doc)
-                metadatas.append(doc.metadata)
+            if embeddings_stale:
+                print(f"Vectorstore was built with different embeddings; rebuilding with {self.embedding_signature}")
+            if state is not None and state.get("index_mode", "rows") != self.index_mode:
+                print(f"Vectorstore was built in {state.get('index_mode', 'rows')} mode; rebuilding in {self.index_mode} mode")
+            if force_recreate or embeddings_stale or state is None:
+                print("Creating new vectorstore...")
+            else:
+                print("Syncing vectorstore with the active dataset...")
+            print(f"Embedding backend: {self.embedding_backend}. Batches of {settings.EMBEDDING_BATCH_SIZE}, {settings.EMBEDDING_CONCURRENCY} concurrent.")
+            if self.embedding_backend == "openai":
+                print("Note: Requires OPENAI_API_KEY (DeepSeek key doesn't work for embeddings)")
+            df = self._load_and_preprocess_data(data_file)
+            print(f"Loaded {len(df)} rows from CSV (index mode: {self.index_mode})")
             
             try:
-                print(f"Creating embeddings for {len(documents)} documents via API...")
-                print("This may take several minutes. Please be patient...")
-                if self.embeddings is None:
-                    raise ValueError("Embeddings not initialized - needs OpenAI API key")
-                
-                self.vectorstore = Chroma.from_documents(
-                    documents=documents,
-                    embedding=self.embeddings,
-                    persist_directory=settings.CHROMA_PERSIST_DIR,
-                    collection_name=self.collection_name
+                self.vectorstore = self.sync_vectorstore(
+                    df,
+                    data_version=data_version,
+                    full=force_recreate or embeddings_stale
                 )
-                print(f"[OK] Created vectorstore with {len(documents)} documents")
+                print(f"[OK] Vectorstore in sync with {len(df)} rows")
                 print("Vectorstore is now ready for queries!")
-                if self.vectorstore is None:
-                    raise ValueError("Failed to create vectorstore")
             except Exception as e:
                 error_msg = str(e)
                 if "API key" in error_msg or "401" in error_msg or "embedding" in error_msg.lower():
@@ -204,18 +542,18 @@ class VectorStoreManager:
                     print("Note: Set OPENAI_API_KEY in .env for vectorstore, or use CSV fallback")
                 else:
                     print(f"Error creating vectorstore: {error_msg[:200]}")
+                print("Progress is checkpointed; the next sync resumes from the last completed batch.")
                 if "API key" not in error_msg and "401" not in error_msg:
                     import traceback
                     traceback.print_exc()
                 raise
     
-    def search(self, query: str, k: int = None) -> List[Dict[str, Any]]:
+    def search(self, query: str, k: int = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         if self.embeddings is None:
             raise ValueError("Embeddings not available - needs OpenAI API key. DeepSeek key doesn't work for embeddings.")
         
         if self.vectorstore is None:
-            chroma_db_path = os.path.join(settings.CHROMA_PERSIST_DIR, "chroma.sqlite3")
-            if not os.path.exists(chroma_db_path):
+            if not self.store_exists():
                 raise ValueError("Vectorstore not found. Needs OpenAI API key to create embeddings.")
             try:
                 self.initialize_vectorstore(force_recreate=False)
@@ -230,19 +568,72 @@ class VectorStoreManager:
         
         k = k or settings.RAG_TOP_K
         
-        results = self.vectorstore.similarity_search_with_score(query, k=k)
+        vector = self._embed_query(query)
+        where = build_where(filters)
+        ids, distances = self._query_ids(vector, k, where)
+        if where is not None and not ids:
+            # Filters narrowed the candidates to nothing; rank over the whole index instead
+            ids, distances = self._query_ids(vector, k, None)
+        documents = self._fetch_documents(ids)
         
         formatted_results = []
-        for doc, score in results:
+        for doc_id, distance in zip(ids, distances):
+            if doc_id not in documents:
+                continue
+            content, metadata = documents[doc_id]
             formatted_results.append({
-                "content": doc.page_content,
-                "metadata": doc.metadata,
-                "score": float(score)
+                "content": content,
+                "metadata": metadata,
+                "score": float(distance)
             })
         
         return formatted_results
     
-    def get_vectorstore(self) -> Chroma:
+    def embed_query(self, query: str) -> Optional[np.ndarray]:
+        """Query embedding from the configured backend, or None until a (fitted) model is available."""
+        if self.embeddings is None or not getattr(self.embeddings, "fitted", True):
+            return None
+        return self._embed_query(query)
+    
+    def _embed_query(self, query: str) -> np.ndarray:
+        key = hashlib.sha1(f"{self.embedding_signature}\0{query}".encode("utf-8")).hexdigest()
+        vector = self.embedding_cache.get(key)
+        if vector is None:
+            vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            self.embedding_cache.put(key, vector)
+        return vector
+    
+    def _query_ids(self, vector: np.ndarray, k: int,
+                   where: Optional[Dict[str, Any]] = None) -> Tuple[List[str], List[float]]:
+        collection = self._collection_of(self.vectorstore)
+        # A shared NumPy index can be appended to by another worker; its file position is part of the version
+        store_version = getattr(collection, "version", None)
+        params = json.dumps([k, where, self.index_version, store_version], sort_keys=True, default=str)
+        key = hashlib.sha1(vector.tobytes() + params.encode("utf-8")).hexdigest()
+        cached = self.retrieval_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        result = collection.query(
+            query_embeddings=[vector.tolist()],
+            n_results=k,
+            where=where,
+            include=["distances"]
+        )
+        hit = (list(result["ids"][0]), [float(d) for d in result["distances"][0]])
+        self.retrieval_cache.put(key, hit)
+        return hit
+    
+    def _fetch_documents(self, ids: List[str]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        if not ids:
+            return {}
+        result = self._collection_of(self.vectorstore).get(ids=ids, include=["documents", "metadatas"])
+        return {
+            doc_id: (document, metadata or {})
+            for doc_id, document, metadata in zip(result["ids"], result["documents"], result["metadatas"])
+        }
+    
+    def get_vectorstore(self):
         if self.vectorstore is None:
             raise ValueError("Vectorstore not initialized. Call initialize_vectorstore() first.")
         return self.vectorstore
@@ -261,9 +652,11 @@ def ensure_vectorstore_initialized() -> bool:
         _vectorstore_manager = VectorStoreManager()
     
     if _vectorstore_manager.vectorstore is None:
-        chroma_db_path = os.path.join(settings.CHROMA_PERSIST_DIR, "chroma.sqlite3")
-        if not os.path.exists(chroma_db_path):
-            print("Note: Creating vectorstore for the first time. This may take 10-15 minutes.")
+        if _vectorstore_manager.building:
+            # Another thread (e.g. the startup build) is creating it; use the CSV fallback meanwhile
+            return False
+        if not _vectorstore_manager.store_exists():
+            print("Note: Creating vectorstore for the first time. This may take a while with remote embeddings.")
         try:
             _vectorstore_manager.initialize_vectorstore(force_recreate=False)
         except Exception as e:
@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException, Query
 from typing import Dict, Any, Optional, List
+import asyncio
 import sys
 import os
 import pandas as pd
@@ -11,6 +12,9 @@ from models.schemas import (
 )
 from services.data_service import get_data_service
 from rag.rag_chain import get_rag_chain
+from rag.insight_prompts import revenue_question, channels_question, retention_question, roi_question
+from services.concurrency import run_blocking
+from services.insights import resolve_insight
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
@@ -34,18 +38,14 @@ async def get_revenue_analytics(request: AnalyticsRequest = AnalyticsRequest())
         if request.channel:
             filters['channel'] = request.channel
         
-        revenue_data = data_service.get_revenue_analytics(filters)
+        revenue_data = await run_blocking(data_service.get_revenue_analytics, filters)
         
-        question = f"""Проанализируй данные по выручке на русском языке:
-- Общая выручка: {revenue_data['total_revenue']:,.2f} KZT
-- Количество транзакций: {revenue_data['transaction_count']}
-- Средняя транзакция: {revenue_data['average_transaction']:,.2f} KZT
-- Топ городов: {revenue_data['revenue_by_city'][:5] if revenue_data['revenue_by_city'] else 'N/A'}
-- Топ каналов: {revenue_data['revenue_by_channel'][:5] if revenue_data['revenue_by_channel'] else 'N/A'}
-
-Предоставь анализ трендов выручки, эффективности городов и каналов. Определи возможности для роста. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
+        question = revenue_question(revenue_data)
         
-        ai_result = rag_chain.query_with_analytics(question, revenue_data)
+        ai_insights, insight_id = await resolve_insight(
+            "revenue", rag_chain.aquery_with_analytics(question, revenue_data, use_cache=not request.bypass_cache),
+            request.insights == "deferred"
+        )
         
         return RevenueResponse(
             total_revenue=revenue_data["total_revenue"],
@@ -54,7 +54,8 @@ async def get_revenue_analytics(request: AnalyticsRequest = AnalyticsRequest())
             revenue_by_date=revenue_data["revenue_by_date"],
             revenue_by_city=revenue_data["revenue_by_city"],
             revenue_by_channel=revenue_data["revenue_by_channel"],
-            ai_insights=ai_result["answer"]
+            ai_insights=ai_insights,
+            insight_id=insight_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating revenue analytics: {str(e)}")
@@ -75,23 +76,21 @@ async def get_channel_analytics(request: AnalyticsRequest = AnalyticsRequest())
         if request.city:
             filters['city'] = request.city
         
-        channel_data = data_service.get_channel_analytics(filters)
+        channel_data = await run_blocking(data_service.get_channel_analytics, filters)
         
-        question = f"""Проанализируй эффективность каналов на русском языке:
-{channel_data['channel_performance']}
-
-Лучший канал: {channel_data['best_channel']}
-Худший канал: {channel_data['worst_channel']}
-
-Предоставь рекомендации по оптимизации каналов и распределению маркетингового бюджета. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
+        question = channels_question(channel_data)
         
-        ai_result = rag_chain.query_with_analytics(question, channel_data)
+        ai_recommendations, insight_id = await resolve_insight(
+            "channels", rag_chain.aquery_with_analytics(question, channel_data, use_cache=not request.bypass_cache),
+            request.insights == "deferred"
+        )
         
         return ChannelResponse(
             channel_performance=channel_data["channel_performance"],
             best_channel=channel_data["best_channel"],
             worst_channel=channel_data["worst_channel"],
-            ai_recommendations=ai_result["answer"]
+            ai_recommendations=ai_recommendations,
+            insight_id=insight_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating channel analytics: {str(e)}")
@@ -112,22 +111,21 @@ async def get_retention_analytics(request: AnalyticsRequest = AnalyticsRequest()
         if request.city:
             filters['city'] = request.city
         
-        retention_data = data_service.get_retention_analytics(filters)
+        retention_data = await run_blocking(data_service.get_retention_analytics, filters)
         
-        question = f"""Проанализируй ретеншн клиентов на русском языке:
-- Общий уровень ретеншна: {retention_data['retention_rate']:.2f}%
-- Эффективность сегментов клиентов: {retention_data['customer_segment_retention'][:5] if retention_data['customer_segment_retention'] else 'N/A'}
-- Эффективность источников привлечения: {retention_data['acquisition_source_performance'][:5] if retention_data['acquisition_source_performance'] else 'N/A'}
-
-Предоставь анализ трендов ретеншна и рекомендации по улучшению лояльности клиентов. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
+        question = retention_question(retention_data)
         
-        ai_result = rag_chain.query_with_analytics(question, retention_data)
+        ai_insights, insight_id = await resolve_insight(
+            "retention", rag_chain.aquery_with_analytics(question, retention_data, use_cache=not request.bypass_cache),
+            request.insights == "deferred"
+        )
         
         return RetentionResponse(
             customer_segment_retention=retention_data["customer_segment_retention"],
             acquisition_source_performance=retention_data["acquisition_source_performance"],
             retention_rate=retention_data["retention_rate"],
-            ai_insights=ai_result["answer"]
+            ai_insights=ai_insights,
+            insight_id=insight_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating retention analytics: {str(e)}")
@@ -151,7 +149,7 @@ async def get_transactions(request: AnalyticsRequest = AnalyticsRequest(), limit
         if request.channel:
             filters['channel'] = request.channel
         
-        df = data_service.get_dataframe(filters)
+        df = await run_blocking(data_service.get_dataframe, filters)
         
         transactions = df.head(limit).to_dict('records')
         
@@ -191,11 +189,12 @@ async def get_ai_recommendations(request: AnalyticsRequest = AnalyticsRequest())
         if request.city:
             filters['city'] = request.city
         
-        revenue_data = data_service.get_revenue_analytics(filters)
-        channel_data = data_service.get_channel_analytics(filters)
-        retention_data = data_service.get_retention_analytics(filters)
-        
-        df = data_service.get_dataframe(filters)
+        df = await run_blocking(data_service.get_dataframe, filters)
+        revenue_data, channel_data, retention_data = await asyncio.gather(
+            run_blocking(data_service.get_revenue_analytics, filters, df=df),
+            run_blocking(data_service.get_channel_analytics, filters, df=df),
+            run_blocking(data_service.get_retention_analytics, filters, df=df)
+        )
         valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)]
         
         best_channel_revenue = 0
@@ -265,11 +264,11 @@ async def get_ai_recommendations(request: AnalyticsRequest = AnalyticsRequest())
 {{"recommendations": [...], "analysis": "..."}}"""
 
         try:
-            ai_result = rag_chain.query_with_analytics(question, {
+            ai_result = await rag_chain.aquery_with_analytics(question, {
                 "revenue_data": revenue_data,
                 "channel_data": channel_data,
                 "retention_data": retention_data
-            })
+            }, use_cache=not request.bypass_cache)
             answer = ai_result.get("answer", "")
             print(f"[Recommendations] LLM response length: {len(answer) if answer else 0}")
         except Exception as e:
@@ -460,8 +459,8 @@ async def get_ai_recommendations(request: AnalyticsRequest = AnalyticsRequest())
         print(f"[Recommendations] Exception in get_recommendations: {str(e)}")
         try:
             data_service = get_data_service()
-            revenue_data = data_service.get_revenue_analytics({})
-            channel_data = data_service.get_channel_analytics({})
+            revenue_data = await run_blocking(data_service.get_revenue_analytics, {})
+            channel_data = await run_blocking(data_service.get_channel_analytics, {})
             total_rev = float(revenue_data.get('total_revenue', 0) or 0)
             
             fallback_recommendations = [
@@ -527,166 +526,20 @@ async def get_roi_metrics(request: AnalyticsRequest = AnalyticsRequest()) -> ROI
         if request.end_date:
             filters['end_date'] = request.end_date
         
-        df = data_service.get_dataframe(filters)
-        valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)]
+        df = await run_blocking(data_service.get_dataframe, filters)
+        roi_data, revenue_data = await asyncio.gather(
+            run_blocking(data_service.get_roi_metrics, filters, df=df),
+            run_blocking(data_service.get_revenue_analytics, filters, df=df)
+        )
+        roi_metrics, channel_data = roi_data["roi_metrics"], roi_data["channel_data"]
         
-        roi_metrics = []
+        question = roi_question(roi_metrics, revenue_data)
         
-        if 'acquisition_source' in valid_transactions.columns:
-            source_stats = valid_transactions.groupby('acquisition_source').agg({
-                'amount_kzt': ['sum', 'count', 'mean'],
-                'transaction_id': 'nunique' if 'transaction_id' in valid_transactions.columns else 'count'
-            }).reset_index()
-            
-            if isinstance(source_stats.columns, pd.MultiIndex):
-                source_stats.columns = ['source', 'revenue', 'transactions', 'avg_transaction', 'customers']
-            else:
-                if len(source_stats.columns) >= 5:
-                    source_stats.columns = ['source', 'revenue', 'transactions', 'avg_transaction', 'customers']
-            
-            for _, row in source_stats.iterrows():
-                try:
-                    source = str(row['source']) if pd.notna(row.get('source')) else 'unknown'
-                    revenue = float(row['revenue']) if pd.notna(row.get('revenue')) and row.get('revenue') != '' else 0.0
-                    transactions = int(row['transactions']) if pd.notna(row.get('transactions')) and row.get('transactions') != '' else 0
-                    customers = int(row['customers']) if pd.notna(row.get('customers')) and row.get('customers') != '' else 0
-                    avg_transaction = float(row['avg_transaction']) if pd.notna(row.get('avg_transaction')) and row.get('avg_transaction') != '' else 0.0
-                    
-                    if revenue <= 0 or pd.isna(revenue) or not pd.isfinite(revenue):
-                        continue
-                except (ValueError, KeyError, TypeError) as e:
-                    print(f"Warning: Error processing row in ROI calculation: {e}")
-                    continue
-                
-                investment_multipliers = {
-                    'organic': 0.05,
-                    'google_ads': 0.25,
-                    'instagram': 0.15,
-                    'facebook': 0.15,
-                    'tiktok': 0.12,
-                    'youtube': 0.18,
-                    'email': 0.08,
-                    'referral': 0.10,
-                    'direct': 0.03,
-                }
-                
-                multiplier = investment_multipliers.get(source.lower().strip(), 0.15)
-                investment = revenue * multiplier
-                
-                if investment > 0 and revenue > 0:
-                    roi = ((revenue - investment) / investment) * 100
-                    if pd.isna(roi) or not pd.isfinite(roi):
-                        roi = 0.0
-                else:
-                    roi = 0.0
-                
-                profit = revenue - investment
-                
-                cpa = investment / customers if customers > 0 else (investment / transactions if transactions > 0 else 0)
-                
-                conversion_rate = (customers / transactions * 100) if transactions > 0 else 0
-                
-                roi_metrics.append({
-                    "source": source,
-                    "investment": investment,
-                    "revenue": revenue,
-                    "roi": roi,
-                    "profit": profit,
-                    "transactions": transactions,
-                    "customers": customers,
-                    "avg_transaction": avg_transaction,
-                    "cpa": cpa,
-                    "conversion_rate": conversion_rate
-                })
-        else:
-            channel_data = data_service.get_channel_analytics(filters)
-            for channel in channel_data.get('channel_performance', []):
-                revenue = float(channel.get('total_revenue', channel.get('revenue', 0)) or 0)
-                transactions = int(channel.get('transaction_count', channel.get('transactions', 0)) or 0)
-                
-                if revenue <= 0:
-                    continue
-                
-                investment = revenue * 0.15
-                if investment > 0 and revenue > 0:
-                    roi = ((revenue - investment) / investment) * 100
-                    if pd.isna(roi) or not pd.isfinite(roi):
-                        roi = 0.0
-                else:
-                    roi = 0.0
-                profit = revenue - investment
-                
-                roi_metrics.append({
-                    "source": channel.get('channel', 'Unknown'),
-                    "investment": investment,
-                    "revenue": revenue,
-                    "roi": roi,
-                    "profit": profit,
-                    "transactions": transactions,
-                    "customers": transactions,
-                    "avg_transaction": revenue / transactions if transactions > 0 else 0,
-                    "cpa": investment / transactions if transactions > 0 else 0,
-                    "conversion_rate": 0
-                })
-        
-        if len(roi_metrics) > 0:
-            roi_metrics.sort(key=lambda x: x.get('roi', 0), reverse=True)
-        else:
-            channel_data_fallback = data_service.get_channel_analytics(filters)
-            for channel in channel_data_fallback.get('channel_performance', [])[:5]:
-                revenue = float(channel.get('total_revenue', channel.get('revenue', 0)) or 0)
-                if revenue > 0:
-                    transactions = int(channel.get('transaction_count', channel.get('transactions', 0)) or 0)
-                    investment = revenue * 0.15
-                    roi = ((revenue - investment) / investment * 100) if investment > 0 else 0
-                    profit = revenue - investment
-                    
-                    roi_metrics.append({
-                        "source": channel.get('channel', 'Unknown'),
-                        "investment": investment,
-                        "revenue": revenue,
-                        "roi": roi,
-                        "profit": profit,
-                        "transactions": transactions,
-                        "customers": transactions,
-                        "avg_transaction": revenue / transactions if transactions > 0 else 0,
-                        "cpa": investment / transactions if transactions > 0 else 0,
-                        "conversion_rate": 0
-                    })
-        
-        revenue_data = data_service.get_revenue_analytics(filters)
-        
-        context = f"""МЕТРИКИ ROI ПО ИСТОЧНИКАМ ПРИВЛЕЧЕНИЯ КЛИЕНТОВ (МАРКЕТИНГ):
-
-{chr(10).join([f"- {m['source']}: Инвестиции {m['investment']:,.0f} KZT, Выручка {m['revenue']:,.0f} KZT, ROI {m['roi']:.1f}%, Прибыль {m['profit']:,.0f} KZT, Клиентов {m.get('customers', 0)}, CPA {m.get('cpa', 0):,.0f} KZT" for m in roi_metrics[:15]])}
-
-ОБЩАЯ СТАТИСТИКА:
-- Общая выручка: {revenue_data.get('total_revenue', 0):,.0f} KZT
-- Всего транзакций: {revenue_data.get('transaction_count', 0)}
-- Лучший источник по ROI: {roi_metrics[0]['source'] if roi_metrics else 'N/A'}
-- Общие маркетинговые инвестиции: {sum(m.get('investment', 0) for m in roi_metrics):,.0f} KZT"""
-
-        question = f"""{context}
-
-ТЫ ЭКСПЕРТ ПО МАРКЕТИНГОВОЙ АНАЛИТИКЕ И ROI ОПТИМИЗАЦИИ ИСТОЧНИКОВ ПРИВЛЕЧЕНИЯ КЛИЕНТОВ. ОБЯЗАТЕЛЬНО ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ.
-
-Проанализируй ROI метрики по источникам привлечения клиентов и предоставь:
-1. Детальный анализ эффективности каждого маркетингового источника
-2. Конкретные рекомендации по перераспределению маркетингового бюджета
-3. Определи лучшие возможности для увеличения инвестиций
-4. Оцени потенциальный ROI и прибыль от оптимизации бюджета
-5. Укажи конкретные цифры: сколько перераспределить, какой ожидаемый эффект
-6. Проанализируй CPA (стоимость привлечения клиента) по источникам
-
-Ответ должен быть на русском языке с конкретными рекомендациями, числами и расчетами."""
-
-        ai_result = rag_chain.query_with_analytics(question, {
+        ai_analysis, insight_id = await resolve_insight("roi", rag_chain.aquery_with_analytics(question, {
             "roi_metrics": roi_metrics,
             "revenue_data": revenue_data,
             "channel_data": channel_data
-        })
-        
-        ai_analysis = ai_result.get("answer", "Анализ ROI метрик")
+        }, use_cache=not request.bypass_cache), request.insights == "deferred")
         best_opportunity = roi_metrics[0]['source'] if roi_metrics else None
         
         if ai_analysis and roi_metrics:
@@ -698,7 +551,8 @@ async def get_roi_metrics(request: AnalyticsRequest = AnalyticsRequest()) -> ROI
         return ROIMetricsResponse(
             roi_metrics=roi_metrics,
             ai_analysis=ai_analysis,
-            best_investment_opportunity=best_opportunity
+            best_investment_opportunity=best_opportunity,
+            insight_id=insight_id
         )
         
     except Exception as e:
@@ -7,6 +7,8 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.schemas import SQLRequest, SQLResponse, QuestionResponse
 from services.data_service import get_data_service
 from rag.rag_chain import get_rag_chain
+from services.concurrency import run_blocking
+from rag.semantic_cache import lookup_answer, store_answer
 
 router = APIRouter(prefix="/ask", tags=["SQL Generation & AI Questions"])
 
@@ -18,27 +20,37 @@ async def ask_question(request: SQLRequest) -> SQLResponse:
         if not question or not question.strip():
             raise HTTPException(status_code=400, detail="Question is required")
         
+        if not request.bypass_cache:
+            cached = await run_blocking(lookup_answer, "ask", question)
+            if cached is not None:
+                return SQLResponse(**cached, cached=True)
+        
         data_service = get_data_service()
         rag_chain = get_rag_chain()
         
         try:
-            table_schema = data_service.get_table_schema()
-            result = rag_chain.generate_sql_query(question, table_schema)
+            table_schema = await run_blocking(data_service.get_table_schema)
+            result = await rag_chain.agenerate_sql_query(question, table_schema)
             
-            return SQLResponse(
+            response = SQLResponse(
                 sql_query=result.get("sql_query", ""),
                 explanation=result.get("explanation", result.get("answer", "No explanation available")),
                 table_name=result.get("table_name", "transactions")
             )
         except Exception as sql_error:
-            result = rag_chain.query(question, use_rag=True)
+            result = await rag_chain.aquery(question, use_rag=True)
             answer = result.get("answer", "Не удалось получить ответ")
             
-            return SQLResponse(
+            response = SQLResponse(
                 sql_query="",
                 explanation=answer,
                 table_name="transactions"
             )
+        
+        # Fallback texts (no LLM, LLM down) are not answers worth reusing
+        if not result.get("fallback"):
+            await run_blocking(store_answer, "ask", question, response.model_dump(exclude={"cached"}))
+        return response
     except HTTPException:
         raise
     except Exception as e:
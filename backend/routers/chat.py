@@ -1,86 +1,43 @@
-from fastapi import APIRouter, HTTPException
-from typing import Dict, Any, Optional, List
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional, List, Tuple
 import sys
 import os
+import json
+import threading
+from contextlib import aclosing
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.schemas import QuestionRequest, QuestionResponse
 from services.data_service import get_data_service
+from services.dataset_overview import get_dataset_overview
+from rag.rag_chain import get_rag_chain
+from rag.semantic_cache import lookup_answer, store_answer
+from rag.resilience import LLMUnavailableError
+from services.concurrency import run_blocking, llm_slot
 from config.config import settings
 
 router = APIRouter(prefix="/chat", tags=["AI Chat"])
 
-def call_deepseek_api(question: str, context: str = "") -> str:
-    try:
-        import os
-        import sys
-        
-        try:
-            import langchain
-            attrs_to_set = ['verbose', 'debug', 'llm_cache', 'tracing_v2', 'tracing_callback']
-            for attr in attrs_to_set:
-                if not hasattr(langchain, attr):
-                    setattr(langchain, attr, None if attr == 'llm_cache' else False)
-        except (ImportError, AttributeError) as patch_error:
-            print(f"Warning: Could not patch langchain: {patch_error}")
-        
-        os.environ["LANGCHAIN_VERBOSE"] = "false"
-        os.environ["LANGCHAIN_DEBUG"] = "false"
-        
-        from langchain_openai import ChatOpenAI
-        from langchain_core.messages import HumanMessage, SystemMessage
-        
-        try:
-            from langchain_core import globals as langchain_globals
-            for attr in ['_verbose', '_debug', '_llm_cache']:
-                if hasattr(langchain_globals, attr):
-                    setattr(langchain_globals, attr, None if 'cache' in attr else False)
-        except:
-            pass
-        
-        llm_kwargs = {
-            "model": settings.LLM_MODEL or "deepseek-chat",
-            "temperature": float(settings.TEMPERATURE) if settings.TEMPERATURE else 0.7,
-        }
-        
-        api_key = settings.API_KEY
-        if api_key:
-            llm_kwargs["openai_api_key"] = api_key
-        else:
-            raise ValueError("API_KEY is not set in environment")
-        
-        if settings.API_BASE_URL:
-            base_url = settings.API_BASE_URL.rstrip('/')
-            if not base_url.endswith('/v1'):
-                base_url = base_url + '/v1'
-            llm_kwargs["base_url"] = base_url
-        
-        try:
-            try:
-                from langchain_core import globals as langchain_globals
-                if hasattr(langchain_globals, '_verbose'):
-                    langchain_globals._verbose = False
-                if hasattr(langchain_globals, '_debug'):
-                    langchain_globals._debug = False
-            except:
-                pass
-            
-            llm = ChatOpenAI(**llm_kwargs)
-        except (AttributeError, TypeError) as e:
-                error_str = str(e)
-                if "verbose" in error_str or "debug" in error_str or "has no attribute" in error_str:
-                    try:
-                        import langchain
-                        langchain.verbose = False
-                        langchain.debug = False
-                    except:
-                        pass
-                    
-                    llm = ChatOpenAI(**llm_kwargs)
-                else:
-                    raise
-        
-        system_prompt = """Ты эксперт по финансовой аналитике и AI-ассистент, специализирующийся на аналитике цифровой экономики Казахстана.
+_chat_llm = None
+_chat_llm_lock = threading.Lock()
+
+def _get_chat_llm():
+    """Process-wide chat LLM: the RAGChain client (and its connection pool) bound to the chat temperature."""
+    global _chat_llm
+    if _chat_llm is None:
+        with _chat_llm_lock:
+            if _chat_llm is None:
+                llm = get_rag_chain().llm
+                if llm is None:
+                    raise ValueError("API_KEY is not set in environment")
+                _chat_llm = llm.bind(temperature=float(settings.TEMPERATURE) if settings.TEMPERATURE else 0.7)
+    return _chat_llm
+
+def _chat_messages(question: str, context: str = "") -> list:
+    from langchain_core.messages import HumanMessage, SystemMessage
+    
+    system_prompt = """Ты эксперт по финансовой аналитике и AI-ассистент, специализирующийся на аналитике цифровой экономики Казахстана.
 
 Твоя экспертиза включает:
 - Анализ транзакционных данных и обнаружение мошенничества
@@ -118,72 +75,87 @@ def call_deepseek_api(question: str, context: str = "") -> str:
 - Используй --- для горизонтальных разделителей
 - Используй таблицы при представлении данных
 - Делай параграфы краткими и хорошо структурированными"""
-        
-        if context:
-            user_message = f"""Контекст из датасета:
+    
+    if context:
+        user_message = f"""Контекст из датасета:
 {context}
 
 Вопрос: {question}
 
 Предоставь комплексный профессиональный анализ на основе предоставленного контекста. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
-        else:
-            user_message = f"""Вопрос: {question}
+    else:
+        user_message = f"""Вопрос: {question}
 
 Предоставь комплексный профессиональный анализ. Если нужен контекст данных, попроси уточнения. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
-        
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_message)
-        ]
-        
-        try:
-            import langchain
-            for attr in ['verbose', 'debug', 'llm_cache', 'tracing_v2', 'tracing_callback']:
-                if not hasattr(langchain, attr):
-                    setattr(langchain, attr, None if attr == 'llm_cache' else False)
-        except:
-            pass
-        
-        try:
-            response = llm.invoke(messages)
-        except (AttributeError, TypeError) as e:
-            error_str = str(e)
-            if "has no attribute" in error_str:
-                try:
-                    import langchain
-                    import re
-                    match = re.search(r"has no attribute '(\w+)'", error_str)
-                    if match:
-                        attr_name = match.group(1)
-                        setattr(langchain, attr_name, None if 'cache' in attr_name else False)
-                        response = llm.invoke(messages)
-                    else:
-                        raise
-                except:
-                    raise
-            else:
-                raise
-        
-        answer = response.content if hasattr(response, 'content') else str(response)
-        
-        return answer
-        
-    except ImportError as e:
-        raise HTTPException(
+    
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_message)
+    ]
+
+def _chat_fallback_answer(context: str) -> str:
+    if not context:
+        return "AI-ассистент временно недоступен. Пожалуйста, повторите вопрос позже."
+    return f"""AI-ассистент временно недоступен, поэтому ниже приведена сводка по данным без анализа. Повторите вопрос позже для развернутого ответа.
+
+{context}"""
+
+def _chat_api_error(e: Exception) -> HTTPException:
+    if isinstance(e, LLMUnavailableError):
+        return HTTPException(status_code=503, detail=str(e)[:300])
+    if isinstance(e, ImportError):
+        return HTTPException(
             status_code=500, 
             detail=f"LLM library not available: {str(e)}. Please install langchain-openai."
         )
-    except Exception as e:
-        error_msg = str(e)
-        if "API key" in error_msg or "401" in error_msg or "invalid" in error_msg.lower():
-            raise HTTPException(
-                status_code=401,
-                detail=f"Invalid API key or authentication error. Please check API_KEY in .env file. Error: {error_msg[:200]}"
-            )
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error calling DeepSeek API: {error_msg[:300]}"
+    error_msg = str(e)
+    if "API key" in error_msg or "401" in error_msg or "invalid" in error_msg.lower():
+        return HTTPException(
+            status_code=401,
+            detail=f"Invalid API key or authentication error. Please check API_KEY in .env file. Error: {error_msg[:200]}"
         )
+    return HTTPException(
+        status_code=500,
+        detail=f"Error calling DeepSeek API: {error_msg[:300]}"
+    )
+
+async def acall_deepseek_api(question: str, context: str = "") -> str:
+    try:
+        llm = _get_chat_llm()
+        messages = _chat_messages(question, context)
+        async with llm_slot():
+            response = await get_rag_chain().llm_guard.ainvoke(lambda: llm.ainvoke(messages))
+        return response.content if hasattr(response, 'content') else str(response)
+    except LLMUnavailableError:
+        raise
+    except Exception as e:
+        raise _chat_api_error(e)
+
+def _build_chat_context(question: str) -> Tuple[str, List[Dict[str, Any]]]:
+    context = ""
+    sources = []
+    
+    try:
+        overview = get_dataset_overview()
+        if overview is not None:
+            context = overview.context_for(question)
+            sources.append(dict(overview.source))
+    except Exception as e:
+        print(f"Warning: Could not get comprehensive data context: {e}")
+        import traceback
+        traceback.print_exc()
+        try:
+            data_service = get_data_service()
+            relevant_data = data_service.get_relevant_data_for_question(question, limit=50)
+            if relevant_data:
+                context_parts = [f"Sample of {len(relevant_data)} transactions:"]
+                for i, doc in enumerate(relevant_data[:20], 1):
+                    context_parts.append(f"{i}. {doc.get('content', '')}")
+                context = "\n".join(context_parts)
+        except:
+            pass
+    
+    return context, sources
 
 @router.post("", response_model=QuestionResponse)
 async def chat_message(request: QuestionRequest) -> QuestionResponse:
@@ -193,167 +165,22 @@ async def chat_message(request: QuestionRequest) -> QuestionResponse:
         if not question or not question.strip():
             raise HTTPException(status_code=400, detail="Question is required")
         
-        context = ""
-        sources = []
+        if not request.bypass_cache:
+            cached = await run_blocking(lookup_answer, "chat", question)
+            if cached is not None:
+                return QuestionResponse(**cached, cached=True)
         
-        try:
-            data_service = get_data_service()
-            df = data_service.get_dataframe()
-            
-            if df is not None and len(df) > 0:
-                import pandas as pd
-                
-                context_parts = []
-                
-                context_parts.append("=== DATASET OVERVIEW ===")
-                context_parts.append(f"Total transactions: {len(df)}")
-                
-                if 'date' in df.columns and not df['date'].isna().all():
-                    df['date'] = pd.to_datetime(df['date'], errors='coerce')
-                    date_range = df['date'].dropna()
-                    if len(date_range) > 0:
-                        context_parts.append(f"Date range: {date_range.min()} to {date_range.max()}")
-                        context_parts.append(f"Unique dates: {date_range.dt.date.nunique()}")
-                        context_parts.append(f"Months covered: {date_range.dt.to_period('M').nunique()}")
-                
-                if 'amount_kzt' in df.columns:
-                    valid_amounts = df['amount_kzt'].dropna()
-                    if len(valid_amounts) > 0:
-                        context_parts.append(f"\n=== REVENUE STATISTICS ===")
-                        context_parts.append(f"Total revenue: {valid_amounts.sum():,.2f} KZT")
-                        context_parts.append(f"Average transaction: {valid_amounts.mean():,.2f} KZT")
-                        context_parts.append(f"Median transaction: {valid_amounts.median():,.2f} KZT")
-                        context_parts.append(f"Min: {valid_amounts.min():,.2f} KZT, Max: {valid_amounts.max():,.2f} KZT")
-                
-                if 'channel' in df.columns:
-                    channel_stats = df.groupby('channel').agg({
-                        'amount_kzt': ['sum', 'count', 'mean'],
-                        'transaction_id': 'nunique' if 'transaction_id' in df.columns else 'count'
-                    }).round(2)
-                    context_parts.append(f"\n=== CHANNEL DISTRIBUTION ===")
-                    for channel in channel_stats.index:
-                        total = channel_stats.loc[channel, ('amount_kzt', 'sum')]
-                        count = channel_stats.loc[channel, ('amount_kzt', 'count')]
-                        avg = channel_stats.loc[channel, ('amount_kzt', 'mean')]
-                        pct = (total / valid_amounts.sum() * 100) if len(valid_amounts) > 0 and valid_amounts.sum() > 0 else 0
-                        context_parts.append(f"{channel}: {total:,.2f} KZT ({pct:.1f}%), {count} transactions, avg {avg:,.2f} KZT")
-                
-                if 'merchant_category' in df.columns:
-                    category_stats = df.groupby('merchant_category').agg({
-                        'amount_kzt': ['sum', 'count', 'mean']
-                    }).round(2)
-                    context_parts.append(f"\n=== MERCHANT CATEGORY DISTRIBUTION ===")
-                    for category in category_stats.index:
-                        total = category_stats.loc[category, ('amount_kzt', 'sum')]
-                        count = category_stats.loc[category, ('amount_kzt', 'count')]
-                        avg = category_stats.loc[category, ('amount_kzt', 'mean')]
-                        pct = (total / valid_amounts.sum() * 100) if len(valid_amounts) > 0 and valid_amounts.sum() > 0 else 0
-                        context_parts.append(f"{category}: {total:,.2f} KZT ({pct:.1f}%), {count} transactions")
-                
-                if 'city' in df.columns:
-                    city_stats = df.groupby('city').agg({
-                        'amount_kzt': ['sum', 'count']
-                    }).round(2).sort_values(('amount_kzt', 'sum'), ascending=False).head(15)
-                    context_parts.append(f"\n=== TOP CITIES BY REVENUE ===")
-                    for city in city_stats.index:
-                        total = city_stats.loc[city, ('amount_kzt', 'sum')]
-                        count = city_stats.loc[city, ('amount_kzt', 'count')]
-                        context_parts.append(f"{city}: {total:,.2f} KZT, {count} transactions")
-                
-                if 'region' in df.columns:
-                    region_stats = df.groupby('region').agg({
-                        'amount_kzt': ['sum', 'count']
-                    }).round(2).sort_values(('amount_kzt', 'sum'), ascending=False)
-                    context_parts.append(f"\n=== REGION DISTRIBUTION ===")
-                    for region in region_stats.index:
-                        total = region_stats.loc[region, ('amount_kzt', 'sum')]
-                        count = region_stats.loc[region, ('amount_kzt', 'count')]
-                        context_parts.append(f"{region}: {total:,.2f} KZT, {count} transactions")
-                
-                if 'payment_method' in df.columns:
-                    payment_stats = df.groupby('payment_method').agg({
-                        'amount_kzt': ['sum', 'count']
-                    }).round(2).sort_values(('amount_kzt', 'sum'), ascending=False)
-                    context_parts.append(f"\n=== PAYMENT METHOD DISTRIBUTION ===")
-                    for method in payment_stats.index:
-                        total = payment_stats.loc[method, ('amount_kzt', 'sum')]
-                        count = payment_stats.loc[method, ('amount_kzt', 'count')]
-                        pct = (total / valid_amounts.sum() * 100) if len(valid_amounts) > 0 and valid_amounts.sum() > 0 else 0
-                        context_parts.append(f"{method}: {total:,.2f} KZT ({pct:.1f}%), {count} transactions")
-                
-                if 'customer_segment' in df.columns:
-                    segment_stats = df.groupby('customer_segment').agg({
-                        'amount_kzt': ['sum', 'count']
-                    }).round(2).sort_values(('amount_kzt', 'sum'), ascending=False)
-                    context_parts.append(f"\n=== CUSTOMER SEGMENT DISTRIBUTION ===")
-                    for segment in segment_stats.index:
-                        total = segment_stats.loc[segment, ('amount_kzt', 'sum')]
-                        count = segment_stats.loc[segment, ('amount_kzt', 'count')]
-                        context_parts.append(f"{segment}: {total:,.2f} KZT, {count} transactions")
-                
-                if 'date' in df.columns and not df['date'].isna().all():
-                    df['year_month'] = df['date'].dt.to_period('M').astype(str)
-                    monthly_trends = df.groupby('year_month').agg({
-                        'amount_kzt': ['sum', 'count']
-                    }).round(2)
-                    context_parts.append(f"\n=== MONTHLY TRENDS ===")
-                    for month in monthly_trends.index:
-                        total = monthly_trends.loc[month, ('amount_kzt', 'sum')]
-                        count = monthly_trends.loc[month, ('amount_kzt', 'count')]
-                        context_parts.append(f"{month}: {total:,.2f} KZT, {count} transactions")
-                
-                if 'is_refunded' in df.columns:
-                    refunded_count = df['is_refunded'].sum()
-                    refunded_pct = (refunded_count / len(df) * 100) if len(df) > 0 else 0
-                    context_parts.append(f"\n=== TRANSACTION STATUS ===")
-                    context_parts.append(f"Refunded transactions: {refunded_count} ({refunded_pct:.2f}%)")
-                
-                if 'is_canceled' in df.columns:
-                    canceled_count = df['is_canceled'].sum()
-                    canceled_pct = (canceled_count / len(df) * 100) if len(df) > 0 else 0
-                    context_parts.append(f"Canceled transactions: {canceled_count} ({canceled_pct:.2f}%)")
-                
-                valid_transactions = len(df[(df.get('is_refunded', 0) == 0) & (df.get('is_canceled', 0) == 0)])
-                context_parts.append(f"Valid transactions: {valid_transactions} ({valid_transactions/len(df)*100:.2f}%)")
-                
-                if 'suspicious_flag' in df.columns:
-                    suspicious_count = df['suspicious_flag'].sum()
-                    suspicious_pct = (suspicious_count / len(df) * 100) if len(df) > 0 else 0
-                    context_parts.append(f"Suspicious transactions: {suspicious_count} ({suspicious_pct:.2f}%)")
-                
-                context = "\n".join(context_parts)
-                
-                sources.append({
-                    "content": f"Dataset summary: {len(df)} transactions from {date_range.min() if 'date' in df.columns else 'N/A'} to {date_range.max() if 'date' in df.columns else 'N/A'}",
-                    "metadata": {
-                        "total_transactions": len(df),
-                        "date_range": f"{date_range.min()} to {date_range.max()}" if 'date' in df.columns and len(date_range) > 0 else "N/A"
-                    },
-                    "relevance_score": 1.0
-                })
-                
-        except Exception as e:
-            print(f"Warning: Could not get comprehensive data context: {e}")
-            import traceback
-            traceback.print_exc()
-            try:
-                data_service = get_data_service()
-                relevant_data = data_service.get_relevant_data_for_question(question, limit=50)
-                if relevant_data:
-                    context_parts = [f"Sample of {len(relevant_data)} transactions:"]
-                    for i, doc in enumerate(relevant_data[:20], 1):
-                        context_parts.append(f"{i}. {doc.get('content', '')}")
-                    context = "\n".join(context_parts)
-            except:
-                pass
+        context, sources = await run_blocking(_build_chat_context, question)
         
-        answer = call_deepseek_api(question, context)
+        try:
+            answer = await acall_deepseek_api(question, context)
+        except LLMUnavailableError as e:
+            print(f"Warning: {e}")
+            return QuestionResponse(answer=_chat_fallback_answer(context), sources=sources, confidence=0.3)
         
-        return QuestionResponse(
-            answer=answer,
-            sources=sources,
-            confidence=0.9 if context else 0.7
-        )
+        result = {"answer": answer, "sources": sources, "confidence": 0.9 if context else 0.7}
+        await run_blocking(store_answer, "chat", question, result)
+        return QuestionResponse(**result)
         
     except HTTPException:
         raise
@@ -363,8 +190,67 @@ async def chat_message(request: QuestionRequest) -> QuestionResponse:
             detail=f"Error processing chat message: {str(e)}"
         )
 
-@router.post("/stream", response_model=Dict[str, Any])
-async def chat_message_stream(request: QuestionRequest):
-    response = await chat_message(request)
-    return response.model_dump()
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
+@router.post("/stream")
+async def chat_message_stream(request: QuestionRequest, http_request: Request) -> StreamingResponse:
+    """Server-Sent Events: one `sources` event, `token` events as the LLM generates, then `done`.
+
+    Starlette cancels the generator when the client disconnects, which closes the
+    upstream LLM stream as well.
+    """
+    question = request.question if hasattr(request, 'question') and request.question else ""
+    if not question or not question.strip():
+        raise HTTPException(status_code=400, detail="Question is required")
+    
+    async def event_stream():
+        try:
+            if not request.bypass_cache:
+                cached = await run_blocking(lookup_answer, "chat", question)
+                if cached is not None:
+                    # A reused answer arrives as one token event
+                    yield _sse_event("sources", {"sources": cached["sources"], "confidence": cached["confidence"]})
+                    yield _sse_event("token", {"content": cached["answer"]})
+                    yield _sse_event("done", {"cached": True})
+                    return
+            
+            context, sources = await run_blocking(_build_chat_context, question)
+            confidence = 0.9 if context else 0.7
+            yield _sse_event("sources", {"sources": sources, "confidence": confidence})
+            
+            llm = _get_chat_llm()
+            messages = _chat_messages(question, context)
+            parts = []
+            # aclosing: leaving the loop early (client gone) closes the upstream HTTP stream
+            # and frees the LLM slot now instead of at garbage collection
+            async with llm_slot(), aclosing(get_rag_chain().llm_guard.astream(lambda: llm.astream(messages))) as stream:
+                async for chunk in stream:
+                    if await http_request.is_disconnected():
+                        print("Chat stream: client disconnected, cancelling LLM request")
+                        return
+                    content = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    if content:
+                        parts.append(content)
+                        yield _sse_event("token", {"content": content})
+            # Only complete answers are reused
+            await run_blocking(store_answer, "chat", question,
+                               {"answer": "".join(parts), "sources": sources, "confidence": confidence})
+            yield _sse_event("done", {"cached": False})
+        except LLMUnavailableError as e:
+            print(f"Warning: {e}")
+            if parts:
+                # Part of the answer is already out; a summary now would not fit after it
+                yield _sse_event("error", {"status_code": 503, "detail": str(e)[:300]})
+                return
+            yield _sse_event("token", {"content": _chat_fallback_answer(context)})
+            yield _sse_event("done", {"cached": False, "fallback": True})
+        except Exception as e:
+            error = e if isinstance(e, HTTPException) else _chat_api_error(e)
+            yield _sse_event("error", {"status_code": error.status_code, "detail": error.detail})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,109 @@
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, Any, Tuple
+import asyncio
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.schemas import AnalyticsRequest, DashboardResponse
+from services.prediction_service import get_prediction_service
+from services.concurrency import run_blocking
+from services.insights import get_insight_store
+from rag.rag_chain import get_rag_chain
+from rag.insight_prompts import revenue_question, channels_question, retention_question, roi_question, suspicious_question
+
+router = APIRouter(prefix="/dashboard", tags=["Dashboard"])
+
+DASHBOARD_PANELS = ("revenue", "channels", "retention", "roi", "suspicious")
+
+def _insight_sections(panels, revenue_data: Dict[str, Any], channel_data: Dict[str, Any],
+                      retention_data: Dict[str, Any], roi_data: Dict[str, Any],
+                      suspicious_data: Dict[str, Any]) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+    """(question, data summary) per panel, the same inputs the per-panel endpoints send."""
+    builders = {
+        "revenue": lambda: (revenue_question(revenue_data), revenue_data),
+        "channels": lambda: (channels_question(channel_data), channel_data),
+        "retention": lambda: (retention_question(retention_data), retention_data),
+        "roi": lambda: (roi_question(roi_data["roi_metrics"], revenue_data), {
+            "roi_metrics": roi_data["roi_metrics"],
+            "revenue_data": revenue_data,
+            "channel_data": roi_data["channel_data"]
+        }),
+        "suspicious": lambda: (suspicious_question(suspicious_data), suspicious_data),
+    }
+    return {panel: builders[panel]() for panel in panels}
+
+async def _deferred_sections(batch) -> Dict[str, Any]:
+    return {"answer": "", "sections": await batch}
+
+@router.post("", response_model=DashboardResponse)
+async def get_dashboard(
+    request: AnalyticsRequest = AnalyticsRequest(),
+    suspicious_limit: int = Query(20, ge=0, le=100, description="Number of suspicious transactions to include"),
+    insight_panels: str = Query(",".join(DASHBOARD_PANELS), description="Comma-separated panels to generate AI insights for (empty for none)")
+) -> DashboardResponse:
+    """All dashboard panels from one filtered frame, computed in parallel.
+
+    Replaces the revenue, channels, retention, roi and suspicious calls a page load
+    used to make, each of which filtered and copied the dataset on its own. AI
+    insights for the requested panels come from a single batched LLM call.
+    """
+    panels = [panel.strip() for panel in insight_panels.split(",") if panel.strip()]
+    unknown = [panel for panel in panels if panel not in DASHBOARD_PANELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown insight panels: {', '.join(unknown)}. Available: {', '.join(DASHBOARD_PANELS)}")
+    
+    try:
+        prediction_service = get_prediction_service()
+        # The frame must come from the data the models and feature store were built on
+        data_service = prediction_service.data_service
+        
+        filters = {}
+        if request.start_date:
+            filters['start_date'] = request.start_date
+        if request.end_date:
+            filters['end_date'] = request.end_date
+        if request.region:
+            filters['region'] = request.region
+        if request.city:
+            filters['city'] = request.city
+        if request.merchant_category:
+            filters['merchant_category'] = request.merchant_category
+        if request.channel:
+            filters['channel'] = request.channel
+        
+        df = await run_blocking(data_service.get_dataframe, filters)
+        revenue_data, channel_data, retention_data, roi_data, suspicious_data = await asyncio.gather(
+            run_blocking(data_service.get_revenue_analytics, filters, df=df),
+            run_blocking(data_service.get_channel_analytics, filters, df=df),
+            run_blocking(data_service.get_retention_analytics, filters, df=df),
+            run_blocking(data_service.get_roi_metrics, filters, df=df),
+            run_blocking(prediction_service.detect_suspicious_transactions, filters, limit=suspicious_limit, df=df)
+        )
+        
+        ai_insights, insight_id = {}, None
+        if panels:
+            sections = _insight_sections(panels, revenue_data, channel_data, retention_data, roi_data, suspicious_data)
+            batch = get_rag_chain().abatch_insights(sections, use_cache=not request.bypass_cache)
+            if request.insights == "deferred":
+                insight_id = get_insight_store().submit("dashboard", _deferred_sections(batch))
+            else:
+                ai_insights = await batch
+        
+        roi_metrics = roi_data["roi_metrics"]
+        return DashboardResponse(
+            filters=filters,
+            data_version=data_service.version,
+            revenue=revenue_data,
+            channels=channel_data,
+            retention=retention_data,
+            roi={
+                "roi_metrics": roi_metrics,
+                "best_investment_opportunity": roi_metrics[0]['source'] if roi_metrics else None
+            },
+            suspicious=suspicious_data,
+            ai_insights=ai_insights,
+            insight_id=insight_id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating dashboard: {str(e)}")
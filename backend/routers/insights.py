@@ -0,0 +1,64 @@
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Any
+import sys
+import os
+import json
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.schemas import InsightResponse
+from services.insights import get_insight_store
+
+router = APIRouter(prefix="/insights", tags=["Insights"])
+
+# Comment line sent while an insight is pending so proxies keep the stream open
+SSE_KEEPALIVE_SECONDS = 15
+
+def _insight_response(entry: dict) -> InsightResponse:
+    return InsightResponse(
+        insight_id=entry["insight_id"],
+        kind=entry["kind"],
+        status=entry["status"],
+        text=entry["text"],
+        sections=entry["sections"],
+        error=entry["error"]
+    )
+
+def _sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+@router.get("/{insight_id}", response_model=InsightResponse)
+async def get_insight(
+    insight_id: str,
+    wait: float = Query(0, ge=0, le=30, description="Seconds to wait for a pending insight before answering (long poll)")
+) -> InsightResponse:
+    entry = await get_insight_store().wait(insight_id, wait)
+    if entry is None:
+        raise HTTPException(status_code=404, detail=f"Insight {insight_id} not found or expired")
+    return _insight_response(entry)
+
+@router.get("/{insight_id}/stream")
+async def stream_insight(insight_id: str, http_request: Request) -> StreamingResponse:
+    """Server-Sent Events: a single `insight` event once the text is ready (or failed)."""
+    store = get_insight_store()
+    if store.get(insight_id) is None:
+        raise HTTPException(status_code=404, detail=f"Insight {insight_id} not found or expired")
+
+    async def event_stream():
+        while True:
+            entry = await store.wait(insight_id, SSE_KEEPALIVE_SECONDS)
+            if entry is None:
+                yield _sse_event("error", {"status_code": 404, "detail": f"Insight {insight_id} expired"})
+                return
+            if entry["status"] != "pending":
+                yield _sse_event("insight", _insight_response(entry).model_dump())
+                return
+            if await http_request.is_disconnected():
+                return
+            yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
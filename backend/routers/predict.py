@@ -6,13 +6,17 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from models.schemas import (
     PredictionRequest, TransactionPredictionResponse,
+    BatchPredictionRequest, BatchTransactionPredictionResponse,
     CancellationPredictionRequest, CancellationPredictionResponse,
     SuspiciousTransactionResponse, AnalyticsRequest,
     RecommendationsResponse, RecommendationItem, ROIMetricsResponse
 )
-from services.prediction_service import get_prediction_service
+from services.prediction_service import get_prediction_service, FORECAST_DIMENSIONS
 from services.data_service import get_data_service
 from rag.rag_chain import get_rag_chain
+from rag.insight_prompts import suspicious_question
+from services.concurrency import run_blocking
+from services.insights import resolve_insight
 
 router = APIRouter(prefix="/predict", tags=["Predictions"])
 
@@ -28,7 +32,8 @@ async def predict_transactions(request: PredictionRequest = PredictionRequest(da
         if request.end_date:
             filters['end_date'] = request.end_date
         
-        predictions = prediction_service.predict_transaction_volume(
+        predictions = await run_blocking(
+            prediction_service.predict_transaction_volume,
             days_ahead=request.days_ahead,
             filters=filters if filters else None
         )
@@ -40,24 +45,59 @@ async def predict_transactions(request: PredictionRequest = PredictionRequest(da
 
 Предоставь анализ прогноза, определи тренды и предложи действия на основе прогнозов. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
         
-        ai_result = rag_chain.query_with_analytics(question, predictions)
+        ai_analysis, insight_id = await resolve_insight(
+            "transactions", rag_chain.aquery_with_analytics(question, predictions, use_cache=not request.bypass_cache),
+            request.insights == "deferred"
+        )
         
         return TransactionPredictionResponse(
             predicted_volume=predictions["predicted_volume"],
             predicted_total_revenue=predictions["predicted_total_revenue"],
             confidence_interval=predictions["confidence_interval"],
-            ai_analysis=ai_result["answer"]
+            ai_analysis=ai_analysis,
+            insight_id=insight_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating transaction predictions: {str(e)}")
 
+@router.post("/transactions/batch", response_model=BatchTransactionPredictionResponse)
+async def predict_transactions_batch(request: BatchPredictionRequest = BatchPredictionRequest()) -> BatchTransactionPredictionResponse:
+    unknown = [dimension for dimension in request.dimensions if dimension not in FORECAST_DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown forecast dimensions: {', '.join(unknown)}. Available: {', '.join(FORECAST_DIMENSIONS)}")
+    
+    try:
+        prediction_service = get_prediction_service()
+        
+        filters = {}
+        if request.start_date:
+            filters['start_date'] = request.start_date
+        if request.end_date:
+            filters['end_date'] = request.end_date
+        
+        forecast = await run_blocking(
+            prediction_service.predict_hierarchical_volume,
+            days_ahead=request.days_ahead,
+            filters=filters if filters else None,
+            dimensions=request.dimensions
+        )
+        
+        return BatchTransactionPredictionResponse(
+            dates=forecast["dates"],
+            series=forecast["series"],
+            reconciled=forecast["reconciled"]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating batch transaction predictions: {str(e)}")
+
 @router.post("/cancellation", response_model=CancellationPredictionResponse)
 async def predict_cancellation(request: CancellationPredictionRequest) -> CancellationPredictionResponse:
     try:
         prediction_service = get_prediction_service()
         rag_chain = get_rag_chain()
         
-        prediction = prediction_service.predict_cancellation_probability(
+        prediction = await run_blocking(
+            prediction_service.predict_cancellation_probability,
             amount_kzt=request.amount_kzt,
             channel=request.channel,
             payment_method=request.payment_method,
@@ -74,13 +114,17 @@ async def predict_cancellation(request: CancellationPredictionRequest) -> Cancel
 
 Предоставь рекомендации по снижению риска отмены. ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ."""
         
-        ai_result = rag_chain.query_with_analytics(question, prediction)
+        ai_recommendations, insight_id = await resolve_insight(
+            "cancellation", rag_chain.aquery_with_analytics(question, prediction, use_cache=not request.bypass_cache),
+            request.insights == "deferred"
+        )
         
         return CancellationPredictionResponse(
             cancellation_probability=prediction["cancellation_probability"],
             risk_level=prediction["risk_level"],
             factors=prediction["factors"],
-            ai_recommendations=ai_result["answer"]
+            ai_recommendations=ai_recommendations,
+            insight_id=insight_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating cancellation prediction: {str(e)}")
@@ -101,50 +145,26 @@ async def detect_suspicious_transactions(request: AnalyticsRequest = AnalyticsRe
         if request.city:
             filters['city'] = request.city
         
-        suspicious_data = prediction_service.detect_suspicious_transactions(
+        suspicious_data = await run_blocking(
+            prediction_service.detect_suspicious_transactions,
             filters=filters if filters else None,
             limit=100
         )
         
-        sample_txns = suspicious_data['suspicious_transactions'][:10] if suspicious_data['suspicious_transactions'] else []
-        txn_details = "\n".join([
-            f"- Txn {t.get('transaction_id', 'N/A')}: {t.get('amount_kzt', 0):,.0f} KZT, "
-            f"Score: {t.get('anomaly_score', 0):.2f}, Reason: {t.get('reason', 'N/A')}, "
-            f"Risk: {t.get('risk_level', 'unknown')}"
-            for t in sample_txns
-        ])
-        
-        question = f"""Ты профессиональный аналитик по мошенничеству и аномалиям в транзакционных данных для цифровой экономики Казахстана.
-
-ПРОАНАЛИЗИРУЙ следующие подозрительные транзакции:
-
-СВОДКА:
-- Всего обнаружено подозрительных транзакций: {suspicious_data['total_suspicious']}
-- Выявлено факторов риска: {len(suspicious_data.get('risk_factors', []))}
-- Методология модели: {suspicious_data.get('model_insights', 'ML-based anomaly detection')}
-
-ПРИМЕРЫ ПОДОЗРИТЕЛЬНЫХ ТРАНЗАКЦИЙ:
-{txn_details if txn_details else 'Не обнаружено'}
-
-ФАКТОРЫ РИСКА:
-{chr(10).join([f"- {rf.get('factor', 'unknown')}: {rf.get('description', '')} ({rf.get('count', 0)} случаев)" for rf in suspicious_data.get('risk_factors', [])])}
-
-ОБЯЗАТЕЛЬНО ОТВЕТЬ НА РУССКОМ ЯЗЫКЕ и предоставь профессиональный анализ:
-1. Определи наиболее критические паттерны мошенничества и их влияние на бизнес
-2. Объясни ПОЧЕМУ каждый паттерн подозрителен с конкретными метриками
-3. Рекомендуй немедленные действия и стратегии предотвращения мошенничества
-4. Оцени потенциальный финансовый риск
-5. Предложи правила мониторинга и алертинга
-Используй профессиональный аналитический язык с конкретными числами и практическими рекомендациями."""
+        question = suspicious_question(suspicious_data)
         
-        ai_result = rag_chain.query_with_analytics(question, suspicious_data)
+        ai_analysis, insight_id = await resolve_insight(
+            "suspicious", rag_chain.aquery_with_analytics(question, suspicious_data, use_cache=not request.bypass_cache),
+            request.insights == "deferred"
+        )
         
         return SuspiciousTransactionResponse(
             suspicious_transactions=suspicious_data["suspicious_transactions"],
             total_suspicious=suspicious_data["total_suspicious"],
             risk_factors=suspicious_data["risk_factors"],
-            ai_analysis=ai_result["answer"],
-            model_insights=suspicious_data.get("model_insights", "ML-based anomaly detection using Isolation Forest")
+            ai_analysis=ai_analysis,
+            model_insights=suspicious_data.get("model_insights", "ML-based anomaly detection using Isolation Forest"),
+            insight_id=insight_id
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error detecting suspicious transactions: {str(e)}")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, BackgroundTasks
 from typing import Dict, Any
 import pandas as pd
 import os
@@ -10,6 +10,8 @@ import json
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config import settings
 from services.data_service import reload_data_service
+from rag.vectorstore import get_vectorstore_manager
+from services.prediction_service import get_prediction_service
 
 router = APIRouter(prefix="/api", tags=["File Upload"])
 
@@ -31,8 +33,22 @@ def save_metadata(metadata: Dict[str, Dict[str, Any]]):
     with open(METADATA_FILE, 'w', encoding='utf-8') as f:
         json.dump(metadata, f, ensure_ascii=False, indent=2)
 
+def sync_vectorstore_with_upload():
+    try:
+        if get_vectorstore_manager().sync_active_dataset():
+            print("Vectorstore synced with uploaded data")
+    except Exception as e:
+        print(f"Warning: Could not sync vectorstore with uploaded data: {e}")
+
+def retrain_models_with_upload():
+    try:
+        get_prediction_service()
+        print("Predictive models retrained on uploaded data")
+    except Exception as e:
+        print(f"Warning: Could not retrain models on uploaded data: {e}")
+
 @router.post("/upload")
-async def upload_csv_file(file: UploadFile = File(...)) -> Dict[str, Any]:
+async def upload_csv_file(background_tasks: BackgroundTasks, file: UploadFile = File(...)) -> Dict[str, Any]:
     if not file.filename or not file.filename.endswith('.csv'):
         raise HTTPException(
             status_code=400, 
@@ -72,6 +88,8 @@ async def upload_csv_file(file: UploadFile = File(...)) -> Dict[str, Any]:
             try:
                 reload_data_service(str(file_path))
                 print(f"Data service reloaded with uploaded file: {file_path}")
+                background_tasks.add_task(retrain_models_with_upload)
+                background_tasks.add_task(sync_vectorstore_with_upload)
             except Exception as reload_error:
                 print(f"Warning: Could not reload data service: {reload_error}")
             
@@ -0,0 +1,65 @@
+import asyncio
+import functools
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Optional, TypeVar
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import settings
+from rag.resilience import LLMUnavailableError
+
+T = TypeVar("T")
+
+_blocking_executor = None
+_executor_lock = threading.Lock()
+# asyncio primitives belong to one event loop, so each loop gets its own LLM semaphore
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    global _blocking_executor
+    with _executor_lock:
+        if _blocking_executor is None:
+            _blocking_executor = ThreadPoolExecutor(
+                max_workers=max(1, settings.BLOCKING_WORKERS),
+                thread_name_prefix="blocking-work"
+            )
+        return _blocking_executor
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run pandas/CPU-bound work on the bounded worker pool instead of the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_blocking_executor(), functools.partial(func, *args, **kwargs))
+
+def llm_semaphore() -> asyncio.Semaphore:
+    """Caps concurrent LLM requests per event loop at LLM_MAX_CONCURRENCY."""
+    loop = asyncio.get_running_loop()
+    with _executor_lock:
+        semaphore = _llm_semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, settings.LLM_MAX_CONCURRENCY))
+            _llm_semaphores[loop] = semaphore
+        return semaphore
+
+@asynccontextmanager
+async def llm_slot(timeout: Optional[float] = None) -> AsyncIterator[None]:
+    """Holds one LLM_MAX_CONCURRENCY slot for a whole guarded call, retries and hedges included.
+
+    Take the slot outside LLMGuard: time spent queueing is not upstream latency, so it
+    must not use up the call's deadline, trigger retries or count towards the breaker.
+    Waiting is bounded on its own (LLM_DEADLINE_SECONDS by default) and then raises
+    LLMUnavailableError, so callers fall back as they do for an unavailable LLM.
+    """
+    semaphore = llm_semaphore()
+    wait = settings.LLM_DEADLINE_SECONDS if timeout is None else timeout
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=wait)
+    except asyncio.TimeoutError:
+        raise LLMUnavailableError(f"LLM unavailable (no free request slot after {wait:g}s)") from None
+    try:
+        yield
+    finally:
+        semaphore.release()
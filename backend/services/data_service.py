@@ -4,22 +4,35 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 import os
 import sys
+import hashlib
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config.config import settings
+from services.health import set_component_state
+from services.single_flight import single_flight
 
 class DataService:
     
     def __init__(self, data_file: Optional[str] = None):
         self.df = None
+        self.version = None
         self.data_file = data_file or settings.DATA_FILE
-        self._load_data()
+        set_component_state("data", "loading", data_file=self.data_file)
+        try:
+            self._load_data()
+        except Exception as e:
+            set_component_state("data", "error", data_file=self.data_file, error=str(e)[:200])
+            raise
+        set_component_state("data", "ready", data_file=self.data_file, version=self.version, rows=len(self.df))
     
     def _load_data(self) -> None:
         data_file = self.data_file
         if not os.path.exists(data_file):
             raise FileNotFoundError(f"Data file not found: {data_file}")
         
+        with open(data_file, 'rb') as f:
+            self.version = hashlib.md5(f.read()).hexdigest()[:16]
+        
         self.df = pd.read_csv(data_file)
         
         if 'date' in self.df.columns:
@@ -53,43 +66,33 @@ class DataService:
             return None
     
     def get_dataframe(self, filters: Optional[Dict[str, Any]] = None) -> pd.DataFrame:
-        df = self.df.copy()
+        if not filters:
+            return self.df.copy()
         
-        if filters:
-            if 'start_date' in filters:
-                start_date = self._parse_date_filter(filters.get('start_date'))
-                if start_date is not None:
-                    df = df[df['date'] >= start_date]
-            
-            if 'end_date' in filters:
-                end_date = self._parse_date_filter(filters.get('end_date'))
-                if end_date is not None:
-                    df = df[df['date'] <= end_date]
-            
-            if 'region' in filters and filters.get('region'):
-                region_val = str(filters['region']).strip()
-                if region_val and region_val.lower() not in ['string', 'none', 'null', '']:
-                    df = df[df['region'] == region_val]
-            
-            if 'city' in filters and filters.get('city'):
-                city_val = str(filters['city']).strip()
-                if city_val and city_val.lower() not in ['string', 'none', 'null', '']:
-                    df = df[df['city'] == city_val]
-            
-            if 'merchant_category' in filters and filters.get('merchant_category'):
-                category_val = str(filters['merchant_category']).strip()
-                if category_val and category_val.lower() not in ['string', 'none', 'null', '']:
-                    df = df[df['merchant_category'] == category_val]
-            
-            if 'channel' in filters and filters.get('channel'):
-                channel_val = str(filters['channel']).strip()
-                if channel_val and channel_val.lower() not in ['string', 'none', 'null', '']:
-                    df = df[df['channel'] == channel_val]
+        # Combine all conditions into one mask so the frame is copied once, not once per filter
+        mask = pd.Series(True, index=self.df.index)
+        
+        if 'start_date' in filters:
+            start_date = self._parse_date_filter(filters.get('start_date'))
+            if start_date is not None:
+                mask &= self.df['date'] >= start_date
+        
+        if 'end_date' in filters:
+            end_date = self._parse_date_filter(filters.get('end_date'))
+            if end_date is not None:
+                mask &= self.df['date'] <= end_date
         
-        return df
+        for column in ('region', 'city', 'merchant_category', 'channel'):
+            if column in filters and filters.get(column):
+                value = str(filters[column]).strip()
+                if value and value.lower() not in ['string', 'none', 'null', '']:
+                    mask &= self.df[column] == value
+        
+        return self.df[mask]
     
-    def get_revenue_analytics(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        df = self.get_dataframe(filters)
+    @single_flight
+    def get_revenue_analytics(self, filters: Optional[Dict[str, Any]] = None, df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        df = self.get_dataframe(filters) if df is None else df
         
         valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)]
         
@@ -131,8 +134,9 @@ class DataService:
             "revenue_by_channel": revenue_by_channel
         }
     
-    def get_channel_analytics(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        df = self.get_dataframe(filters)
+    @single_flight
+    def get_channel_analytics(self, filters: Optional[Dict[str, Any]] = None, df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        df = self.get_dataframe(filters) if df is None else df
         valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)]
         
         if 'channel' not in valid_transactions.columns:
@@ -161,8 +165,9 @@ class DataService:
             "worst_channel": worst_channel
         }
     
-    def get_retention_analytics(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        df = self.get_dataframe(filters)
+    @single_flight
+    def get_retention_analytics(self, filters: Optional[Dict[str, Any]] = None, df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        df = self.get_dataframe(filters) if df is None else df
         valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)].copy()
         
         if len(valid_transactions) == 0:
@@ -286,6 +291,138 @@ class DataService:
             "retention_rate": float(retention_rate)
         }
     
+    @single_flight
+    def get_roi_metrics(self, filters: Optional[Dict[str, Any]] = None, df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        df = self.get_dataframe(filters) if df is None else df
+        channel_data: Dict[str, Any] = {}
+        valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)]
+        
+        roi_metrics = []
+        
+        if 'acquisition_source' in valid_transactions.columns:
+            source_stats = valid_transactions.groupby('acquisition_source').agg({
+                'amount_kzt': ['sum', 'count', 'mean'],
+                'transaction_id': 'nunique' if 'transaction_id' in valid_transactions.columns else 'count'
+            }).reset_index()
+            
+            if isinstance(source_stats.columns, pd.MultiIndex):
+                source_stats.columns = ['source', 'revenue', 'transactions', 'avg_transaction', 'customers']
+            else:
+                if len(source_stats.columns) >= 5:
+                    source_stats.columns = ['source', 'revenue', 'transactions', 'avg_transaction', 'customers']
+            
+            for _, row in source_stats.iterrows():
+                try:
+                    source = str(row['source']) if pd.notna(row.get('source')) else 'unknown'
+                    revenue = float(row['revenue']) if pd.notna(row.get('revenue')) and row.get('revenue') != '' else 0.0
+                    transactions = int(row['transactions']) if pd.notna(row.get('transactions')) and row.get('transactions') != '' else 0
+                    customers = int(row['customers']) if pd.notna(row.get('customers')) and row.get('customers') != '' else 0
+                    avg_transaction = float(row['avg_transaction']) if pd.notna(row.get('avg_transaction')) and row.get('avg_transaction') != '' else 0.0
+                    
+                    if revenue <= 0 or pd.isna(revenue) or not np.isfinite(revenue):
+                        continue
+                except (ValueError, KeyError, TypeError) as e:
+                    print(f"Warning: Error processing row in ROI calculation: {e}")
+                    continue
+                
+                investment_multipliers = {
+                    'organic': 0.05,
+                    'google_ads': 0.25,
+                    'instagram': 0.15,
+                    'facebook': 0.15,
+                    'tiktok': 0.12,
+                    'youtube': 0.18,
+                    'email': 0.08,
+                    'referral': 0.10,
+                    'direct': 0.03,
+                }
+                
+                multiplier = investment_multipliers.get(source.lower().strip(), 0.15)
+                investment = revenue * multiplier
+                
+                if investment > 0 and revenue > 0:
+                    roi = ((revenue - investment) / investment) * 100
+                    if pd.isna(roi) or not np.isfinite(roi):
+                        roi = 0.0
+                else:
+                    roi = 0.0
+                
+                profit = revenue - investment
+                
+                cpa = investment / customers if customers > 0 else (investment / transactions if transactions > 0 else 0)
+                
+                conversion_rate = (customers / transactions * 100) if transactions > 0 else 0
+                
+                roi_metrics.append({
+                    "source": source,
+                    "investment": investment,
+                    "revenue": revenue,
+                    "roi": roi,
+                    "profit": profit,
+                    "transactions": transactions,
+                    "customers": customers,
+                    "avg_transaction": avg_transaction,
+                    "cpa": cpa,
+                    "conversion_rate": conversion_rate
+                })
+        else:
+            channel_data = self.get_channel_analytics(df=df)
+            for channel in channel_data.get('channel_performance', []):
+                revenue = float(channel.get('total_revenue', channel.get('revenue', 0)) or 0)
+                transactions = int(channel.get('transaction_count', channel.get('transactions', 0)) or 0)
+                
+                if revenue <= 0:
+                    continue
+                
+                investment = revenue * 0.15
+                if investment > 0 and revenue > 0:
+                    roi = ((revenue - investment) / investment) * 100
+                    if pd.isna(roi) or not np.isfinite(roi):
+                        roi = 0.0
+                else:
+                    roi = 0.0
+                profit = revenue - investment
+                
+                roi_metrics.append({
+                    "source": channel.get('channel', 'Unknown'),
+                    "investment": investment,
+                    "revenue": revenue,
+                    "roi": roi,
+                    "profit": profit,
+                    "transactions": transactions,
+                    "customers": transactions,
+                    "avg_transaction": revenue / transactions if transactions > 0 else 0,
+                    "cpa": investment / transactions if transactions > 0 else 0,
+                    "conversion_rate": 0
+                })
+        
+        if len(roi_metrics) > 0:
+            roi_metrics.sort(key=lambda x: x.get('roi', 0), reverse=True)
+        else:
+            channel_data_fallback = self.get_channel_analytics(df=df)
+            for channel in channel_data_fallback.get('channel_performance', [])[:5]:
+                revenue = float(channel.get('total_revenue', channel.get('revenue', 0)) or 0)
+                if revenue > 0:
+                    transactions = int(channel.get('transaction_count', channel.get('transactions', 0)) or 0)
+                    investment = revenue * 0.15
+                    roi = ((revenue - investment) / investment * 100) if investment > 0 else 0
+                    profit = revenue - investment
+                    
+                    roi_metrics.append({
+                        "source": channel.get('channel', 'Unknown'),
+                        "investment": investment,
+                        "revenue": revenue,
+                        "roi": roi,
+                        "profit": profit,
+                        "transactions": transactions,
+                        "customers": transactions,
+                        "avg_transaction": revenue / transactions if transactions > 0 else 0,
+                        "cpa": investment / transactions if transactions > 0 else 0,
+                        "conversion_rate": 0
+                    })
+            
+        return {"roi_metrics": roi_metrics, "channel_data": channel_data}
+    
     def get_table_schema(self) -> Dict[str, Any]:
         schema = {
             "table_name": "transactions",
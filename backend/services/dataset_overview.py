@@ -0,0 +1,141 @@
+import pandas as pd
+from typing import Dict, List, Any, Optional
+import threading
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.data_service import get_data_service, DataService
+
+# Section name -> words that make it relevant to a question. Values of the grouped
+# column (e.g. city names) are added to the matching section when the overview is built.
+SECTION_KEYWORDS = {
+    "channels": ["channel", "канал", "online", "offline", "онлайн", "офлайн", "marketplace", "маркетплейс"],
+    "categories": ["categor", "категор", "merchant", "мерчант", "товар", "магазин"],
+    "cities": ["city", "cities", "город"],
+    "regions": ["region", "регион", "област"],
+    "payment_methods": ["payment", "оплат", "платеж", "платёж", "card", "карт", "cash", "налич"],
+    "segments": ["segment", "сегмент", "customer", "клиент", "покупател"],
+    "monthly": ["month", "месяц", "trend", "тренд", "динамик", "season", "сезон", "growth", "рост", "период"],
+    "status": ["refund", "возврат", "cancel", "отмен", "suspicious", "подозр", "fraud", "мошен", "статус"],
+}
+
+# (section, column, title, sort by revenue, show revenue share, show average, row limit)
+GROUP_SECTIONS = [
+    ("channels", "channel", "CHANNEL DISTRIBUTION", False, True, True, None),
+    ("categories", "merchant_category", "MERCHANT CATEGORY DISTRIBUTION", False, True, False, None),
+    ("cities", "city", "TOP CITIES BY REVENUE", True, False, False, 15),
+    ("regions", "region", "REGION DISTRIBUTION", True, False, False, None),
+    ("payment_methods", "payment_method", "PAYMENT METHOD DISTRIBUTION", True, True, False, None),
+    ("segments", "customer_segment", "CUSTOMER SEGMENT DISTRIBUTION", True, False, False, None),
+]
+
+class DatasetOverview:
+    """Text overview of the whole dataset for /chat, built once per data version.
+
+    The header (size, dates, revenue statistics) is always sent; the other sections
+    are included when the question mentions them, or all of them when it mentions none.
+    """
+
+    def __init__(self, df: pd.DataFrame, version: Optional[str] = None):
+        self.version = version
+        self.header = ""
+        self.sections: Dict[str, str] = {}
+        self.keywords: Dict[str, List[str]] = {name: list(words) for name, words in SECTION_KEYWORDS.items()}
+        self.source: Dict[str, Any] = {}
+        self._build(df)
+
+    def _build(self, df: pd.DataFrame) -> None:
+        header = ["=== DATASET OVERVIEW ===", f"Total transactions: {len(df)}"]
+
+        dates = pd.Series(dtype='datetime64[ns]')
+        if 'date' in df.columns and not df['date'].isna().all():
+            # DataService already parses dates; this only matters for frames loaded elsewhere
+            dates = pd.to_datetime(df['date'], errors='coerce').dropna()
+            if len(dates) > 0:
+                header.append(f"Date range: {dates.min()} to {dates.max()}")
+                header.append(f"Unique dates: {dates.dt.date.nunique()}")
+                header.append(f"Months covered: {dates.dt.to_period('M').nunique()}")
+
+        total_revenue = 0.0
+        if 'amount_kzt' in df.columns:
+            valid_amounts = df['amount_kzt'].dropna()
+            if len(valid_amounts) > 0:
+                total_revenue = valid_amounts.sum()
+                header.append(f"\n=== REVENUE STATISTICS ===")
+                header.append(f"Total revenue: {total_revenue:,.2f} KZT")
+                header.append(f"Average transaction: {valid_amounts.mean():,.2f} KZT")
+                header.append(f"Median transaction: {valid_amounts.median():,.2f} KZT")
+                header.append(f"Min: {valid_amounts.min():,.2f} KZT, Max: {valid_amounts.max():,.2f} KZT")
+        self.header = "\n".join(header)
+
+        if 'amount_kzt' in df.columns:
+            for name, column, title, by_revenue, with_share, with_average, limit in GROUP_SECTIONS:
+                if column not in df.columns:
+                    continue
+                stats = df.groupby(column)['amount_kzt'].agg(['sum', 'count', 'mean']).round(2)
+                if by_revenue:
+                    stats = stats.sort_values('sum', ascending=False)
+                if limit:
+                    stats = stats.head(limit)
+                lines = [f"=== {title} ==="]
+                for value, row in stats.iterrows():
+                    line = f"{value}: {row['sum']:,.2f} KZT"
+                    if with_share:
+                        share = (row['sum'] / total_revenue * 100) if total_revenue > 0 else 0
+                        line += f" ({share:.1f}%)"
+                    line += f", {int(row['count'])} transactions"
+                    if with_average:
+                        line += f", avg {row['mean']:,.2f} KZT"
+                    lines.append(line)
+                self.sections[name] = "\n".join(lines)
+                self.keywords[name].extend(
+                    str(value).lower().replace("_", " ") for value in df[column].unique() if len(str(value).strip()) >= 3
+                )
+
+            if len(dates) > 0:
+                monthly = df.loc[dates.index, 'amount_kzt'].groupby(dates.dt.to_period('M').astype(str)).agg(['sum', 'count']).round(2)
+                lines = ["=== MONTHLY TRENDS ==="]
+                lines.extend(f"{month}: {row['sum']:,.2f} KZT, {int(row['count'])} transactions" for month, row in monthly.iterrows())
+                self.sections["monthly"] = "\n".join(lines)
+
+        lines = ["=== TRANSACTION STATUS ==="]
+        for column, label in (('is_refunded', 'Refunded'), ('is_canceled', 'Canceled')):
+            if column in df.columns:
+                count = int(df[column].sum())
+                lines.append(f"{label} transactions: {count} ({count / len(df) * 100 if len(df) > 0 else 0:.2f}%)")
+        valid_transactions = len(df[(df.get('is_refunded', 0) == 0) & (df.get('is_canceled', 0) == 0)])
+        lines.append(f"Valid transactions: {valid_transactions} ({valid_transactions / len(df) * 100:.2f}%)")
+        if 'suspicious_flag' in df.columns:
+            count = int(df['suspicious_flag'].sum())
+            lines.append(f"Suspicious transactions: {count} ({count / len(df) * 100 if len(df) > 0 else 0:.2f}%)")
+        self.sections["status"] = "\n".join(lines)
+
+        date_range = f"{dates.min()} to {dates.max()}" if len(dates) > 0 else "N/A"
+        self.source = {
+            "content": f"Dataset summary: {len(df)} transactions from {dates.min() if len(dates) > 0 else 'N/A'} to {dates.max() if len(dates) > 0 else 'N/A'}",
+            "metadata": {"total_transactions": len(df), "date_range": date_range},
+            "relevance_score": 1.0
+        }
+
+    def select_sections(self, question: str) -> List[str]:
+        text = (question or "").lower().replace("_", " ")
+        matched = [name for name in self.sections if any(word in text for word in self.keywords.get(name, []))]
+        return matched or list(self.sections)
+
+    def context_for(self, question: str) -> str:
+        return "\n\n".join([self.header] + [self.sections[name] for name in self.select_sections(question)])
+
+_dataset_overview = None
+_dataset_overview_lock = threading.Lock()
+
+def get_dataset_overview(data_service: Optional[DataService] = None) -> Optional[DatasetOverview]:
+    """The overview for the current data version; rebuilt after an upload reloads the data."""
+    global _dataset_overview
+    data_service = data_service or get_data_service()
+    if data_service.df is None or len(data_service.df) == 0:
+        return None
+    with _dataset_overview_lock:
+        if _dataset_overview is None or _dataset_overview.version != data_service.version:
+            _dataset_overview = DatasetOverview(data_service.df, version=data_service.version)
+        return _dataset_overview
@@ -0,0 +1,113 @@
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Any, Optional, Iterable
+import threading
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.data_service import get_data_service, DataService
+
+UNKNOWN_CODE = -1
+
+CATEGORICAL_COLUMNS = ['channel', 'payment_method', 'customer_segment', 'merchant_category',
+                       'city', 'region', 'device_type', 'acquisition_source']
+NUMERIC_COLUMNS = ['amount_kzt', 'is_refunded', 'is_canceled', 'suspicious_flag', 'delivery_time_hours']
+
+class FeatureStore:
+
+    def __init__(self, df: pd.DataFrame, version: Optional[str] = None):
+        self.version = version
+        self.n_rows = len(df)
+        self.index = df.index
+        self.dtypes: Dict[str, pd.CategoricalDtype] = {}
+        self.vocabulary: Dict[str, Dict[str, int]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.numeric: Dict[str, np.ndarray] = {}
+
+        for col in CATEGORICAL_COLUMNS:
+            if col not in df.columns:
+                continue
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                categorical = df[col]
+            else:
+                categorical = df[col].astype(str).astype('category')
+            dtype = categorical.dtype
+            self.dtypes[col] = dtype
+            self.vocabulary[col] = {str(value): code for code, value in enumerate(dtype.categories)}
+            self.codes[col] = np.ascontiguousarray(categorical.cat.codes.to_numpy(dtype=np.int32))
+
+        for col in NUMERIC_COLUMNS:
+            if col not in df.columns:
+                continue
+            # Missing values stay NaN so training and scoring can drop incomplete rows
+            values = pd.to_numeric(df[col], errors='coerce')
+            self.numeric[col] = np.ascontiguousarray(values.to_numpy(dtype=np.float64))
+
+    def has_column(self, col: str) -> bool:
+        return col in self.codes or col in self.numeric
+
+    def column(self, col: str) -> np.ndarray:
+        if col in self.codes:
+            return self.codes[col]
+        return self.numeric[col]
+
+    def matrix(self, columns: List[str], rows: Optional[np.ndarray] = None) -> np.ndarray:
+        X = np.empty((self.n_rows if rows is None else len(rows), len(columns)), dtype=np.float64)
+        for i, col in enumerate(columns):
+            values = self.column(col)
+            X[:, i] = values if rows is None else values[rows]
+        return X
+
+    def positions(self, index: pd.Index) -> np.ndarray:
+        return self.index.get_indexer(index)
+
+    def encode(self, col: str, value: Any) -> int:
+        return self.vocabulary.get(col, {}).get(str(value), UNKNOWN_CODE)
+
+    def encode_values(self, col: str, values: Iterable[Any]) -> np.ndarray:
+        return pd.Categorical(pd.Series(values).astype(str), dtype=self.dtypes[col]).codes.astype(np.int32)
+
+    def encode_record(self, columns: List[str], record: Dict[str, Any],
+                      defaults: Optional[Dict[str, float]] = None) -> np.ndarray:
+        x = np.empty(len(columns), dtype=np.float64)
+        for i, col in enumerate(columns):
+            value = record.get(col)
+            if (value is None or value == "") and defaults and col in defaults:
+                x[i] = defaults[col]
+            elif col in self.codes:
+                x[i] = self.encode(col, value)
+            else:
+                x[i] = float(value) if value is not None and value != "" else 0.0
+        return x
+
+    def mode(self, col: str) -> float:
+        values = self.column(col)
+        if col in self.codes:
+            known = values[values != UNKNOWN_CODE]
+            return float(np.bincount(known).argmax()) if len(known) > 0 else float(UNKNOWN_CODE)
+        uniques, counts = np.unique(values[~np.isnan(values)], return_counts=True)
+        return float(uniques[counts.argmax()]) if len(uniques) > 0 else 0.0
+
+    def group_mean(self, col: str, target: str) -> Dict[str, float]:
+        codes = self.codes[col]
+        known = (codes != UNKNOWN_CODE) & ~np.isnan(self.numeric[target])
+        n_categories = len(self.dtypes[col].categories)
+        totals = np.bincount(codes[known], weights=self.numeric[target][known], minlength=n_categories)
+        counts = np.bincount(codes[known], minlength=n_categories)
+        return {
+            str(value): float(totals[code] / counts[code])
+            for code, value in enumerate(self.dtypes[col].categories)
+            if counts[code] > 0
+        }
+
+_feature_store = None
+_feature_store_lock = threading.Lock()
+
+def get_feature_store(data_service: Optional[DataService] = None) -> FeatureStore:
+    global _feature_store
+    data_service = data_service or get_data_service()
+    with _feature_store_lock:
+        if _feature_store is None or _feature_store.version != data_service.version:
+            _feature_store = FeatureStore(data_service.df, version=data_service.version)
+        return _feature_store
@@ -0,0 +1,191 @@
+import numpy as np
+from typing import Dict, Any, Optional
+from itertools import product
+
+SEASON_LENGTH = 7
+
+ALPHA_GRID = [0.05, 0.1, 0.2, 0.35, 0.5, 0.7]
+BETA_GRID = [0.0, 0.02, 0.1]
+GAMMA_GRID = [0.05, 0.15, 0.3]
+PHI_GRID = [0.9, 0.98]
+
+_PARAM_GRID = np.array(list(product(ALPHA_GRID, BETA_GRID, GAMMA_GRID, PHI_GRID)), dtype=float)
+
+def _initial_components(y: np.ndarray, m: int, multiplicative: bool):
+    first = y[:m].mean(axis=0)
+    second = y[m:2 * m].mean(axis=0)
+    level = first.copy()
+    trend = (second - first) / m
+    if multiplicative:
+        season = y[:m] / np.where(first > 0, first, 1.0)
+    else:
+        season = y[:m] - first
+    return level, trend, season
+
+def _run_smoothing(y: np.ndarray, alpha, beta, gamma, phi, multiplicative: bool,
+                   m: int, keep_residuals: bool = False):
+    # y is (T, C); parameters are broadcastable to (C,). All columns advance in lockstep,
+    # so the whole parameter grid for every series is fitted in a single pass over time.
+    T, C = y.shape
+    level, trend, season = _initial_components(y, m, multiplicative)
+    season = np.array(season, dtype=float, copy=True)
+    sse = np.zeros(C)
+    residuals = np.empty((T, C)) if keep_residuals else None
+
+    for t in range(T):
+        idx = t % m
+        s_prev = season[idx]
+        damped_trend = phi * trend
+        base = level + damped_trend
+        y_t = y[t]
+
+        if multiplicative:
+            fitted = base * s_prev
+            error = y_t - fitted
+            new_level = alpha * (y_t / np.where(s_prev != 0, s_prev, 1.0)) + (1 - alpha) * base
+            new_level = np.maximum(new_level, 1e-9)
+            season[idx] = gamma * (y_t / new_level) + (1 - gamma) * s_prev
+        else:
+            fitted = base + s_prev
+            error = y_t - fitted
+            new_level = alpha * (y_t - s_prev) + (1 - alpha) * base
+            season[idx] = gamma * (y_t - new_level) + (1 - gamma) * s_prev
+
+        trend = beta * (new_level - level) + (1 - beta) * damped_trend
+        level = new_level
+
+        if t >= m:
+            sse += error * error
+        if keep_residuals:
+            if multiplicative:
+                residuals[t] = error / np.where(np.abs(fitted) > 1e-9, fitted, 1.0)
+            else:
+                residuals[t] = error
+
+    return level, trend, season, sse, residuals
+
+def fit_seasonal_smoothing(y: np.ndarray, season_length: int = SEASON_LENGTH,
+                           seasonal: str = "auto", interval_level: float = 0.8) -> Optional[Dict[str, Any]]:
+    y = np.asarray(y, dtype=float)
+    if y.ndim == 1:
+        y = y[:, None]
+
+    T, S = y.shape
+    m = season_length
+    if T < 2 * m + 1:
+        return None
+
+    n_params = len(_PARAM_GRID)
+    alpha = np.repeat(_PARAM_GRID[:, 0], S)
+    beta = np.repeat(_PARAM_GRID[:, 1], S)
+    gamma = np.repeat(_PARAM_GRID[:, 2], S)
+    phi = np.repeat(_PARAM_GRID[:, 3], S)
+    y_grid = np.tile(y, (1, n_params))
+
+    modes = []
+    if seasonal in ("auto", "additive"):
+        modes.append(False)
+    if seasonal in ("auto", "multiplicative"):
+        modes.append(True)
+
+    best_sse = np.full(S, np.inf)
+    best_param = np.zeros(S, dtype=int)
+    best_mode = np.zeros(S, dtype=bool)
+
+    for multiplicative in modes:
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            _, _, _, sse, _ = _run_smoothing(y_grid, alpha, beta, gamma, phi, multiplicative, m)
+        sse = sse.reshape(n_params, S)
+        if multiplicative:
+            sse[:, ~(y > 0).all(axis=0)] = np.inf
+        sse[~np.isfinite(sse)] = np.inf
+
+        param_idx = sse.argmin(axis=0)
+        mode_sse = sse[param_idx, np.arange(S)]
+        better = mode_sse < best_sse
+        best_sse = np.where(better, mode_sse, best_sse)
+        best_param = np.where(better, param_idx, best_param)
+        best_mode = np.where(better, multiplicative, best_mode)
+
+    params = _PARAM_GRID[best_param]
+    level = np.zeros(S)
+    trend = np.zeros(S)
+    season = np.zeros((m, S))
+    residuals = np.zeros((T, S))
+
+    for multiplicative in (False, True):
+        cols = np.flatnonzero(best_mode == multiplicative)
+        if len(cols) == 0:
+            continue
+        p = params[cols]
+        l, b, s, _, r = _run_smoothing(y[:, cols], p[:, 0], p[:, 1], p[:, 2], p[:, 3],
+                                       multiplicative, m, keep_residuals=True)
+        level[cols] = l
+        trend[cols] = b
+        season[:, cols] = s
+        residuals[:, cols] = r
+
+    tail = (1 - interval_level) / 2
+    in_sample = residuals[m:]
+
+    return {
+        "level": level,
+        "trend": trend,
+        "season": season,
+        "alpha": params[:, 0],
+        "beta": params[:, 1],
+        "gamma": params[:, 2],
+        "phi": params[:, 3],
+        "multiplicative": best_mode,
+        "residual_lower": np.quantile(in_sample, tail, axis=0),
+        "residual_upper": np.quantile(in_sample, 1 - tail, axis=0),
+        "season_length": m,
+        "n_obs": T,
+        "interval_level": interval_level,
+    }
+
+def forecast_seasonal_smoothing(state: Dict[str, Any], horizon: int) -> Dict[str, np.ndarray]:
+    m = state["season_length"]
+    T = state["n_obs"]
+    phi = state["phi"]
+    alpha = state["alpha"]
+    beta = state["beta"]
+    gamma = state["gamma"]
+    multiplicative = state["multiplicative"]
+
+    h = np.arange(1, horizon + 1)[:, None]
+    damped_sum = phi * (1 - phi[None, :] ** h) / (1 - phi)
+    base = state["level"][None, :] + damped_sum * state["trend"][None, :]
+
+    season_idx = (T - 1 + h[:, 0]) % m
+    seasonal = state["season"][season_idx]
+
+    point = np.where(multiplicative[None, :], base * seasonal, base + seasonal)
+    point = np.maximum(point, 0.0)
+
+    # Horizon-dependent widening of the empirical one-step residual quantiles
+    # (variance multiplier of the damped additive Holt-Winters state space form).
+    j = h[:-1]
+    c = alpha * (1 + beta * phi * (1 - phi[None, :] ** j) / (1 - phi))
+    c = c + gamma * ((j % m) == 0)
+    variance = np.vstack([np.ones((1, len(phi))), 1 + np.cumsum(c * c, axis=0)])
+    spread = np.sqrt(variance)
+
+    lower_res = state["residual_lower"][None, :] * spread
+    upper_res = state["residual_upper"][None, :] * spread
+    lower = np.where(multiplicative[None, :], point * (1 + lower_res), point + lower_res)
+    upper = np.where(multiplicative[None, :], point * (1 + upper_res), point + upper_res)
+
+    return {
+        "point": point,
+        "lower": np.maximum(lower, 0.0),
+        "upper": np.maximum(upper, point),
+    }
+
+def reconcile_to_parent(parent: np.ndarray, children: np.ndarray) -> np.ndarray:
+    # Top-down reconciliation by forecast proportions: children keep their relative
+    # shares at every horizon step but are rescaled so they sum exactly to the parent.
+    child_sum = children.sum(axis=1, keepdims=True)
+    equal_share = np.full_like(children, 1.0 / max(children.shape[1], 1))
+    shares = np.where(child_sum > 0, children / np.where(child_sum > 0, child_sum, 1.0), equal_share)
+    return shares * parent[:, None]
@@ -0,0 +1,25 @@
+import threading
+import time
+from typing import Dict, Any
+
+# Components the API cannot serve requests without; the vectorstore is optional (CSV fallback)
+REQUIRED_COMPONENTS = ("data", "models")
+
+_component_states: Dict[str, Dict[str, Any]] = {}
+_states_lock = threading.Lock()
+
+def set_component_state(name: str, status: str, **details: Any) -> None:
+    """Record the current state of a component for the health/readiness probes."""
+    with _states_lock:
+        _component_states[name] = {"status": status, "updated_at": time.time(), **details}
+
+def get_component_states() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of all recorded component states. Never initializes anything."""
+    with _states_lock:
+        return {name: dict(state) for name, state in _component_states.items()}
+
+def is_ready(states: Dict[str, Dict[str, Any]]) -> bool:
+    # Optional components are not waited for, except while they are being built
+    if any(state.get("status") == "building" for state in states.values()):
+        return False
+    return all(states.get(name, {}).get("status") == "ready" for name in REQUIRED_COMPONENTS)
@@ -0,0 +1,146 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Dict, Optional, Tuple
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.config import settings
+from services.concurrency import run_blocking
+
+# How often a worker that does not run an insight re-reads it while waiting
+INSIGHT_POLL_SECONDS = 0.5
+
+INSIGHT_COLUMNS = ("insight_id", "kind", "status", "text", "sections", "error", "created_at", "completed_at")
+
+class InsightStore:
+    """AI insights generated in the background for `insights=deferred` requests.
+
+    The worker that accepted the request generates the text; entries are kept in a
+    SQLite file (WAL) shared by all uvicorn/gunicorn workers, so the follow-up
+    `/insights/{id}` request can land on any of them. Entries expire
+    INSIGHT_TTL_SECONDS after completion (or creation, if their worker died) and the
+    oldest are dropped beyond INSIGHT_MAX_ENTRIES.
+    """
+
+    def __init__(self, db_path: str = "", ttl_seconds: int = 900, max_entries: int = 1000):
+        self.db_path = db_path or ":memory:"
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        directory = os.path.dirname(db_path) if db_path else ""
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS insights "
+            "(insight_id TEXT PRIMARY KEY, kind TEXT, status TEXT, text TEXT, sections TEXT, error TEXT, "
+            "created_at REAL, completed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS insights_created_at ON insights (created_at)")
+        self._conn.commit()
+        # Strong references: the event loop only keeps weak ones to running tasks
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, kind: str, awaitable: Awaitable[Dict[str, Any]]) -> str:
+        insight_id = uuid.uuid4().hex
+        with self._lock:
+            self._evict()
+            self._conn.execute(
+                "INSERT INTO insights (insight_id, kind, status, created_at) VALUES (?, ?, 'pending', ?)",
+                (insight_id, kind, time.time())
+            )
+            self._conn.commit()
+        self._tasks[insight_id] = asyncio.ensure_future(self._run(insight_id, kind, awaitable))
+        return insight_id
+
+    async def _run(self, insight_id: str, kind: str, awaitable: Awaitable[Dict[str, Any]]) -> None:
+        text, sections, error, status = None, None, None, "error"
+        try:
+            result = await awaitable
+            text = result.get("answer", "") if isinstance(result, dict) else str(result)
+            sections = result.get("sections") if isinstance(result, dict) else None
+            status = "ready"
+        except Exception as e:
+            print(f"Warning: Deferred {kind} insight failed: {str(e)[:200]}")
+            error = str(e)[:300]
+        finally:
+            try:
+                await run_blocking(self._complete, insight_id, status, text, sections, error)
+            finally:
+                self._tasks.pop(insight_id, None)
+
+    def _complete(self, insight_id: str, status: str, text: Optional[str],
+                  sections: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "UPDATE insights SET status = ?, text = ?, sections = ?, error = ?, completed_at = ? "
+                    "WHERE insight_id = ?",
+                    (status, text, json.dumps(sections, ensure_ascii=False) if sections is not None else None,
+                     error, time.time(), insight_id)
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Could not store deferred insight {insight_id}: {e}")
+
+    def get(self, insight_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(INSIGHT_COLUMNS)} FROM insights WHERE insight_id = ?", (insight_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        entry = dict(zip(INSIGHT_COLUMNS, row))
+        entry["sections"] = json.loads(entry["sections"]) if entry["sections"] else None
+        return entry
+
+    async def wait(self, insight_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to `timeout` seconds for a pending insight, then return its current state."""
+        task = self._tasks.get(insight_id)
+        if task is not None and timeout > 0:
+            # asyncio.wait never cancels the task, so a client going away leaves generation running
+            await asyncio.wait({task}, timeout=timeout)
+            return await run_blocking(self.get, insight_id)
+        # Generated by another worker: poll the shared store
+        deadline = time.monotonic() + timeout
+        while True:
+            entry = await run_blocking(self.get, insight_id)
+            remaining = deadline - time.monotonic()
+            if entry is None or entry["status"] != "pending" or remaining <= 0:
+                return entry
+            await asyncio.sleep(min(INSIGHT_POLL_SECONDS, remaining))
+
+    def _evict(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute("DELETE FROM insights WHERE COALESCE(completed_at, created_at) < ?", (cutoff,))
+        dropped = [row[0] for row in self._conn.execute(
+            "SELECT insight_id FROM insights ORDER BY created_at DESC LIMIT -1 OFFSET ?", (self.max_entries - 1,)
+        )]
+        if dropped:
+            self._conn.executemany("DELETE FROM insights WHERE insight_id = ?", [(insight_id,) for insight_id in dropped])
+        for insight_id in dropped:
+            task = self._tasks.pop(insight_id, None)
+            if task is not None:
+                task.cancel()
+
+_insight_store = None
+
+def get_insight_store() -> InsightStore:
+    global _insight_store
+    if _insight_store is None:
+        _insight_store = InsightStore(settings.INSIGHT_STORE_PATH, settings.INSIGHT_TTL_SECONDS,
+                                      settings.INSIGHT_MAX_ENTRIES)
+    return _insight_store
+
+async def resolve_insight(kind: str, awaitable: Awaitable[Dict[str, Any]], deferred: bool) -> Tuple[str, Optional[str]]:
+    """(answer, None) when generated inline, ("", insight_id) when handed to the background store."""
+    if deferred:
+        return "", get_insight_store().submit(kind, awaitable)
+    result = await awaitable
+    return result["answer"], None
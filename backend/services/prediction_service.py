@@ -3,26 +3,51 @@ import numpy as np
 from typing import Dict, List, Any, Optional
 from datetime import datetime, timedelta
 from sklearn.ensemble import RandomForestClassifier, IsolationForest
-from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import train_test_split
 import warnings
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 warnings.filterwarnings('ignore')
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from services.data_service import get_data_service
+from services.feature_store import get_feature_store
+from services.forecasting import fit_seasonal_smoothing, forecast_seasonal_smoothing, reconcile_to_parent
+from services.tree_inference import FlatForestClassifier, FlatIsolationForest
 from config.config import settings
+from services.health import set_component_state
+from services.single_flight import single_flight
+
+# Low-cardinality columns a hierarchical forecast may be split by; an id column
+# would make one series per row.
+FORECAST_DIMENSIONS = ("city", "region", "channel", "merchant_category", "payment_method",
+                       "customer_segment", "acquisition_source", "device_type")
 
 class PredictionService:
     
     def __init__(self):
         self.data_service = get_data_service()
+        self.feature_store = get_feature_store(self.data_service)
         self.cancellation_model = None
         self.suspicious_model = None
-        self.channel_encoder = None
+        self.cancellation_flat_model = None
+        self.suspicious_flat_model = None
         self.suspicious_feature_columns = []
+        self._forecast_states = OrderedDict()
+        self._forecast_lock = threading.Lock()
+        self._scoring_pool = None
+        self._scoring_pool_lock = threading.Lock()
+        self.suspicious_score_bounds = (0.0, 0.0)
+        set_component_state("models", "training", data_version=self.feature_store.version)
         self._train_models()
+        set_component_state(
+            "models", "ready",
+            data_version=self.feature_store.version,
+            cancellation=self.cancellation_model is not None,
+            suspicious=self.suspicious_model is not None
+        )
     
     def _train_models(self) -> None:
         try:
@@ -32,65 +57,45 @@ class PredictionService:
             print(f"Warning: Could not train all models: {e}")
     
     def _train_cancellation_model(self) -> None:
-        df = self.data_service.get_dataframe()
+        store = self.feature_store
         
         feature_columns = ['amount_kzt', 'channel', 'payment_method', 'customer_segment', 
                           'merchant_category', 'city', 'device_type']
         
-        available_cols = [col for col in feature_columns if col in df.columns]
-        if len(available_cols) < 3:
+        available_cols = [col for col in feature_columns if store.has_column(col)]
+        if len(available_cols) < 3 or not store.has_column('is_canceled'):
             return
         
-        X = df[available_cols].copy()
-        y = df['is_canceled'].astype(int)
-        
-        label_encoders = {}
-        for col in X.select_dtypes(include=['object']).columns:
-            le = LabelEncoder()
-            X[col] = le.fit_transform(X[col].astype(str))
-            label_encoders[col] = le
+        X = store.matrix(available_cols)
+        y = store.column('is_canceled')
         
-        mask = ~X.isna().any(axis=1)
+        mask = ~np.isnan(X).any(axis=1) & ~np.isnan(y)
         X = X[mask]
-        y = y[mask]
+        y = y[mask].astype(int)
         
         if len(X) < 100:
             return
         
         self.cancellation_model = RandomForestClassifier(n_estimators=100, random_state=42, max_depth=10)
         self.cancellation_model.fit(X, y)
-        self.cancellation_label_encoders = label_encoders
         self.cancellation_feature_columns = available_cols
+        self.cancellation_flat_model = FlatForestClassifier.from_sklearn(self.cancellation_model)
+        self.cancellation_defaults = {col: store.mode(col) for col in available_cols}
+        self.cancellation_stats = {
+            "overall_rate": float(np.nanmean(store.column('is_canceled'))),
+            "channel_rates": store.group_mean('channel', 'is_canceled') if store.has_column('channel') else {},
+            "payment_method_rates": store.group_mean('payment_method', 'is_canceled') if store.has_column('payment_method') else {},
+            "amount_q90": float(np.nanquantile(store.column('amount_kzt'), 0.9)),
+        }
     
     def _train_suspicious_model(self) -> None:
-        df = self.data_service.get_dataframe()
-        
-        feature_columns = ['amount_kzt', 'is_refunded', 'is_canceled']
-        
-        if 'channel' in df.columns:
-            try:
-                le_channel = LabelEncoder()
-                df_copy = df.copy()
-                df_copy['channel_encoded'] = le_channel.fit_transform(df_copy['channel'].astype(str))
-                feature_columns.append('channel_encoded')
-                self.channel_encoder = le_channel
-            except Exception as e:
-                print(f"Warning: Could not encode channel: {e}")
-                self.channel_encoder = None
+        store = self.feature_store
         
-        available_cols = [col for col in feature_columns if col in df.columns or (col == 'channel_encoded' and 'channel' in df.columns)]
+        feature_columns = ['amount_kzt', 'is_refunded', 'is_canceled', 'channel']
+        available_cols = [col for col in feature_columns if store.has_column(col)]
         
-        X = df.copy()
-        if 'channel_encoded' in available_cols and 'channel_encoded' not in X.columns and 'channel' in X.columns:
-            if hasattr(self, 'channel_encoder') and self.channel_encoder is not None:
-                X['channel_encoded'] = self.channel_encoder.transform(X['channel'].astype(str))
-            else:
-                le_channel = LabelEncoder()
-                X['channel_encoded'] = le_channel.fit_transform(X['channel'].astype(str))
-                self.channel_encoder = le_channel
-        
-        X = X[available_cols].copy()
-        mask = ~X.isna().any(axis=1)
+        X = store.matrix(available_cols)
+        mask = ~np.isnan(X).any(axis=1)
         X = X[mask]
         
         if len(X) < 100:
@@ -101,87 +106,232 @@ class PredictionService:
             self.suspicious_model = IsolationForest(contamination=0.1, random_state=42)
             self.suspicious_model.fit(X)
             self.suspicious_feature_columns = available_cols
+            self.suspicious_flat_model = FlatIsolationForest.from_sklearn(self.suspicious_model)
+            training_scores = self._score_suspicious(X)
+            self.suspicious_score_bounds = (float(training_scores.min()), float(training_scores.max()))
         except Exception as e:
             print(f"Warning: Could not train suspicious model: {e}")
             self.suspicious_model = None
+            self.suspicious_flat_model = None
             self.suspicious_feature_columns = []
     
-    def predict_transaction_volume(self, days_ahead: int = 30, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def _forecast_cache_key(self, filters: Optional[Dict[str, Any]], kind: str = "volume") -> tuple:
+        normalized = tuple(sorted(
+            (str(k), str(v).strip()) for k, v in (filters or {}).items()
+            if v is not None and str(v).strip() != ""
+        ))
+        return (kind, self.data_service.version, normalized)
+    
+    def _get_cached_forecast(self, key: tuple) -> Optional[Dict[str, Any]]:
+        with self._forecast_lock:
+            entry = self._forecast_states.get(key)
+            if entry is not None:
+                self._forecast_states.move_to_end(key)
+            return entry
+    
+    def _store_forecast(self, key: tuple, entry: Dict[str, Any]) -> None:
+        with self._forecast_lock:
+            self._forecast_states[key] = entry
+            while len(self._forecast_states) > settings.FORECAST_CACHE_SIZE:
+                self._forecast_states.popitem(last=False)
+    
+    def _get_volume_forecast_state(self, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        key = self._forecast_cache_key(filters)
+        entry = self._get_cached_forecast(key)
+        if entry is not None:
+            return entry
+        
         df = self.data_service.get_dataframe(filters)
         valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)]
         
-        if 'date' not in valid_transactions.columns or valid_transactions['date'].isna().all():
-            avg_daily = len(valid_transactions) / 365 if len(valid_transactions) > 0 else 0
+        entry = {
+            "state": None,
+            "last_date": datetime.now().date(),
+            "avg_volume": len(valid_transactions) / 365 if len(valid_transactions) > 0 else 0.0,
+            "avg_revenue": float(valid_transactions['amount_kzt'].sum() / 365) if len(valid_transactions) > 0 else 0.0,
+        }
+        
+        if 'date' in valid_transactions.columns and not valid_transactions['date'].isna().all():
+            dated = valid_transactions.dropna(subset=['date'])
+            daily_stats = dated.groupby(dated['date'].dt.normalize())['amount_kzt'].agg(['size', 'sum'])
+            daily_stats = daily_stats.reindex(
+                pd.date_range(daily_stats.index.min(), daily_stats.index.max(), freq='D'),
+                fill_value=0
+            )
+            series = daily_stats[['size', 'sum']].to_numpy(dtype=float)
+            
+            entry["last_date"] = daily_stats.index.max().date()
+            entry["avg_volume"] = float(series[:, 0].mean())
+            entry["avg_revenue"] = float(series[:, 1].mean())
+            entry["state"] = fit_seasonal_smoothing(
+                series,
+                seasonal=settings.FORECAST_SEASONALITY,
+                interval_level=settings.FORECAST_INTERVAL_LEVEL
+            )
+        
+        self._store_forecast(key, entry)
+        return entry
+    
+    @single_flight
+    def predict_transaction_volume(self, days_ahead: int = 30, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        entry = self._get_volume_forecast_state(filters)
+        last_date = entry["last_date"]
+        
+        if entry["state"] is None:
             predictions = []
             for i in range(days_ahead):
                 predictions.append({
-                    "date": (datetime.now() + timedelta(days=i)).strftime("%Y-%m-%d"),
-                    "predicted_volume": int(avg_daily),
-                    "predicted_revenue": float(avg_daily * valid_transactions['amount_kzt'].mean() if len(valid_transactions) > 0 else 0)
+                    "date": (last_date + timedelta(days=i + 1)).strftime("%Y-%m-%d"),
+                    "predicted_volume": int(round(entry["avg_volume"])),
+                    "predicted_revenue": float(entry["avg_revenue"])
                 })
             
             return {
                 "predicted_volume": predictions,
-                "predicted_total_revenue": sum(p['predicted_revenue'] for p in predictions),
+                "predicted_total_revenue": float(sum(p['predicted_revenue'] for p in predictions)),
                 "confidence_interval": {"lower": 0.8, "upper": 1.2}
             }
         
-        daily_stats = valid_transactions.groupby(valid_transactions['date'].dt.date).agg({
-            'transaction_id': 'count',
-            'amount_kzt': 'sum'
-        }).reset_index()
-        daily_stats.columns = ['date', 'volume', 'revenue']
-        
-        if len(daily_stats) < 7:
-            avg_volume = daily_stats['volume'].mean() if len(daily_stats) > 0 else 0
-            avg_revenue = daily_stats['revenue'].mean() if len(daily_stats) > 0 else 0
-        else:
-            window = min(7, len(daily_stats))
-            avg_volume = daily_stats['volume'].tail(window).mean()
-            avg_revenue = daily_stats['revenue'].tail(window).mean()
-            
-            if len(daily_stats) >= 14:
-                recent_avg = daily_stats['volume'].tail(7).mean()
-                older_avg = daily_stats['volume'].tail(14).head(7).mean()
-                trend_factor = recent_avg / older_avg if older_avg > 0 else 1.0
-            else:
-                trend_factor = 1.0
-            
-            avg_volume = avg_volume * trend_factor
-            avg_revenue = avg_revenue * trend_factor
-        
-        predictions = []
-        if len(daily_stats) > 0 and 'date' in daily_stats.columns:
-            try:
-                last_date = pd.to_datetime(daily_stats['date'].max()).date() if pd.notna(daily_stats['date'].max()) else datetime.now().date()
-            except:
-                last_date = datetime.now().date()
-        else:
-            last_date = datetime.now().date()
+        forecast = forecast_seasonal_smoothing(entry["state"], days_ahead)
+        point, lower, upper = forecast["point"], forecast["lower"], forecast["upper"]
+        dates = pd.date_range(last_date + timedelta(days=1), periods=days_ahead, freq='D').strftime("%Y-%m-%d")
+        
+        volume = np.rint(point[:, 0]).astype(int)
+        predictions = [
+            {
+                "date": date,
+                "predicted_volume": int(volume[i]),
+                "predicted_revenue": float(point[i, 1]),
+                "volume_lower": int(np.floor(lower[i, 0])),
+                "volume_upper": int(np.ceil(upper[i, 0])),
+                "revenue_lower": float(lower[i, 1]),
+                "revenue_upper": float(upper[i, 1])
+            }
+            for i, date in enumerate(dates)
+        ]
         
-        std_volume = float(daily_stats['volume'].std()) if len(daily_stats) > 0 and pd.notna(daily_stats['volume'].std()) else float(avg_volume * 0.2) if avg_volume > 0 else 0.0
+        total_revenue = float(point[:, 1].sum())
         
+        return {
+            "predicted_volume": predictions,
+            "predicted_total_revenue": total_revenue,
+            "confidence_interval": {
+                "lower": float(lower[:, 1].sum() / total_revenue) if total_revenue > 0 else 0.0,
+                "upper": float(upper[:, 1].sum() / total_revenue) if total_revenue > 0 else 0.0,
+                "level": float(entry["state"]["interval_level"])
+            }
+        }
+    
+    def _get_hierarchy_forecast_state(self, dimensions: List[str], filters: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        key = self._forecast_cache_key(filters, kind="hierarchy:" + ",".join(dimensions))
+        entry = self._get_cached_forecast(key)
+        if entry is not None:
+            return entry
         
-        for i in range(days_ahead):
-            pred_date = last_date + timedelta(days=i+1)
-            variation = (i % 7 - 3) * std_volume * 0.1 if std_volume > 0 else 0
-            pred_volume = max(0, int(avg_volume + variation))
-            pred_revenue = float(pred_volume * (avg_revenue / avg_volume if avg_volume > 0 else 0))
-            
-            predictions.append({
-                "date": pred_date.strftime("%Y-%m-%d"),
-                "predicted_volume": pred_volume,
-                "predicted_revenue": pred_revenue
+        df = self.data_service.get_dataframe(filters)
+        valid_transactions = df[(df['is_refunded'] == 0) & (df['is_canceled'] == 0)]
+        if 'date' not in valid_transactions.columns or valid_transactions['date'].isna().all():
+            return None
+        
+        valid_transactions = valid_transactions.dropna(subset=['date'])
+        day = valid_transactions['date'].dt.normalize()
+        calendar = pd.date_range(day.min(), day.max(), freq='D')
+        
+        series_keys = [("total", "all")]
+        volume_blocks = [day.value_counts().reindex(calendar, fill_value=0).to_numpy()[:, None]]
+        revenue_blocks = [valid_transactions.groupby(day)['amount_kzt'].sum().reindex(calendar, fill_value=0).to_numpy()[:, None]]
+        
+        groups = {}
+        for dimension in dimensions:
+            if dimension not in valid_transactions.columns:
+                continue
+            pivot = valid_transactions.assign(_day=day).pivot_table(
+                index='_day', columns=dimension, values='amount_kzt',
+                aggfunc=['size', 'sum'], fill_value=0
+            ).reindex(calendar, fill_value=0)
+            members = list(pivot['size'].columns)
+            groups[dimension] = (len(series_keys), len(series_keys) + len(members))
+            series_keys.extend((dimension, str(member)) for member in members)
+            volume_blocks.append(pivot['size'][members].to_numpy())
+            revenue_blocks.append(pivot['sum'][members].to_numpy())
+        
+        volume = np.hstack(volume_blocks).astype(float)
+        revenue = np.hstack(revenue_blocks).astype(float)
+        n_series = volume.shape[1]
+        
+        state = fit_seasonal_smoothing(
+            np.hstack([volume, revenue]),
+            seasonal=settings.FORECAST_SEASONALITY,
+            interval_level=settings.FORECAST_INTERVAL_LEVEL
+        )
+        
+        entry = {
+            "state": state,
+            "series_keys": series_keys,
+            "groups": groups,
+            "n_series": n_series,
+            "last_date": calendar[-1].date(),
+            "avg_volume": volume.mean(axis=0),
+            "avg_revenue": revenue.mean(axis=0),
+        }
+        self._store_forecast(key, entry)
+        return entry
+    
+    @single_flight
+    def predict_hierarchical_volume(self, days_ahead: int = 30, filters: Optional[Dict[str, Any]] = None,
+                                    dimensions: Optional[List[str]] = None) -> Dict[str, Any]:
+        dimensions = list(dict.fromkeys(dimensions or ['city', 'channel', 'merchant_category']))
+        unknown = [dimension for dimension in dimensions if dimension not in FORECAST_DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown forecast dimensions: {', '.join(unknown)}")
+        entry = self._get_hierarchy_forecast_state(dimensions, filters)
+        if entry is None:
+            return {"dates": [], "series": [], "reconciled": False}
+        
+        n = entry["n_series"]
+        if entry["state"] is None:
+            flat = np.concatenate([entry["avg_volume"], entry["avg_revenue"]])[None, :]
+            point = np.repeat(flat, days_ahead, axis=0)
+            lower, upper = point * 0.8, point * 1.2
+        else:
+            forecast = forecast_seasonal_smoothing(entry["state"], days_ahead)
+            point, lower, upper = forecast["point"], forecast["lower"], forecast["upper"]
+        
+        # Reconcile volume and revenue blocks separately; interval bounds follow the same shares.
+        for offset in (0, n):
+            for start, end in entry["groups"].values():
+                cols = slice(offset + start, offset + end)
+                children = point[:, cols]
+                reconciled = reconcile_to_parent(point[:, offset], children)
+                scale = np.divide(reconciled, children, out=np.ones_like(children), where=children > 0)
+                point[:, cols] = reconciled
+                lower[:, cols] = lower[:, cols] * scale
+                upper[:, cols] = upper[:, cols] * scale
+        
+        dates = pd.date_range(entry["last_date"] + timedelta(days=1), periods=days_ahead, freq='D').strftime("%Y-%m-%d").tolist()
+        
+        series = []
+        for i, (dimension, value) in enumerate(entry["series_keys"]):
+            series.append({
+                "dimension": dimension,
+                "value": value,
+                "predicted_volume": np.round(point[:, i], 2).tolist(),
+                "volume_lower": np.round(lower[:, i], 2).tolist(),
+                "volume_upper": np.round(upper[:, i], 2).tolist(),
+                "predicted_revenue": np.round(point[:, n + i], 2).tolist(),
+                "revenue_lower": np.round(lower[:, n + i], 2).tolist(),
+                "revenue_upper": np.round(upper[:, n + i], 2).tolist(),
+                "total_volume": float(point[:, i].sum()),
+                "total_revenue": float(point[:, n + i].sum())
             })
         
-        total_revenue = sum(p['predicted_revenue'] for p in predictions)
-        
         return {
-            "predicted_volume": predictions,
-            "predicted_total_revenue": float(total_revenue),
-            "confidence_interval": {"lower": 0.85, "upper": 1.15}
+            "dates": dates,
+            "series": series,
+            "reconciled": True
         }
     
+    @single_flight
     def predict_cancellation_probability(self, amount_kzt: float, channel: str, 
                                        payment_method: str, customer_segment: str,
                                        city: Optional[str] = None, 
@@ -202,37 +352,23 @@ class PredictionService:
             probability = float(cancellation_rate)
         else:
             try:
-                features = {}
-                for col in self.cancellation_feature_columns:
-                    if col == 'amount_kzt':
-                        features[col] = amount_kzt
-                    elif col == 'channel':
-                        features[col] = channel
-                    elif col == 'payment_method':
-                        features[col] = payment_method
-                    elif col == 'customer_segment':
-                        features[col] = customer_segment
-                    elif col == 'city' and city:
-                        features[col] = city
-                    elif col == 'merchant_category' and merchant_category:
-                        features[col] = merchant_category
-                    else:
-                        df = self.data_service.get_dataframe()
-                        features[col] = df[col].mode()[0] if len(df[col].mode()) > 0 else ""
+                record = {
+                    'amount_kzt': amount_kzt,
+                    'channel': channel,
+                    'payment_method': payment_method,
+                    'customer_segment': customer_segment,
+                    'city': city,
+                    'merchant_category': merchant_category,
+                }
+                x = self.feature_store.encode_record(
+                    self.cancellation_feature_columns, record, self.cancellation_defaults
+                )
                 
-                X = pd.DataFrame([features])
-                for col in X.select_dtypes(include=['object']).columns:
-                    if col in self.cancellation_label_encoders:
-                        try:
-                            X[col] = self.cancellation_label_encoders[col].transform(X[col].astype(str))
-                        except:
-                            X[col] = 0
-                
-                prob = self.cancellation_model.predict_proba(X[self.cancellation_feature_columns])[0]
+                prob = self.cancellation_flat_model.predict_proba(x)[0]
                 probability = float(prob[1] if len(prob) > 1 else prob[0])
             except Exception as e:
-                df = self.data_service.get_dataframe()
-                probability = float(df['is_canceled'].mean())
+                print(f"Warning: Cancellation model scoring failed, using the overall rate: {e}")
+                probability = float(self.cancellation_stats["overall_rate"])
         
         if probability < 0.1:
             risk_level = "low"
@@ -241,19 +377,28 @@ class PredictionService:
         else:
             risk_level = "high"
         
-        df = self.data_service.get_dataframe()
+        if self.cancellation_model is not None:
+            stats = self.cancellation_stats
+        else:
+            df = self.data_service.get_dataframe()
+            stats = {
+                "overall_rate": float(df['is_canceled'].mean()),
+                "channel_rates": df.groupby('channel')['is_canceled'].mean().to_dict(),
+                "payment_method_rates": df.groupby('payment_method')['is_canceled'].mean().to_dict(),
+                "amount_q90": float(df['amount_kzt'].quantile(0.9)),
+            }
         factors = []
         
-        channel_cancel = df[df['channel'] == channel]['is_canceled'].mean() if channel in df['channel'].values else 0
-        overall_cancel = df['is_canceled'].mean()
+        channel_cancel = stats["channel_rates"].get(channel, 0)
+        overall_cancel = stats["overall_rate"]
         if channel_cancel > overall_cancel * 1.2:
             factors.append({"factor": "channel", "impact": "high", "details": f"{channel} has higher cancellation rate"})
         
-        pm_cancel = df[df['payment_method'] == payment_method]['is_canceled'].mean() if payment_method in df['payment_method'].values else 0
+        pm_cancel = stats["payment_method_rates"].get(payment_method, 0)
         if pm_cancel > overall_cancel * 1.2:
             factors.append({"factor": "payment_method", "impact": "high", "details": f"{payment_method} has higher cancellation rate"})
         
-        if amount_kzt > df['amount_kzt'].quantile(0.9):
+        if amount_kzt > stats["amount_q90"]:
             factors.append({"factor": "amount", "impact": "medium", "details": "High-value transactions have higher cancellation risk"})
         
         return {
@@ -262,8 +407,42 @@ class PredictionService:
             "factors": factors
         }
     
-    def detect_suspicious_transactions(self, filters: Optional[Dict[str, Any]] = None, limit: int = 100) -> Dict[str, Any]:
-        df = self.data_service.get_dataframe(filters)
+    def _suspicious_decision_function(self, X: np.ndarray) -> np.ndarray:
+        # The flattened trees win on single rows and small batches; sklearn's compiled
+        # traversal is faster once the fixed per-call overhead is amortized.
+        if len(X) <= settings.FLAT_INFERENCE_MAX_ROWS:
+            return self.suspicious_flat_model.decision_function(X)
+        return self.suspicious_model.decision_function(X)
+    
+    def _score_suspicious(self, X: np.ndarray) -> np.ndarray:
+        chunk_size = max(1, settings.SCORING_CHUNK_SIZE)
+        if len(X) <= chunk_size:
+            return self._suspicious_decision_function(X)
+        
+        # Tree traversal in sklearn releases the GIL, so a thread pool scales with cores
+        # without pickling the forest to worker processes.
+        chunks = [X[start:start + chunk_size] for start in range(0, len(X), chunk_size)]
+        return np.concatenate(list(self._get_scoring_pool().map(self._suspicious_decision_function, chunks)))
+    
+    def _get_scoring_pool(self) -> ThreadPoolExecutor:
+        with self._scoring_pool_lock:
+            if self._scoring_pool is None:
+                self._scoring_pool = ThreadPoolExecutor(
+                    max_workers=settings.SCORING_WORKERS or os.cpu_count() or 1,
+                    thread_name_prefix="suspicious-scoring"
+                )
+            return self._scoring_pool
+    
+    def _normalize_suspicious_scores(self, scores: np.ndarray) -> np.ndarray:
+        min_score, max_score = self.suspicious_score_bounds
+        if max_score <= min_score:
+            return np.full(len(scores), 0.5)
+        return np.clip(1 - (scores - min_score) / (max_score - min_score), 0.0, 1.0)
+    
+    @single_flight
+    def detect_suspicious_transactions(self, filters: Optional[Dict[str, Any]] = None, limit: int = 100,
+                                       df: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        df = self.data_service.get_dataframe(filters) if df is None else df
         
         if df is None or len(df) == 0:
             return {
@@ -281,61 +460,35 @@ class PredictionService:
         std_amount = df['amount_kzt'].std() if 'amount_kzt' in df.columns else 0
         median_amount = df['amount_kzt'].median() if 'amount_kzt' in df.columns else 0
         
-        if self.suspicious_model is not None and len(self.suspicious_feature_columns) > 0:
+        if self.suspicious_flat_model is not None and len(self.suspicious_feature_columns) > 0:
             try:
-                X = df.copy()
+                rows = self.feature_store.positions(df.index)
                 
-                if 'channel_encoded' in self.suspicious_feature_columns and 'channel' in X.columns and 'channel_encoded' not in X.columns:
-                    if hasattr(self, 'channel_encoder') and self.channel_encoder is not None:
-                        try:
-                            X['channel_encoded'] = self.channel_encoder.transform(X['channel'].astype(str))
-                        except (ValueError, AttributeError):
-                            from sklearn.preprocessing import LabelEncoder
-                            le_channel = LabelEncoder()
-                            X['channel_encoded'] = le_channel.fit_transform(X['channel'].astype(str))
-                            self.channel_encoder = le_channel
-                    else:
-                        from sklearn.preprocessing import LabelEncoder
-                        le_channel = LabelEncoder()
-                        X['channel_encoded'] = le_channel.fit_transform(X['channel'].astype(str))
-                        self.channel_encoder = le_channel
-                
-                available_cols = [col for col in self.suspicious_feature_columns if col in X.columns]
-                
-                if len(available_cols) > 0:
-                    X = X[available_cols].copy()
-                    mask = ~X.isna().any(axis=1)
+                if (rows >= 0).all():
+                    X = self.feature_store.matrix(self.suspicious_feature_columns, rows)
+                    mask = ~np.isnan(X).any(axis=1)
                     X_clean = X[mask]
+                    clean_index = df.index[mask]
                     
                     if len(X_clean) > 0:
-                        predictions = self.suspicious_model.predict(X_clean)
+                        scores = self._score_suspicious(X_clean)
+                        predictions = np.where(scores < 0, -1, 1)
+                        normalized_scores = self._normalize_suspicious_scores(scores)
+                        
+                        channel_refund_rates = df.groupby('channel')['is_refunded'].mean() if 'channel' in df.columns and 'is_refunded' in df.columns else pd.Series(dtype=float)
+                        pm_cancel_rates = df.groupby('payment_method')['is_canceled'].mean() if 'payment_method' in df.columns and 'is_canceled' in df.columns else pd.Series(dtype=float)
                         
-                        if hasattr(self.suspicious_model, 'decision_function'):
-                            scores = self.suspicious_model.decision_function(X_clean)
-                            min_score = scores.min()
-                            max_score = scores.max()
-                            if max_score > min_score:
-                                normalized_scores = 1 - (scores - min_score) / (max_score - min_score)
-                            else:
-                                normalized_scores = [0.5] * len(scores)
-                        elif hasattr(self.suspicious_model, 'score_samples'):
-                            scores = self.suspicious_model.score_samples(X_clean)
-                            min_score = scores.min()
-                            max_score = scores.max()
-                            if max_score > min_score:
-                                normalized_scores = 1 - (scores - min_score) / (max_score - min_score)
-                            else:
-                                normalized_scores = [0.5] * len(scores)
-                        else:
-                            normalized_scores = [0.7 if p == -1 else 0.3 for p in predictions]
+                        # One lookup for all flagged rows instead of a df.loc call per row
+                        reason_columns = [c for c in ('amount_kzt', 'is_refunded', 'is_canceled', 'channel', 'payment_method') if c in df.columns]
+                        flagged_rows = df.loc[clean_index[predictions == -1], reason_columns].to_dict('index')
                         
-                        for idx, (orig_idx, pred, score) in enumerate(zip(X_clean.index, predictions, normalized_scores)):
+                        for idx, (orig_idx, pred, score) in enumerate(zip(clean_index, predictions, normalized_scores)):
                             if pred == -1:
                                 suspicious_indices.append(orig_idx)
                                 anomaly_scores[orig_idx] = float(score)
                                 
                                 reasons = []
-                                row = df.loc[orig_idx]
+                                row = flagged_rows[orig_idx]
                                 
                                 if 'amount_kzt' in row and pd.notna(row['amount_kzt']):
                                     amount = float(row['amount_kzt'])
@@ -352,13 +505,13 @@ class PredictionService:
                                 
                                 if 'channel' in row and pd.notna(row.get('channel')):
                                     channel = str(row.get('channel', ''))
-                                    channel_refund_rate = df[df['channel'] == channel]['is_refunded'].mean() if 'is_refunded' in df.columns else 0
+                                    channel_refund_rate = channel_refund_rates.get(channel, 0)
                                     if channel_refund_rate > 0.3:
                                         reasons.append(f"Канал '{channel}' имеет высокий процент возвратов ({channel_refund_rate*100:.1f}%)")
                                 
                                 if 'payment_method' in row and pd.notna(row.get('payment_method')):
                                     pm = str(row.get('payment_method', ''))
-                                    pm_cancel_rate = df[df['payment_method'] == pm]['is_canceled'].mean() if 'is_canceled' in df.columns else 0
+                                    pm_cancel_rate = pm_cancel_rates.get(pm, 0)
                                     if pm_cancel_rate > 0.2:
                                         reasons.append(f"Метод оплаты '{pm}' имеет высокий процент отмен ({pm_cancel_rate*100:.1f}%)")
                                 
@@ -496,10 +649,14 @@ class PredictionService:
         }
 
 _prediction_service = None
+_prediction_service_lock = threading.Lock()
 
 def get_prediction_service() -> PredictionService:
+    """The service for the current data version; models are retrained after an upload reloads the data."""
     global _prediction_service
-    if _prediction_service is None:
-        _prediction_service = PredictionService()
-    return _prediction_service
+    data_service = get_data_service()
+    with _prediction_service_lock:
+        if _prediction_service is None or _prediction_service.data_service.version != data_service.version:
+            _prediction_service = PredictionService()
+        return _prediction_service
 
@@ -0,0 +1,94 @@
+import asyncio
+import copy
+import functools
+import inspect
+import json
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """Coalesces identical concurrent calls: callers with the same key share one execution.
+
+    Only calls that overlap in time are merged; once the leader finishes, the next
+    caller with that key starts a fresh computation. Exceptions reach every waiter.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._tasks: Dict[Tuple[int, Hashable], asyncio.Task] = {}
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Blocking variant for the worker threads. Waiters get a deep copy so they cannot mutate each other's result."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            else:
+                self.shared += 1
+        if not leader:
+            return copy.deepcopy(future.result())
+        try:
+            result = func(*args, **kwargs)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """Async variant: the first caller's coroutine runs as a task that later callers await.
+
+        The task is shielded, so a caller that disconnects does not cancel it for the others.
+        """
+        loop_key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(loop_key)
+            if task is None:
+                task = asyncio.ensure_future(factory())
+                self._tasks[loop_key] = task
+                task.add_done_callback(lambda _: self._forget(loop_key, task))
+            else:
+                self.shared += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, loop_key: Tuple[int, Hashable], task: asyncio.Task) -> None:
+        with self._lock:
+            if self._tasks.get(loop_key) is task:
+                del self._tasks[loop_key]
+
+_service_flights = SingleFlight()
+
+def get_service_flights() -> SingleFlight:
+    return _service_flights
+
+def single_flight(method: Callable[..., T]) -> Callable[..., T]:
+    """Coalesce concurrent calls of a service method with the same arguments.
+
+    The key is the instance, the method and its bound arguments. A `df` argument is
+    left out of the key: callers that pass a pre-filtered frame must also pass the
+    `filters` it was built from, otherwise the call runs uncoalesced.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, *args: Any, **kwargs: Any) -> T:
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        arguments = dict(bound.arguments)
+        arguments.pop("self", None)
+        if arguments.pop("df", None) is not None and arguments.get("filters") is None:
+            return method(self, *args, **kwargs)
+        key = (id(self), method.__qualname__, json.dumps(arguments, sort_keys=True, default=str))
+        return _service_flights.do(key, method, self, *args, **kwargs)
+
+    return wrapper
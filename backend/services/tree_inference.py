@@ -0,0 +1,123 @@
+import numpy as np
+from typing import List, Optional
+
+def _average_path_length(n_samples: np.ndarray) -> np.ndarray:
+    n_samples = np.asarray(n_samples, dtype=float)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    mask = n_samples > 2
+    result[mask] = 2.0 * (np.log(n_samples[mask] - 1.0) + np.euler_gamma) - 2.0 * (n_samples[mask] - 1.0) / n_samples[mask]
+    return result
+
+def _node_depths(children_left: np.ndarray, children_right: np.ndarray) -> np.ndarray:
+    depths = np.zeros(len(children_left), dtype=np.int64)
+    stack = [0]
+    while stack:
+        node = stack.pop()
+        for child in (children_left[node], children_right[node]):
+            if child != -1:
+                depths[child] = depths[node] + 1
+                stack.append(child)
+    return depths
+
+class FlatTreeEnsemble:
+
+    def __init__(self, trees: List, leaf_values: List[np.ndarray], feature_maps: Optional[List[np.ndarray]] = None):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+
+        for i, tree in enumerate(trees):
+            n_nodes = tree.node_count
+            node_ids = np.arange(n_nodes) + offset
+            is_leaf = tree.children_left == -1
+
+            feature = tree.feature.astype(np.int64).copy()
+            if feature_maps is not None:
+                feature[~is_leaf] = np.asarray(feature_maps[i])[feature[~is_leaf]]
+            feature[is_leaf] = 0
+
+            # Leaves point back to themselves, so every row can be advanced a fixed
+            # number of steps without tracking which rows have already terminated.
+            left = np.where(is_leaf, node_ids, tree.children_left + offset)
+            right = np.where(is_leaf, node_ids, tree.children_right + offset)
+
+            features.append(feature)
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append(left)
+            rights.append(right)
+            values.append(leaf_values[i])
+            roots.append(offset)
+            max_depth = max(max_depth, int(tree.max_depth))
+            offset += n_nodes
+
+        self.feature = np.concatenate(features)
+        self.threshold = np.concatenate(thresholds)
+        self.left = np.concatenate(lefts)
+        self.right = np.concatenate(rights)
+        self.value = np.concatenate(values)
+        self.roots = np.asarray(roots, dtype=np.int64)
+        self.max_depth = max_depth
+        self.n_trees = len(trees)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        # sklearn evaluates splits on float32 inputs against float64 thresholds.
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+
+        rows = np.arange(X.shape[0])[:, None]
+        nodes = np.broadcast_to(self.roots, (X.shape[0], self.n_trees))
+        for _ in range(self.max_depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+        return nodes
+
+    def leaf_values(self, X: np.ndarray) -> np.ndarray:
+        return self.value[self.apply(X)]
+
+class FlatForestClassifier(FlatTreeEnsemble):
+
+    @classmethod
+    def from_sklearn(cls, model) -> "FlatForestClassifier":
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        leaf_values = []
+        for tree in trees:
+            value = tree.value[:, 0, :].astype(np.float64)
+            normalizer = value.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            leaf_values.append(value / normalizer)
+
+        flat = cls(trees, leaf_values)
+        flat.classes_ = model.classes_
+        return flat
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return self.leaf_values(X).mean(axis=1)
+
+class FlatIsolationForest(FlatTreeEnsemble):
+
+    @classmethod
+    def from_sklearn(cls, model) -> "FlatIsolationForest":
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        leaf_values = []
+        for tree in trees:
+            depths = _node_depths(tree.children_left, tree.children_right)
+            leaf_values.append(depths + _average_path_length(tree.n_node_samples))
+
+        flat = cls(trees, leaf_values, feature_maps=model.estimators_features_)
+        flat.offset_ = float(model.offset_)
+        flat.denominator = len(trees) * float(_average_path_length(np.array([model._max_samples]))[0])
+        return flat
+
+    def score_samples(self, X: np.ndarray) -> np.ndarray:
+        depths = self.leaf_values(X).sum(axis=1)
+        if self.denominator == 0:
+            return -np.ones(len(depths))
+        return -(2.0 ** (-depths / self.denominator))
+
+    def decision_function(self, X: np.ndarray) -> np.ndarray:
+        return self.score_samples(X) - self.offset_
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return np.where(self.decision_function(X) < 0, -1, 1)
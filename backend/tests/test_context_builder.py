@@ -0,0 +1,65 @@
+from rag.context_builder import ContextBuilder, estimate_tokens
+
+
+def sample_summary(days: int = 10, products: int = 50) -> dict:
+    return {
+        "total_revenue": 1234567.891,
+        "avg_check": 12.5,
+        "top_products": [{"product": f"product {i}", "revenue": 1000.0 * (products - i)} for i in range(products)],
+        "daily": [{"date": f"2024-{1 + i // 28:02d}-{1 + i % 28:02d}", "revenue": 10.0} for i in range(days)],
+    }
+
+
+def test_estimate_tokens_counts_words_digits_and_punctuation():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("revenue") == 2
+    assert estimate_tokens("выручка") == 3
+    assert estimate_tokens("12345, ok!") == 2 + 1 + 1 + 1
+
+
+def test_small_inputs_are_kept_whole():
+    summary, context = ContextBuilder(token_budget=3000).build(sample_summary(products=3), "doc one\n\ndoc two")
+
+    assert "total_revenue: 1,234,568" in summary
+    assert "avg_check: 12.5" in summary
+    assert "product | revenue" in summary
+    assert "omitted" not in summary
+    assert context == "doc one\n\ndoc two"
+
+
+def test_output_stays_within_the_token_budget():
+    documents = "\n\n".join(f"Transaction {i}: client paid {i * 10} tenge in Almaty" for i in range(200))
+    builder = ContextBuilder(token_budget=300)
+    summary, context = builder.build(sample_summary(products=200), documents)
+
+    # The omission notes are the only text allowed past the budget
+    notes = [line for line in (summary + "\n" + context).split("\n") if "omitted" in line]
+    assert estimate_tokens(summary) + estimate_tokens(context) <= 300 + sum(estimate_tokens(n) for n in notes)
+    assert "more rows omitted" in summary
+    assert "more retrieved entries omitted" in context
+
+
+def test_rows_are_kept_in_rank_order_and_documents_whole():
+    documents = "\n\n".join(f"document number {i} " + "word " * 20 for i in range(20))
+    summary, context = ContextBuilder(token_budget=200).build(sample_summary(products=100), documents)
+
+    kept = [line for line in summary.split("\n") if line.startswith("product ") and line[8].isdigit()]
+    assert kept and kept[0].startswith("product 0 ")
+    assert [int(line.split()[1]) for line in kept] == list(range(len(kept)))
+    for block in context.split("\n\n")[:-1]:
+        assert block.startswith("document number ") and block.endswith("word ")
+
+
+def test_long_daily_series_are_aggregated_by_month():
+    summary, _ = ContextBuilder(token_budget=3000, max_table_rows=31).build(sample_summary(days=56), "")
+
+    assert "daily (aggregated by month) (2 rows):" in summary
+    assert "2024-01 | 28 | 280" in summary
+
+
+def test_exhausted_budget_omits_tables_and_metrics():
+    summary, context = ContextBuilder(token_budget=5).build(sample_summary(), "doc")
+
+    assert "more metrics omitted" in summary
+    assert "top_products: 50 rows omitted (token budget)" in summary
+    assert context == "... 1 more retrieved entries omitted (token budget)"
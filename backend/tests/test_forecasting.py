@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from services.forecasting import fit_seasonal_smoothing, forecast_seasonal_smoothing, reconcile_to_parent
+
+
+def weekly_series(weeks: int = 12, level: float = 100.0, slope: float = 0.0, noise: float = 0.0, seed: int = 0):
+    pattern = np.array([0.8, 0.9, 1.0, 1.0, 1.1, 1.4, 0.8])
+    t = np.arange(weeks * 7)
+    rng = np.random.RandomState(seed)
+    return (level + slope * t) * pattern[t % 7] + rng.normal(0, noise, len(t))
+
+
+def test_too_short_series_is_not_fitted():
+    assert fit_seasonal_smoothing(np.ones(14)) is None
+
+
+def test_forecast_repeats_the_weekly_pattern():
+    y = weekly_series()
+    state = fit_seasonal_smoothing(y)
+    forecast = forecast_seasonal_smoothing(state, 14)
+
+    assert forecast["point"].shape == (14, 1)
+    expected = weekly_series(weeks=14)[-14:]
+    np.testing.assert_allclose(forecast["point"][:, 0], expected, rtol=0.05)
+
+
+def test_forecast_follows_a_trend():
+    y = weekly_series(weeks=16, slope=1.0)
+    forecast = forecast_seasonal_smoothing(fit_seasonal_smoothing(y), 7)
+    # The damped trend keeps the next week above the last observed one
+    assert forecast["point"][:, 0].sum() > y[-7:].sum()
+
+
+def test_interval_brackets_the_point_and_widens_with_horizon():
+    state = fit_seasonal_smoothing(weekly_series(noise=5.0), interval_level=0.8)
+    forecast = forecast_seasonal_smoothing(state, 28)
+    point, lower, upper = forecast["point"][:, 0], forecast["lower"][:, 0], forecast["upper"][:, 0]
+
+    assert (lower <= point).all() and (point <= upper).all()
+    assert (upper - lower)[-1] > (upper - lower)[0]
+
+
+def test_columns_are_fitted_independently():
+    a = weekly_series(level=100.0)
+    b = weekly_series(level=5.0, noise=0.5, seed=1)
+    joint = forecast_seasonal_smoothing(fit_seasonal_smoothing(np.column_stack([a, b])), 7)["point"]
+    alone = forecast_seasonal_smoothing(fit_seasonal_smoothing(b), 7)["point"]
+
+    np.testing.assert_allclose(joint[:, 1], alone[:, 0])
+
+
+@pytest.mark.parametrize("seasonal", ["additive", "multiplicative"])
+def test_seasonal_mode_can_be_forced(seasonal):
+    state = fit_seasonal_smoothing(weekly_series(), seasonal=seasonal)
+    assert bool(state["multiplicative"][0]) == (seasonal == "multiplicative")
+
+
+def test_forecast_is_never_negative():
+    y = np.maximum(weekly_series(level=10.0, slope=-0.15), 0)
+    forecast = forecast_seasonal_smoothing(fit_seasonal_smoothing(y), 30)
+    assert (forecast["point"] >= 0).all() and (forecast["lower"] >= 0).all()
+
+
+def test_reconciled_children_sum_to_the_parent_and_keep_their_shares():
+    parent = np.array([100.0, 120.0, 90.0])
+    children = np.array([[10.0, 30.0, 40.0], [20.0, 20.0, 20.0], [5.0, 0.0, 15.0]])
+    reconciled = reconcile_to_parent(parent, children)
+
+    np.testing.assert_allclose(reconciled.sum(axis=1), parent)
+    shares = children / children.sum(axis=1, keepdims=True)
+    np.testing.assert_allclose(reconciled / parent[:, None], shares)
+
+
+def test_reconcile_splits_evenly_when_all_children_are_zero():
+    reconciled = reconcile_to_parent(np.array([30.0]), np.zeros((1, 3)))
+    np.testing.assert_allclose(reconciled, [[10.0, 10.0, 10.0]])
+
+
+def test_reconciled_forecasts_of_a_hierarchy_add_up():
+    children = np.column_stack([weekly_series(level=level, noise=1.0, seed=seed)
+                                for seed, level in enumerate((50.0, 30.0, 20.0))])
+    parent = children.sum(axis=1)
+    point = forecast_seasonal_smoothing(fit_seasonal_smoothing(np.column_stack([parent, children])), 14)["point"]
+    reconciled = reconcile_to_parent(point[:, 0], point[:, 1:])
+
+    np.testing.assert_allclose(reconciled.sum(axis=1), point[:, 0])
+    assert (reconciled >= 0).all()
@@ -0,0 +1,80 @@
+import pytest
+
+from rag import llm_cache
+from rag.llm_cache import LLMResponseCache
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_cache, "time", fake)
+    return fake
+
+
+def test_get_returns_stored_response_and_counts_hits(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"))
+    assert cache.get("a") is None
+    cache.put("a", "v1", "answer")
+
+    assert cache.get("a") == "answer"
+    stats = cache.stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (1, 1, 1)
+
+
+def test_entries_expire_after_ttl(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60)
+    cache.put("old", "v1", "old answer")
+    clock.now += 30
+    cache.put("new", "v1", "new answer")
+
+    clock.now += 31
+    assert cache.get("old") is None
+    assert cache.get("new") == "new answer"
+
+    # Expired rows are removed on the next write
+    cache.put("newest", "v1", "newest answer")
+    assert cache.stats()["size"] == 2
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put("a", "v1", "A")
+    clock.now += 1
+    cache.put("b", "v1", "B")
+    clock.now += 1
+    assert cache.get("a") == "A"
+    clock.now += 1
+    cache.put("c", "v1", "C")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "A"
+    assert cache.get("c") == "C"
+
+
+def test_writing_a_new_data_version_drops_older_versions(tmp_path, clock):
+    cache = LLMResponseCache(str(tmp_path / "cache.sqlite3"))
+    cache.put("a", "v1", "A1")
+    cache.put("b", "v1", "B1")
+    cache.put("a", "v2", "A2")
+
+    assert cache.get("a") == "A2"
+    assert cache.get("b") is None
+    assert cache.stats()["size"] == 1
+
+
+def test_cache_file_is_shared_between_instances(tmp_path, clock):
+    path = str(tmp_path / "nested" / "cache.sqlite3")
+    LLMResponseCache(path).put("a", "v1", "A")
+    other = LLMResponseCache(path)
+
+    assert other.get("a") == "A"
+    other.clear()
+    assert other.stats()["size"] == 0
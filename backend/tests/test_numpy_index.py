@@ -0,0 +1,130 @@
+import os
+
+import numpy as np
+import pytest
+
+from rag import numpy_index
+from rag.numpy_index import NumpyVectorIndex
+
+
+def random_vectors(n: int, dim: int = 16, seed: int = 0) -> np.ndarray:
+    return np.random.RandomState(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def exact_top_k(vectors: np.ndarray, query: np.ndarray, k: int) -> list:
+    distances = ((vectors - query) ** 2).sum(axis=1)
+    return list(np.argsort(distances, kind="stable")[:k])
+
+
+def fill(index: NumpyVectorIndex, vectors: np.ndarray, metadatas=None) -> list:
+    ids = [f"row-{i}" for i in range(len(vectors))]
+    index.upsert(ids, vectors, metadatas=metadatas, documents=[f"doc {i}" for i in range(len(vectors))])
+    return ids
+
+
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+def test_query_returns_the_nearest_rows(tmp_path, dtype):
+    vectors = random_vectors(500)
+    index = NumpyVectorIndex(str(tmp_path), dtype=dtype)
+    ids = fill(index, vectors)
+
+    query = vectors[42] + 0.01
+    result = index.query([query], n_results=5)
+    assert result["ids"][0][0] == "row-42"
+    expected = [ids[i] for i in exact_top_k(vectors, query, 5)]
+    assert len(set(result["ids"][0]) & set(expected)) >= 4
+    assert result["distances"][0] == sorted(result["distances"][0])
+
+
+def test_appends_are_visible_to_another_instance(tmp_path):
+    writer = NumpyVectorIndex(str(tmp_path))
+    reader = NumpyVectorIndex(str(tmp_path))
+    vectors = random_vectors(20)
+    fill(writer, vectors[:10])
+    assert reader.count() == 10
+
+    writer.upsert(["late"], vectors[10:11], documents=["late doc"])
+    assert reader.count() == 11
+    assert reader.query([vectors[10]], n_results=1)["ids"][0] == ["late"]
+    assert reader.get(["late"])["documents"] == ["late doc"]
+
+
+def test_upsert_replaces_and_delete_removes(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    vectors = random_vectors(10)
+    fill(index, vectors)
+
+    index.upsert(["row-3"], vectors[7:8] * 3)
+    index.delete(["row-5"])
+
+    assert index.count() == 9
+    assert index.get(["row-5"])["ids"] == []
+    assert "row-5" not in index.query([vectors[5]], n_results=9)["ids"][0]
+    assert index.query([vectors[7] * 3], n_results=1)["ids"][0] == ["row-3"]
+
+
+def test_where_filters_and_metadata_updates(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    vectors = random_vectors(30)
+    fill(index, vectors, metadatas=[{"city": "Almaty" if i % 2 else "Astana", "date_ord": i} for i in range(30)])
+
+    result = index.query([vectors[4]], n_results=30, where={"$and": [{"city": "Almaty"}, {"date_ord": {"$lte": 9}}]})
+    assert sorted(result["ids"][0]) == sorted(f"row-{i}" for i in (1, 3, 5, 7, 9))
+
+    index.update(["row-4"], [{"city": "Almaty", "date_ord": 4}])
+    result = index.query([vectors[4]], n_results=1, where={"city": "Almaty"})
+    assert result["ids"][0] == ["row-4"]
+
+
+def test_compaction_drops_deleted_rows_and_keeps_results(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    vectors = random_vectors(200)
+    fill(index, vectors)
+    index.delete([f"row-{i}" for i in range(0, 200, 2)])
+    before = index.query([vectors[51]], n_results=5)
+    generation = index.generation
+
+    index.compact()
+
+    assert index.generation == generation + 1
+    assert index.count() == 100
+    assert index.query([vectors[51]], n_results=5) == before
+    assert not os.path.exists(os.path.join(str(tmp_path), f"vectors-{generation}.bin"))
+
+
+def test_compaction_is_skipped_with_few_dead_rows(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    fill(index, random_vectors(100))
+    index.delete(["row-0"])
+    generation = index.generation
+
+    index.compact()
+    assert index.generation == generation
+
+
+def test_ivf_recall_against_exact_search(tmp_path, monkeypatch):
+    monkeypatch.setattr(numpy_index, "IVF_MIN_ROWS_PER_LIST", 10)
+    rng = np.random.RandomState(1)
+    centers = rng.normal(scale=5.0, size=(16, 16))
+    vectors = (centers[rng.randint(0, 16, 4000)] + rng.normal(size=(4000, 16))).astype(np.float32)
+    index = NumpyVectorIndex(str(tmp_path), ivf_lists=16, ivf_probe=4)
+    ids = fill(index, vectors)
+    index.compact()
+    assert index._centroids is not None
+
+    queries = vectors[rng.choice(len(vectors), 50, replace=False)] + rng.normal(scale=0.1, size=(50, 16))
+    hits = 0
+    for query in queries.astype(np.float32):
+        expected = {ids[i] for i in exact_top_k(vectors, query, 10)}
+        hits += len(expected & set(index.query([query], n_results=10)["ids"][0]))
+    assert hits / (10 * len(queries)) >= 0.9
+
+
+def test_reset_empties_the_index_and_allows_a_new_dimension(tmp_path):
+    index = NumpyVectorIndex(str(tmp_path))
+    fill(index, random_vectors(10))
+    index.reset()
+    assert index.count() == 0
+
+    index.upsert(["a"], random_vectors(1, dim=8))
+    assert index.dim == 8 and index.count() == 1
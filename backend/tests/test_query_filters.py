@@ -0,0 +1,73 @@
+from datetime import date
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+from rag import query_filters
+from rag.query_filters import build_where, extract_question_filters
+
+VOCABULARY = {
+    "city": {"Almaty": 0, "Astana": 1, "Shymkent": 2},
+    "region": {"Almaty Region": 0, "Akmola": 1},
+    "channel": {"mobile_app": 0, "marketplace": 1, "offline_pos": 2},
+    "merchant_category": {"grocery": 0, "electronics": 1, "travel": 2},
+}
+
+
+@pytest.fixture(autouse=True)
+def dataset(monkeypatch):
+    monkeypatch.setattr(query_filters, "get_feature_store", lambda: SimpleNamespace(vocabulary=VOCABULARY))
+    monkeypatch.setattr(query_filters, "_date_bounds", lambda: pd.Timestamp("2024-10-31"))
+
+
+def test_city_channel_and_category_from_aliases():
+    filters = extract_question_filters("Выручка в Алматы через мобильное приложение по электронике")
+    assert filters == {"city": "Almaty", "channel": "mobile_app", "merchant_category": "electronics"}
+
+
+def test_values_named_directly_match_with_underscores_as_spaces():
+    filters = extract_question_filters("Compare offline pos sales in Astana")
+    assert filters == {"city": "Astana", "channel": "offline_pos"}
+
+
+def test_iso_dates_give_an_inclusive_range():
+    filters = extract_question_filters("revenue between 2024-03-15 and 2024-02-01")
+    assert filters == {"date_from": "2024-02-01", "date_to": "2024-03-15"}
+
+
+def test_month_and_year_cover_the_whole_month():
+    filters = extract_question_filters("Сколько заказов в феврале 2024?")
+    assert filters == {"date_from": "2024-02-01", "date_to": "2024-02-29"}
+
+
+def test_bare_month_refers_to_its_latest_occurrence_in_the_data():
+    assert extract_question_filters("sales in december")["date_from"] == "2023-12-01"
+    assert extract_question_filters("sales in march")["date_from"] == "2024-03-01"
+
+
+def test_year_alone_covers_the_year():
+    assert extract_question_filters("итоги 2023 года") == {"date_from": "2023-01-01", "date_to": "2023-12-31"}
+
+
+def test_question_without_filters():
+    assert extract_question_filters("What is the average check?") == {}
+
+
+def test_build_where_without_filters():
+    assert build_where(None) is None
+    assert build_where({}) is None
+    assert build_where({"city": ""}) is None
+
+
+def test_build_where_single_condition_is_not_wrapped():
+    assert build_where({"channel": "marketplace"}) == {"channel": "marketplace"}
+
+
+def test_build_where_selects_documents_overlapping_the_date_range():
+    where = build_where({"city": "Almaty", "date_from": "2024-02-01", "date_to": "2024-02-29"})
+    assert where == {"$and": [
+        {"city": "Almaty"},
+        {"date_ord_end": {"$gte": date(2024, 2, 1).toordinal()}},
+        {"date_ord": {"$lte": date(2024, 2, 29).toordinal()}},
+    ]}
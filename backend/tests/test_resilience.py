@@ -0,0 +1,161 @@
+import asyncio
+
+import pytest
+
+from rag import resilience
+from rag.resilience import CircuitBreaker, LLMGuard, LLMUnavailableError, is_transient_error
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience, "time", fake)
+    return fake
+
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_trial_closes_on_success(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one trial call at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0 and breaker.allow()
+
+
+def test_breaker_half_open_trial_reopens_on_failure(clock):
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    for _ in range(5):
+        breaker.record_failure()
+    clock.now += 31
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now += 29
+    assert not breaker.allow()
+
+
+def test_breaker_lets_a_new_trial_through_when_one_never_reported(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_transient_errors():
+    assert is_transient_error(asyncio.TimeoutError())
+    assert is_transient_error(ConnectionError())
+    assert is_transient_error(StatusError(429))
+    assert is_transient_error(StatusError(503))
+    assert not is_transient_error(StatusError(401))
+    assert not is_transient_error(ValueError("bad request"))
+
+
+def test_guard_retries_transient_errors():
+    guard = LLMGuard(deadline_seconds=5, max_retries=2, backoff_seconds=0)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(503)
+        return "answer"
+
+    assert asyncio.run(guard.ainvoke(call)) == "answer"
+    assert len(attempts) == 3 and guard.retried == 2
+    assert guard.breaker.state == "closed"
+
+
+def test_guard_raises_unavailable_and_opens_the_breaker():
+    guard = LLMGuard(deadline_seconds=5, max_retries=1, backoff_seconds=0,
+                     breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+
+    async def call():
+        raise StatusError(502)
+
+    for _ in range(2):
+        with pytest.raises(LLMUnavailableError):
+            asyncio.run(guard.ainvoke(call))
+    assert guard.breaker.state == "open"
+    with pytest.raises(LLMUnavailableError, match="circuit is open"):
+        asyncio.run(guard.ainvoke(call))
+
+
+def test_guard_does_not_retry_client_errors():
+    guard = LLMGuard(deadline_seconds=5, max_retries=3, backoff_seconds=0)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        raise StatusError(401)
+
+    with pytest.raises(StatusError):
+        asyncio.run(guard.ainvoke(call))
+    assert len(attempts) == 1 and guard.breaker.failures == 0
+
+
+def test_guard_deadline_cancels_slow_calls():
+    guard = LLMGuard(deadline_seconds=0.1, max_retries=0, backoff_seconds=0)
+
+    async def call():
+        await asyncio.sleep(5)
+
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(guard.ainvoke(call))
+    assert guard.breaker.failures == 1
+
+
+def test_stream_is_closed_when_the_consumer_stops_early():
+    guard = LLMGuard(deadline_seconds=5)
+    closed = []
+
+    async def tokens():
+        try:
+            for token in ("a", "b", "c"):
+                yield token
+        finally:
+            closed.append(True)
+
+    async def main():
+        stream = guard.astream(tokens)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(main()) == "a"
+    assert closed == [True]
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from rag import embeddings, query_filters, semantic_cache
+from rag.semantic_cache import SemanticAnswerCache, _question_guard, _question_polarity, semantic_cache_enabled
+
+
+def unit(*values: float) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def no_filters(monkeypatch):
+    monkeypatch.setattr(query_filters, "extract_question_filters", lambda question: {})
+
+
+def test_polarity_detects_opposite_directions():
+    assert _question_polarity("Which city has the highest revenue?") == ["high"]
+    assert _question_polarity("Which city has the lowest revenue?") == ["low"]
+    assert _question_polarity("Какой канал показал наибольшую выручку?") == ["high"]
+    assert _question_polarity("Где было падение продаж?") == ["down"]
+    assert _question_polarity("Revenue by city") == []
+
+
+def test_guard_separates_opposite_questions_and_numbers(no_filters):
+    assert _question_guard("highest revenue by city") != _question_guard("lowest revenue by city")
+    assert _question_guard("revenue in 2023") != _question_guard("revenue in 2024")
+    assert _question_guard("highest revenue by city") == _question_guard("top revenue per city")
+
+
+def test_guard_includes_extracted_filters(monkeypatch):
+    monkeypatch.setattr(query_filters, "extract_question_filters",
+                        lambda question: {"city": "Almaty"} if "Almaty" in question else {"city": "Astana"})
+    assert _question_guard("revenue in Almaty") != _question_guard("revenue in Astana")
+
+
+def test_guard_survives_filter_extraction_errors(monkeypatch):
+    def fail(question):
+        raise RuntimeError("no feature store")
+
+    monkeypatch.setattr(query_filters, "extract_question_filters", fail)
+    assert '"high"' in _question_guard("highest revenue")
+
+
+def test_get_matches_only_the_same_key_above_the_threshold():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=4)
+    key = ("chat", "v1", "guard")
+    cache.put(key, unit(1, 0, 0), {"answer": "A"})
+
+    payload, score = cache.get(key, unit(1, 0.1, 0))
+    assert payload == {"answer": "A"} and score > 0.9
+    assert cache.get(key, unit(1, 1, 0)) is None
+    assert cache.get(("chat", "v1", "other guard"), unit(1, 0, 0)) is None
+    assert cache.get(("analysis", "v1", "guard"), unit(1, 0, 0)) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 3)
+
+
+def test_put_replaces_near_duplicates_and_evicts_least_recently_used():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=2)
+    key = ("chat", "v1", "guard")
+    cache.put(key, unit(1, 0, 0), "A")
+    cache.put(key, unit(1, 0.05, 0), "A2")
+    assert cache.stats()["size"] == 1
+
+    cache.put(key, unit(0, 1, 0), "B")
+    cache.get(key, unit(1, 0, 0))
+    cache.put(key, unit(0, 0, 1), "C")
+
+    assert cache.get(key, unit(0, 1, 0)) is None
+    assert cache.get(key, unit(1, 0, 0))[0] == "A2"
+    assert cache.get(key, unit(0, 0, 1))[0] == "C"
+
+
+def test_new_data_version_drops_older_entries():
+    cache = SemanticAnswerCache(threshold=0.9, max_entries=4)
+    cache.put(("chat", "v1", "guard"), unit(1, 0, 0), "old")
+    cache.put(("chat", "v2", "guard"), unit(0, 1, 0), "new")
+
+    assert cache.stats()["size"] == 1
+    assert cache.get(("chat", "v1", "guard"), unit(1, 0, 0)) is None
+
+
+@pytest.mark.parametrize("value, backend, expected", [
+    ("true", "local", True),
+    ("false", "openai", False),
+    ("auto", "openai", True),
+    ("auto", "local", False),
+])
+def test_semantic_cache_enabled(monkeypatch, value, backend, expected):
+    monkeypatch.setattr(semantic_cache.settings, "SEMANTIC_CACHE_ENABLED", value)
+    monkeypatch.setattr(embeddings, "resolve_embedding_backend", lambda: backend)
+    assert semantic_cache_enabled() is expected
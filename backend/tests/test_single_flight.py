@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.single_flight import SingleFlight, single_flight
+
+
+def run_concurrently(count: int, target) -> list:
+    results = [None] * count
+
+    def call(position: int) -> None:
+        try:
+            results[position] = target()
+        except Exception as e:
+            results[position] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+
+def test_do_runs_overlapping_calls_once_and_copies_the_result():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(timeout=5)
+        return {"rows": [1, 2, 3]}
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(5, lambda: flight.do("key", compute))
+
+    assert len(calls) == 1
+    assert flight.shared == 4
+    assert all(result == {"rows": [1, 2, 3]} for result in results)
+    assert len({id(result) for result in results}) == 5
+    results[0]["rows"].append(4)
+    assert results[1]["rows"] == [1, 2, 3]
+
+
+def test_do_starts_a_fresh_call_once_the_leader_finished():
+    flight = SingleFlight()
+    counter = iter(range(10))
+
+    assert flight.do("key", lambda: next(counter)) == 0
+    assert flight.do("key", lambda: next(counter)) == 1
+    assert flight.shared == 0
+
+
+def test_do_raises_the_leaders_exception_in_every_waiter():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fail():
+        release.wait(timeout=5)
+        raise ValueError("boom")
+
+    threading.Timer(0.2, release.set).start()
+    results = run_concurrently(3, lambda: flight.do("key", fail))
+
+    assert all(isinstance(result, ValueError) and str(result) == "boom" for result in results)
+    with pytest.raises(KeyError):
+        flight.do("key", lambda: {}["missing"])
+
+
+def test_ado_coalesces_calls_on_the_same_loop():
+    flight = SingleFlight()
+    calls = []
+
+    async def compute(value):
+        calls.append(value)
+        await asyncio.sleep(0.05)
+        return value
+
+    async def main():
+        first = await asyncio.gather(*(flight.ado("key", lambda: compute(1)) for _ in range(4)))
+        second = await flight.ado("key", lambda: compute(2))
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first == [1, 1, 1, 1] and second == 2
+    assert calls == [1, 2]
+    assert flight.shared == 3
+
+
+def test_ado_keeps_running_for_others_when_a_caller_is_cancelled():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        impatient = asyncio.ensure_future(flight.ado("key", compute))
+        patient = asyncio.ensure_future(flight.ado("key", compute))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        return await patient
+
+    assert asyncio.run(main()) == "done"
+
+
+def test_single_flight_decorator_keys_on_the_arguments():
+    class Service:
+        def __init__(self):
+            self.calls = 0
+
+        @single_flight
+        def summary(self, filters=None):
+            self.calls += 1
+            time.sleep(0.1)
+            return {"filters": filters}
+
+    service = Service()
+    same = run_concurrently(3, lambda: service.summary(filters={"city": "Almaty"}))
+    assert service.calls == 1
+    assert same == [{"filters": {"city": "Almaty"}}] * 3
+
+    assert service.summary(filters={"city": "Astana"}) == {"filters": {"city": "Astana"}}
+    assert service.calls == 2
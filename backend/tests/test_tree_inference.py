@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+
+from services.tree_inference import FlatForestClassifier, FlatIsolationForest
+
+
+@pytest.fixture(scope="module")
+def data():
+    rng = np.random.RandomState(0)
+    X = np.column_stack([rng.lognormal(9, 1, 2000), rng.randint(0, 5, 2000), rng.randint(0, 10, 2000)]).astype(float)
+    y = ((X[:, 0] > np.exp(9.5)) ^ (X[:, 1] == 2)).astype(int)
+    X_new = np.column_stack([rng.lognormal(9, 1.5, 500), rng.randint(-1, 6, 500), rng.randint(0, 12, 500)]).astype(float)
+    return X, y, X_new
+
+
+def test_flat_forest_matches_sklearn_probabilities(data):
+    X, y, X_new = data
+    model = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=42).fit(X, y)
+    flat = FlatForestClassifier.from_sklearn(model)
+
+    np.testing.assert_allclose(flat.predict_proba(X_new), model.predict_proba(X_new), atol=1e-12)
+
+
+def test_flat_forest_scores_a_single_row(data):
+    X, y, X_new = data
+    model = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=1).fit(X, y)
+    flat = FlatForestClassifier.from_sklearn(model)
+
+    np.testing.assert_allclose(flat.predict_proba(X_new[0]).reshape(1, -1), model.predict_proba(X_new[:1]), atol=1e-12)
+
+
+def test_flat_forest_handles_feature_subsampling(data):
+    X, y, X_new = data
+    model = RandomForestClassifier(n_estimators=15, max_features=1, random_state=3).fit(X, y)
+    np.testing.assert_allclose(FlatForestClassifier.from_sklearn(model).predict_proba(X_new),
+                               model.predict_proba(X_new), atol=1e-12)
+
+
+@pytest.mark.parametrize("max_features", [1.0, 0.5])
+def test_flat_isolation_forest_matches_sklearn(data, max_features):
+    X, _, X_new = data
+    model = IsolationForest(n_estimators=50, contamination=0.1, max_features=max_features, random_state=42).fit(X)
+    flat = FlatIsolationForest.from_sklearn(model)
+
+    np.testing.assert_allclose(flat.score_samples(X_new), model.score_samples(X_new), atol=1e-10)
+    np.testing.assert_allclose(flat.decision_function(X_new), model.decision_function(X_new), atol=1e-10)
+    np.testing.assert_array_equal(flat.predict(X_new), model.predict(X_new))